@@ -1,28 +1,231 @@
 import os
+import operator
 from functools import partial
 from django.utils.translation import ugettext as _
 
 from django.conf import settings
-from django.db import router
+from django.db import router, connections
 from django import forms
 from django.contrib import admin
 
 from django.contrib.admin.util import unquote, get_deleted_objects, flatten_fieldsets
+from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.forms.models import BaseInlineFormSet, modelform_factory
+from django.db import models
+from django.db.models import Count
 
 from django.utils.encoding import force_unicode
 from django.utils.functional import curry
 from django.http import HttpResponseRedirect, HttpResponse, Http404, \
     HttpResponseBadRequest, HttpResponseForbidden, HttpResponseNotAllowed
 from django.shortcuts import render_to_response, get_object_or_404
+from django.utils.html import escape
+from django.core.exceptions import PermissionDenied
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import simplejson
 from django.template.context import RequestContext
 
-from simple_translation.widgets import LanguageWidget
+from simple_translation.widgets import LanguageWidget, render_delete_link
 from simple_translation.forms import TranslationModelForm, translation_modelform_factory
 from simple_translation.utils import get_language_from_request
 from simple_translation.translation_pool import translation_pool
+from simple_translation.search import get_search_index
+from simple_translation.instrumentation import instrument, stats
+from simple_translation.coverage import TranslationCoverage
 
 import django
 
+HAS_LANGUAGE_VAR = 'has_language'
+MISSING_LANGUAGE_VAR = 'missing_language'
+
+def construct_search(field_name):
+    if field_name.startswith('^'):
+        return "%s__istartswith" % field_name[1:]
+    elif field_name.startswith('='):
+        return "%s__iexact" % field_name[1:]
+    elif field_name.startswith('@'):
+        return "%s__search" % field_name[1:]
+    else:
+        return "%s__icontains" % field_name
+
+class LanguageFilterSpec(object):
+    """
+    Filters the masters with or without a translation in a language, with
+    the number of masters for every language.
+    """
+    
+    def __init__(self, title, lookup_var, other_var, params, counts):
+        self._title = title
+        self.lookup_var = lookup_var
+        self.other_var = other_var
+        self.lookup_val = params.get(lookup_var)
+        self.counts = counts
+        
+    def has_output(self):
+        return True
+        
+    def title(self):
+        return self._title
+        
+    def choices(self, cl):
+        yield {
+            'selected': self.lookup_val is None,
+            'query_string': cl.get_query_string({}, [self.lookup_var]),
+            'display': _('All'),
+        }
+        for code, name in settings.LANGUAGES:
+            yield {
+                'selected': self.lookup_val == code,
+                'query_string': cl.get_query_string({self.lookup_var: code}, [self.other_var]),
+                'display': u'%s (%s)' % (_(name), self.counts.get(code, 0)),
+            }
+
+class TranslationChangeList(ChangeList):
+    """
+    Searches the translated fields in ``search_fields`` through the search
+    index when the model is registered with ``search_fields``. Filters on
+    the languages of the translations with ``has_language`` and
+    ``missing_language``.
+    """
+    
+    def get_translated_search_fields(self):
+        info = translation_pool.get_info(self.model)
+        if not info.search_fields:
+            return []
+        prefix = '%s__' % info.translation_join_filter
+        master_fields = self.lookup_opts.get_all_field_names()
+        translated_fields = info.translated_model._meta.get_all_field_names()
+        return [field for field in self.search_fields if field.lstrip('^=@').startswith(prefix) \
+            or (field.lstrip('^=@') in translated_fields and not field.lstrip('^=@') in master_fields)]
+        
+    def get_query_set(self):
+        # the language lookups are not fields of the model
+        params = self.params
+        self.params = dict([(key, value) for key, value in params.items() \
+            if not key in (HAS_LANGUAGE_VAR, MISSING_LANGUAGE_VAR)])
+        if 'translation_count' in self.list_display and not hasattr(self, 'translation_count_added'):
+            self.root_query_set = self.root_query_set.annotate(
+                translation_count=Count(translation_pool.get_info(self.model).translation_join_filter))
+            self.translation_count_added = True
+        try:
+            qs = self.get_search_query_set()
+        finally:
+            self.params = params
+        if HAS_LANGUAGE_VAR in params:
+            qs = self.filter_language(qs, params[HAS_LANGUAGE_VAR], True)
+        if MISSING_LANGUAGE_VAR in params:
+            qs = self.filter_language(qs, params[MISSING_LANGUAGE_VAR], False)
+        return qs
+        
+    def filter_language(self, qs, language, exists):
+        """
+        Masters with or without a translation in ``language``, with an
+        EXISTS or NOT EXISTS subquery.
+        """
+        if not language in [code for code, name in settings.LANGUAGES]:
+            raise IncorrectLookupParameters
+        info = translation_pool.get_info(self.model)
+        qn = connections[qs.db].ops.quote_name
+        translation_opts = info.translated_model._meta
+        table = qn(translation_opts.db_table)
+        sql = '%sEXISTS (SELECT 1 FROM %s WHERE %s.%s = %s.%s AND %s.%s = %%s)' % (
+            not exists and 'NOT ' or '', table,
+            table, qn(translation_opts.get_field(info.translation_of_field).column),
+            qn(self.lookup_opts.db_table), qn(self.lookup_opts.pk.column),
+            table, qn(translation_opts.get_field(info.language_field).column))
+        return qs.extra(where=[sql], params=[language])
+        
+    def get_filters(self, request):
+        filter_specs, has_filters = super(TranslationChangeList, self).get_filters(request)
+        if getattr(self.model_admin, 'translation_list_filter', False):
+            # two queries for the counts of all languages
+            report = TranslationCoverage(self.model).get_report()
+            filter_specs = filter_specs + [
+                LanguageFilterSpec(_('translation'), HAS_LANGUAGE_VAR, MISSING_LANGUAGE_VAR, self.params,
+                    dict([(row['language'], row['translated']) for row in report])),
+                LanguageFilterSpec(_('missing translation'), MISSING_LANGUAGE_VAR, HAS_LANGUAGE_VAR, self.params,
+                    dict([(row['language'], row['missing']) for row in report])),
+            ]
+        return filter_specs, bool(filter_specs)
+        
+    def get_search_query_set(self):
+        translated_search_fields = self.get_translated_search_fields()
+        if not (self.query and translated_search_fields):
+            return super(TranslationChangeList, self).get_query_set()
+        query = self.query
+        self.query = ''
+        try:
+            qs = super(TranslationChangeList, self).get_query_set()
+        finally:
+            self.query = query
+        search_q = models.Q(pk__in=get_search_index().search_queryset(self.model, query, qs.db).values('pk'))
+        other_fields = [field for field in self.search_fields if not field in translated_search_fields]
+        if other_fields:
+            search_q |= reduce(operator.and_, [reduce(operator.or_, \
+                [models.Q(**{construct_search(str(field)): bit}) for field in other_fields]) \
+                    for bit in query.split()])
+        return qs.filter(search_q)
+
+    def get_results(self, request):
+        super(TranslationChangeList, self).get_results(request)
+        # one query for the translations of the whole page, the instances
+        # are cached by the result_list queryset
+        translation_pool.annotate_with_translations(list(self.result_list))
+
+class TranslationInlineFormSet(BaseInlineFormSet):
+    """
+    The translations of a master in ``settings.LANGUAGES``, with an extra
+    form for every language without a translation. Extra forms that are
+    left alone are not saved.
+    """
+    
+    def get_language_field(self):
+        return translation_pool.get_info(self.model).language_field
+    
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            languages = [code for code, name in settings.LANGUAGES]
+            self._queryset = super(TranslationInlineFormSet, self).get_queryset().filter(
+                **{'%s__in' % self.get_language_field(): languages})
+        return self._queryset
+        
+    def get_missing_languages(self):
+        existing = [getattr(translation, self.get_language_field()) for translation in self.get_queryset()]
+        return [code for code, name in settings.LANGUAGES if not code in existing]
+        
+    def total_form_count(self):
+        if self.is_bound:
+            return super(TranslationInlineFormSet, self).total_form_count()
+        return self.initial_form_count() + len(self.get_missing_languages())
+        
+    def _construct_form(self, i, **kwargs):
+        missing_index = i - self.initial_form_count()
+        missing_languages = self.get_missing_languages()
+        if 0 <= missing_index < len(missing_languages):
+            kwargs['initial'] = {self.get_language_field(): missing_languages[missing_index]}
+        return super(TranslationInlineFormSet, self)._construct_form(i, **kwargs)
+        
+    def clean(self):
+        super(TranslationInlineFormSet, self).clean()
+        languages = []
+        for form in self.forms:
+            if not hasattr(form, 'cleaned_data') or not form.cleaned_data or \
+                form.cleaned_data.get('DELETE'):
+                continue
+            language = form.cleaned_data.get(self.get_language_field())
+            if language in languages:
+                raise forms.ValidationError(_('There can only be one translation per language.'))
+            languages.append(language)
+
+class TranslationInline(admin.StackedInline):
+    formset = TranslationInlineFormSet
+    extra = 0
+    
+    def get_formset(self, request, obj=None, **kwargs):
+        kwargs.setdefault('max_num', len(settings.LANGUAGES))
+        return super(TranslationInline, self).get_formset(request, obj, **kwargs)
+
 def make_translation_admin(admin):
     
     class RealTranslationAdmin(admin):
@@ -31,49 +234,100 @@ def make_translation_admin(admin):
         
         list_display = ('description', 'languages')
         
+        # adds has and missing translation filters to the changelist
+        translation_list_filter = False
+        
+        # edits the translations of all languages on the change page as an
+        # inline, instead of one language at a time
+        edit_all_languages = False
+        
+        translation_inline = TranslationInline
+        
         def __init__(self, *args, **kwargs):
             super(RealTranslationAdmin, self).__init__(*args, **kwargs)
             info = translation_pool.get_info(self.model)
             self.translated_model = info.translated_model
             self.translation_of_field = info.translation_of_field
             self.language_field = info.language_field
+            if self.edit_all_languages:
+                inline_class = type('%sInline' % self.translated_model.__name__, (self.translation_inline,), {
+                    'model': self.translated_model,
+                    'fk_name': self.translation_of_field,
+                })
+                self.inline_instances.append(inline_class(self.model, self.admin_site))
+    
+        def get_translations(self, obj):
+            if not hasattr(obj, 'translations'):
+                translation_pool.annotate_with_translations(obj)
+            return obj.translations
     
         def description(self, obj):
-            return getattr(translation_pool.annotate_with_translations(obj), 'translations', []) \
-            	and unicode(translation_pool.annotate_with_translations(obj).translations[0]) or u'No translations'
+            translations = self.get_translations(obj)
+            return translations and unicode(translations[0]) or u'No translations'
         
         def languages(self, obj):
                 lnk = '<a href="%s/?language=%s">%s</a>'
                 trans_list = [ (obj.pk, \
                 	getattr(t, self.language_field), getattr(t, self.language_field).upper())
-                    	for t in getattr(translation_pool.annotate_with_translations(obj), 'translations') or []]
+                    	for t in self.get_translations(obj)]
                 return ' '.join([lnk % t for t in trans_list])
         languages.short_description = _('languages')
         languages.allow_tags = True
+        
+        def translation_count(self, obj):
+            if hasattr(obj, 'translation_count'):
+                return obj.translation_count
+            return len(self.get_translations(obj))
+        translation_count.short_description = _('translations')
+        translation_count.admin_order_field = 'translation_count'
+
+        def get_changelist(self, request, **kwargs):
+            return TranslationChangeList
 
+        def find_translation(self, obj, language):
+            # the translations are read once per request and shared with
+            # the form and the LanguageWidget
+            for translation in self.get_translations(obj):
+                if getattr(translation, self.language_field) == language:
+                    return translation
+            # only the languages in settings.LANGUAGES are annotated
+            if not language in [code for code, name in settings.LANGUAGES]:
+                try:
+                    return self.translated_model._default_manager.get(**{
+                        self.translation_of_field: obj,
+                        self.language_field: language
+                    })
+                except self.translated_model.DoesNotExist:
+                    pass
+            return None
+    
         def get_translation(self, request, obj):
     
             language = get_language_from_request(request)
  
             if obj:
                 
-                get_kwargs = {
+                translation = self.find_translation(obj, language)
+                if translation is not None:
+                    return translation
+                
+                return self.translated_model(**{
                     self.translation_of_field: obj,
                     self.language_field: language
-                }
-    
-                try:
-                    return self.translated_model.objects.get(**get_kwargs)
-                except:
-                    return self.translated_model(**get_kwargs)
+                })
     
             return self.translated_model(**{self.language_field: language})
                 
+        @instrument('translation_admin_get_form', lambda self, *args, **kwargs: self.model)
         def get_form(self, request, obj=None, **kwargs):
             """
             Returns a Form class for use in the admin add view. This is used by
             add_view and change_view.
             """
+            if self.edit_all_languages:
+                # the translations are edited by the inline
+                kwargs.setdefault('form', forms.ModelForm)
+                return super(RealTranslationAdmin, self).get_form(request, obj, **kwargs)
             if self.declared_fieldsets:
                 fields = flatten_fieldsets(self.declared_fieldsets)
             else:
@@ -102,6 +356,7 @@ def make_translation_admin(admin):
                 translation_obj=translation_obj
             )
             new_form.base_fields[self.language_field].initial = current_language
+            new_form.child_instance = translation_obj
 
             return new_form
 
@@ -160,10 +415,13 @@ def make_translation_admin(admin):
             if obj is None:
                 raise Http404(_('%(name)s object with primary key %(key)r does not exist.') % {'name': force_unicode(opts.verbose_name), 'key': escape(object_id)})
     
-            if not len(translation_pool.annotate_with_translations(obj).translations) > 1:
+            translations = self.get_translations(obj)
+            if not len(translations) > 1:
                 raise Http404(_('There only exists one translation for this page'))
     
-            translationobj = get_object_or_404(self.translated_model, **{self.translation_of_field + '__id': object_id, 'language': language})
+            translationobj = self.find_translation(obj, language)
+            if translationobj is None:
+                raise Http404(_('%(name)s object with language %(language)r does not exist.') % {'name': force_unicode(translationopts.verbose_name), 'language': escape(language)})
 
             if django.VERSION[1] > 2: # pragma: no cover
                 # WARNING: Django 1.3 is not officially supported yet!
@@ -214,7 +472,66 @@ def make_translation_admin(admin):
                 "admin/delete_confirmation.html"
             ], context, context_instance=context_instance)
             
+        def translation_fields(self, request, object_id):
+            """
+            The translated fields of the requested language as json, used by
+            the ``LanguageWidget`` to switch languages without reloading the
+            change page.
+            """
+            try:
+                obj = self.queryset(request).get(pk=unquote(object_id))
+            except self.model.DoesNotExist:
+                obj = None
+            if not self.has_change_permission(request, obj):
+                raise PermissionDenied
+            if obj is None:
+                raise Http404(_('%(name)s object with primary key %(key)r does not exist.') % {'name': force_unicode(self.model._meta.verbose_name), 'key': escape(object_id)})
+            language = get_language_from_request(request)
+            if not language in dict(settings.LANGUAGES):
+                return HttpResponseBadRequest()
+            translation_obj = self.get_translation(request, obj)
+            form_class = modelform_factory(self.translated_model,
+                exclude=[self.translation_of_field, self.language_field],
+                formfield_callback=curry(self.formfield_for_dbfield, request=request))
+            form = form_class(instance=translation_obj)
+            languages = [getattr(translation, self.language_field) for translation in self.get_translations(obj)]
+            data = {
+                'language': language,
+                'languages': languages,
+                'exists': bool(translation_obj.pk),
+                'values': form.initial,
+                'fields': dict([(name, unicode(form[name])) for name in form.fields]),
+                'delete_link': translation_obj.pk and len(languages) > 1 and render_delete_link(language) or '',
+            }
+            return HttpResponse(simplejson.dumps(data, cls=DjangoJSONEncoder), mimetype='application/json')
+            
+        def translation_stats(self, request, extra_context=None):
+            """
+            The instrumentation counters of this process for the model and
+            its translations.
+            """
+            opts = self.model._meta
+            if not self.has_change_permission(request, None):
+                raise PermissionDenied
+            if request.method == 'POST':
+                stats.reset()
+                return HttpResponseRedirect(request.path)
+            context = {
+                "title": _("Translation stats"),
+                "counters": stats.get_counters([self.model, self.translated_model]),
+                "module_name": force_unicode(opts.verbose_name_plural),
+                "opts": opts,
+                "root_path": self.admin_site.root_path,
+                "app_label": opts.app_label,
+            }
+            context.update(extra_context or {})
+            context_instance = RequestContext(request, current_app=self.admin_site.name)
+            return render_to_response("admin/simple_translation/translation_stats.html",
+                context, context_instance=context_instance)
+            
         def render_change_form(self, request, context, add=False, change=False,  form_url='', obj=None):
+            if self.edit_all_languages:
+                return super(RealTranslationAdmin, self).render_change_form(request, context, add, change,  form_url, obj)
             if not self.get_translation(request, obj).pk:
                 return super(RealTranslationAdmin, self).render_change_form(request, context, True, change,  form_url, obj)
             else:
@@ -228,6 +545,8 @@ def make_translation_admin(admin):
     
             url_patterns = patterns('',
                 pat(r'^([0-9]+)/delete-translation/$', self.delete_translation),
+                pat(r'^([0-9]+)/translation-fields/$', self.translation_fields),
+                pat(r'^translation-stats/$', self.translation_stats),
             )
     
             url_patterns = url_patterns + super(RealTranslationAdmin, self).get_urls()
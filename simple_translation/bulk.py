@@ -0,0 +1,132 @@
+"""
+Bulk creation of masters together with their translations. ::
+
+    translation_pool.bulk_create_with_translations(Entry, [
+        ({'is_published': True}, {'en': {'title': 'Title', 'slug': 'title'},
+                                  'de': {'title': 'Titel', 'slug': 'titel'}}),
+    ])
+
+Masters and translations are inserted with one statement per model and
+chunk. Each chunk is committed on its own, unless the caller manages the
+transaction, then committing or rolling back is left to the caller. The
+primary keys of the masters are read back with ``RETURNING`` on PostgreSQL
+and from ``last_insert_rowid()`` on SQLite. There the rows of one
+statement get consecutive ids above the highest id before it, which is
+checked, a concurrent insert raises ``DatabaseError``. Other databases save
+the rows one by one.
+
+``pre_save`` and ``post_save`` are not sent. The search index, the
+fallback table, the slug index and the cached lists of the view cache are
+updated after every chunk and the generation of the conditional GET once at
+the end instead.
+"""
+from django.conf import settings
+from django.db import connections, router, transaction, DatabaseError
+from django.db.models import AutoField
+
+from simple_translation.conditional import bump_generation
+from simple_translation import fallbacks
+from simple_translation.routing import pin_to_database
+from simple_translation.search import get_search_index
+from simple_translation.slugs import get_slug_index
+from simple_translation.translation_pool import translation_pool
+from simple_translation.view_cache import evict, get_list_index_key
+
+def bulk_insert(model, objects, using):
+    """
+    Inserts ``objects`` of ``model`` and sets the primary keys of those
+    without one.
+    """
+    if not objects:
+        return objects
+    connection = connections[using]
+    opts = model._meta
+    qn = connection.ops.quote_name
+    has_pks = not [obj for obj in objects if obj.pk is None]
+    fields = [field for field in opts.local_fields if has_pks or not isinstance(field, AutoField)]
+    if not fields or not (has_pks or connection.vendor in ('postgresql', 'sqlite')):
+        for obj in objects:
+            obj.save_base(force_insert=True, using=using)
+        return objects
+    rows = [[field.get_db_prep_save(field.pre_save(obj, True), connection=connection) \
+        for field in fields] for obj in objects]
+    sql = 'INSERT INTO %s (%s) VALUES ' % (qn(opts.db_table), ', '.join([qn(field.column) for field in fields]))
+    placeholders = '(%s)' % ', '.join(['%s'] * len(fields))
+    cursor = connection.cursor()
+    if has_pks:
+        cursor.executemany(sql + placeholders, rows)
+    elif connection.vendor == 'postgresql':
+        cursor.execute(sql + ', '.join([placeholders] * len(rows)) + ' RETURNING %s' % qn(opts.pk.column),
+            sum(rows, []))
+        for obj, row in zip(objects, cursor.fetchall()):
+            obj.pk = row[0]
+    else:
+        cursor.execute('SELECT MAX(%s) FROM %s' % (qn(opts.pk.column), qn(opts.db_table)))
+        max_pk = cursor.fetchone()[0] or 0
+        cursor.executemany(sql + placeholders, rows)
+        cursor.execute('SELECT last_insert_rowid()')
+        last_pk = cursor.fetchone()[0]
+        if last_pk - max_pk != len(objects):
+            raise DatabaseError('%s rows were inserted into %s concurrently' % (
+                last_pk - max_pk - len(objects), opts.db_table))
+        for pk, obj in zip(range(max_pk + 1, last_pk + 1), objects):
+            obj.pk = pk
+    for obj in objects:
+        obj._state.db = using
+        obj._state.adding = False
+    return objects
+
+def bulk_create_with_translations(model, items, chunk_size=1000, using=None):
+    """
+    Creates a master for every ``(master_kwargs, {language: translation_kwargs})``
+    in ``items`` and returns the masters with their ``translations``.
+    """
+    info = translation_pool.get_info(model)
+    translated_model = info.translated_model
+    using = using or router.db_for_write(model)
+    languages = [code for code, name in settings.LANGUAGES]
+    searchable = bool(info.search_fields)
+
+    # sorted like annotate_with_translations
+    def language_key(item):
+        if item[0] in languages:
+            return languages.index(item[0])
+        return len(languages)
+
+    def insert_chunk(chunk):
+        chunk_masters = [model(**master_kwargs) for master_kwargs, translations in chunk]
+        chunk_translations = []
+        bulk_insert(model, chunk_masters, using)
+        for master, (master_kwargs, translations) in zip(chunk_masters, chunk):
+            master.translations = []
+            for language, translation_kwargs in sorted(translations.items(), key=language_key):
+                kwargs = dict(translation_kwargs)
+                kwargs[info.language_field] = language
+                kwargs[info.translation_of_field] = master
+                master.translations.append(translated_model(**kwargs))
+            chunk_translations.extend(master.translations)
+        bulk_insert(translated_model, chunk_translations, using)
+        return chunk_masters, chunk_translations
+
+    masters = []
+    for start in xrange(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        if transaction.is_managed(using=using):
+            # the caller commits or rolls back
+            chunk_masters, chunk_translations = insert_chunk(chunk)
+        else:
+            chunk_masters, chunk_translations = transaction.commit_on_success(using=using)(insert_chunk)(chunk)
+        masters.extend(chunk_masters)
+        if searchable:
+            get_search_index().add_many(chunk_translations, using)
+        if info.fallback_table:
+            fallbacks.refresh(info, [master.pk for master in chunk_masters], using)
+        if info.slug_field:
+            # slugs remembered as missing
+            get_slug_index().invalidate(chunk_translations)
+        used_languages = set([getattr(translation, info.language_field) for translation in chunk_translations])
+        evict([get_list_index_key(model, language) for language in used_languages])
+    if masters:
+        bump_generation(model)
+        pin_to_database(using)
+    return masters
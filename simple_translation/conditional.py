@@ -0,0 +1,171 @@
+"""
+Conditional GET for translated content. ::
+
+    @translation_condition(Entry)
+    def entry_list(request):
+        ...
+
+An ETag and Last-Modified are derived from the language and a generation of
+each model, which changes whenever a master or one of its translations is
+saved or deleted. Views of one master use its own generation::
+
+    @translation_condition(Entry, master_pk=lambda request, pk: pk)
+    def entry_detail(request, pk):
+        ...
+
+Unchanged pages are answered with 304 Not Modified without calling the
+view. ``TranslationConditionalGetMiddleware`` does the same for generic
+views with a ``queryset`` of a registered model.
+
+The generations are kept in the cache, it has to be shared by all processes.
+Nothing is done with the dummy cache.
+"""
+import calendar
+import datetime
+import hashlib
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import condition
+
+from simple_translation.translation_pool import translation_pool
+
+GENERATION_KEY = 'simple_translation.generation.%s.%s'
+MASTER_GENERATION_KEY = 'simple_translation.generation.%s.%s.%s'
+
+def get_master_model(model):
+    if translation_pool.is_registered_translation(model):
+        return translation_pool.get_info(model).translation_of_model
+    return model
+
+def get_generation_key(model, master_pk=None):
+    opts = get_master_model(model)._meta
+    if master_pk is None:
+        return GENERATION_KEY % (opts.app_label, opts.object_name.lower())
+    return MASTER_GENERATION_KEY % (opts.app_label, opts.object_name.lower(), master_pk)
+
+def get_master_pk(model, instance):
+    if translation_pool.is_registered_translation(model):
+        return getattr(instance, translation_pool.get_info(model).translation_of_field + '_id')
+    return instance.pk
+
+def new_generation():
+    return (uuid.uuid4().hex, datetime.datetime.utcnow())
+
+def get_generations(models, master_pk=None):
+    """
+    (token, modified) of every model, or of its master ``master_pk``, None if
+    the cache does not keep them.
+    """
+    keys = [get_generation_key(model, master_pk) for model in models]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, new_generation())
+            generations[key] = cache.get(key)
+            if generations[key] is None:
+                return None
+    return [generations[key] for key in keys]
+
+def bump_generation(sender, instance=None, **kwargs):
+    if translation_pool.is_registered(sender) or translation_pool.is_registered_translation(sender):
+        keys = [get_generation_key(sender)]
+        if instance is not None:
+            keys.append(get_generation_key(sender, get_master_pk(sender, instance)))
+        generation = new_generation()
+        cache.set_many(dict([(key, generation) for key in keys]))
+
+def get_request_language(request, kwargs):
+    return kwargs.get('language_code') or getattr(request, 'LANGUAGE_CODE', None) \
+        or settings.LANGUAGE_CODE
+
+def get_validators(models, language, master_pk=None):
+    """
+    (etag, last modified) of a page in ``language``, None without generations.
+    """
+    generations = get_generations(models, master_pk)
+    if generations is None:
+        return None
+    etag = hashlib.md5(repr((language, master_pk, [token for token, modified in generations]))).hexdigest()
+    return etag, max([modified for token, modified in generations])
+
+def patch_language_headers(request, kwargs, response, language):
+    if not ('language_code' in kwargs or getattr(request, 'language_from_url', False)):
+        # the language comes from the headers, the session or the cookie
+        patch_vary_headers(response, ('Accept-Language', 'Cookie'))
+    if not response.has_header('Content-Language'):
+        response['Content-Language'] = language
+
+def translation_condition(*models, **options):
+    """
+    Conditional GET for a view showing ``models`` and their translations.
+    ``master_pk`` is called with the arguments of a view showing one master
+    and returns its primary key.
+    """
+    get_view_master_pk = options.get('master_pk')
+    def decorator(view_func):
+        def inner(request, *args, **kwargs):
+            language = get_request_language(request, kwargs)
+            master_pk = get_view_master_pk and get_view_master_pk(request, *args, **kwargs)
+            validators = get_validators(models, language, master_pk)
+            if validators is None:
+                response = view_func(request, *args, **kwargs)
+            else:
+                etag, last_modified = validators
+                response = condition(etag_func=lambda *args, **kwargs: etag,
+                    last_modified_func=lambda *args, **kwargs: last_modified)(view_func)(request, *args, **kwargs)
+            patch_language_headers(request, kwargs, response, language)
+            return response
+        return wraps(view_func)(inner)
+    return decorator
+
+class TranslationConditionalGetMiddleware(object):
+    """
+    Conditional GET for generic views with a ``queryset`` of a registered
+    model, add it after ``MultilingualGenericsMiddleware``. Detail views of
+    masters by ``object_id`` use the generation of the master. The view is
+    only skipped when the client has the page.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method not in ('GET', 'HEAD') or not 'queryset' in view_kwargs:
+            return None
+        model = view_kwargs['queryset'].model
+        if not (translation_pool.is_registered(model) or translation_pool.is_registered_translation(model)):
+            return None
+        language = get_request_language(request, view_kwargs)
+        master_pk = translation_pool.is_registered(model) and view_kwargs.get('object_id') or None
+        validators = get_validators([model], language, master_pk)
+        request.translation_condition = (language, view_kwargs, validators)
+        if validators is None:
+            return None
+        etag, last_modified = validators
+        # answers 304 or 412 itself, or passes on to the view
+        passed = []
+        def pass_on(request):
+            passed.append(True)
+            return HttpResponse()
+        response = condition(etag_func=lambda *args, **kwargs: etag,
+            last_modified_func=lambda *args, **kwargs: last_modified)(pass_on)(request)
+        if passed:
+            return None
+        patch_language_headers(request, view_kwargs, response, language)
+        return response
+
+    def process_response(self, request, response):
+        language, view_kwargs, validators = getattr(request, 'translation_condition', (None, None, None))
+        if language is None or response.status_code == 304:
+            return response
+        if validators is not None and response.status_code == 200:
+            etag, last_modified = validators
+            if not response.has_header('ETag'):
+                response['ETag'] = quote_etag(etag)
+            if not response.has_header('Last-Modified'):
+                response['Last-Modified'] = http_date(calendar.timegm(last_modified.utctimetuple()))
+        patch_language_headers(request, view_kwargs, response, language)
+        return response
@@ -0,0 +1,96 @@
+"""
+Translation coverage of registered models per language. ::
+
+    coverage = TranslationCoverage(Entry)
+    for row in coverage.get_report():
+        print row['language'], row['translated'], row['missing'], row['percent']
+    for pk in coverage.iter_missing('de'):
+        ...
+
+The counts are read with one ``GROUP BY`` query over the translated model
+and one count of the masters, the masters missing a language are streamed
+in primary key chunks with an anti-join, so catalogs with millions of
+masters are never loaded as instances.
+"""
+from django.conf import settings
+from django.db.models import Count
+
+from simple_translation.routing import get_read_database
+from simple_translation.translation_pool import translation_pool
+
+class TranslationCoverage(object):
+    chunk_size = 10000
+
+    def __init__(self, model, languages=None, using=None, chunk_size=None):
+        self.model = model
+        self.info = translation_pool.get_info(model)
+        self.languages = languages or [code for code, name in settings.LANGUAGES]
+        self.using = using
+        self.chunk_size = chunk_size or self.chunk_size
+
+    def get_masters(self):
+        return self.model._default_manager.using(get_read_database(self.model, self.using))
+
+    def get_translations(self):
+        translated_model = self.info.translated_model
+        return translated_model._default_manager.using(get_read_database(translated_model, self.using))
+
+    def get_total(self):
+        return self.get_masters().count()
+
+    def get_counts(self):
+        """
+        Number of masters translated per language.
+        """
+        language_field = self.info.language_field
+        rows = self.get_translations().filter(**{'%s__in' % language_field: self.languages}) \
+            .order_by().values(language_field) \
+            .annotate(masters=Count(self.info.translation_of_field, distinct=True))
+        counts = dict([(language, 0) for language in self.languages])
+        for row in rows:
+            counts[row[language_field]] = row['masters']
+        return counts
+
+    def get_report(self):
+        """
+        A dict with the number of masters translated and missing and the
+        percentage translated for every language.
+        """
+        total = self.get_total()
+        counts = self.get_counts()
+        report = []
+        for language in self.languages:
+            percent = 100.0
+            if total:
+                percent = 100.0 * counts[language] / total
+            report.append({
+                'language': language,
+                'total': total,
+                'translated': counts[language],
+                'missing': total - counts[language],
+                'percent': percent,
+            })
+        return report
+
+    def get_missing_queryset(self, language):
+        translated = self.get_translations().filter(**{self.info.language_field: language}) \
+            .values(self.info.translation_of_field)
+        return self.get_masters().exclude(pk__in=translated)
+
+    def iter_missing(self, language):
+        """
+        Primary keys of the masters without a translation in ``language``,
+        read ``chunk_size`` at a time.
+        """
+        queryset = self.get_missing_queryset(language).order_by('pk')
+        last_pk = None
+        while True:
+            chunk_queryset = queryset
+            if last_pk is not None:
+                chunk_queryset = queryset.filter(pk__gt=last_pk)
+            chunk = list(chunk_queryset.values_list('pk', flat=True)[:self.chunk_size])
+            for pk in chunk:
+                yield pk
+            if len(chunk) < self.chunk_size:
+                break
+            last_pk = chunk[-1]
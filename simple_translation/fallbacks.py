@@ -0,0 +1,204 @@
+"""
+Materialized language fallbacks of registered translated models. ::
+
+    translation_pool.register_translation(Entry, EntryTitle, fallback_table=True)
+
+    from simple_translation.fallbacks import get_resolved_translations
+    titles = get_resolved_translations(Entry, 'de', master_pks=[1, 2, 3])
+
+A table next to the translated model holds the translation every master
+shows in every language of ``settings.LANGUAGES``: the one in that language
+or else the first in the order of ``settings.LANGUAGES``, like
+``get_preferred_translation_from_lang``. Reads join it once on its primary
+key (master, language) however many languages are tried.
+
+The rows of a master are refreshed by the post_save and post_delete signals
+of its translations. Run ``rebuild_translation_fallbacks`` after enabling the
+table for existing data or changing ``settings.LANGUAGES``.
+"""
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, models, router, transaction, DEFAULT_DB_ALIAS
+
+from simple_translation.routing import get_read_database
+from simple_translation.translation_pool import translation_pool
+
+def get_languages():
+    return [code for code, name in settings.LANGUAGES]
+
+def get_fallback_languages(language, languages=None):
+    """
+    The languages tried for ``language``, in order.
+    """
+    languages = languages or get_languages()
+    return [language] + [code for code in languages if code != language]
+
+def resolve_translations(translation_pks, languages):
+    """
+    Maps every language in ``languages`` to the primary key of the
+    translation shown in it, given the primary keys of the translations of
+    one master by language.
+    """
+    resolved = {}
+    for language in languages:
+        for fallback in get_fallback_languages(language, languages):
+            if fallback in translation_pks:
+                resolved[language] = translation_pks[fallback]
+                break
+    return resolved
+
+def get_fallback_info(model):
+    info = translation_pool.get_info(model)
+    if info and info.fallback_table:
+        return info
+
+def require_fallback_info(model):
+    info = get_fallback_info(model)
+    if info is None:
+        raise ImproperlyConfigured("[%s] register the translations of this model with "
+            "fallback_table=True" % model.__name__)
+    return info
+
+def get_fallback_infos():
+    translation_pool.discover_translations()
+    infos = translation_pool.translated_models_dict.values() + \
+        translation_pool.extra_translation_models_dict.values()
+    return [info for info in infos if info.fallback_table]
+
+def get_table(info):
+    return '%s_fallback' % info.translated_model._meta.db_table
+
+def create_tables(using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    table_names = connection.introspection.table_names()
+    for info in get_fallback_infos():
+        if get_table(info) not in table_names and router.allow_syncdb(using, info.translated_model):
+            connection.cursor().execute('CREATE TABLE %s (master_id integer NOT NULL, '
+                'language varchar(15) NOT NULL, translation_id integer NOT NULL, '
+                'PRIMARY KEY (master_id, language))' % connection.ops.quote_name(get_table(info)))
+    transaction.commit_unless_managed(using=using)
+
+def refresh(info, master_pks, using=DEFAULT_DB_ALIAS):
+    """
+    Rewrites the rows of the masters in ``master_pks`` with one query for
+    their translations, one delete and one insert.
+    """
+    master_pks = list(master_pks)
+    if not master_pks:
+        return
+    connection = connections[using]
+    table = connection.ops.quote_name(get_table(info))
+    languages = get_languages()
+    translations = info.translated_model._default_manager.using(using).filter(**{
+        info.translation_of_field + '__in': master_pks,
+        info.language_field + '__in': languages,
+    }).order_by('pk').values_list(info.translation_of_field, info.language_field, 'pk')
+    translation_pks = {}
+    for master_pk, language, pk in translations:
+        translation_pks.setdefault(master_pk, {}).setdefault(language, pk)
+    rows = []
+    for master_pk, pks in translation_pks.items():
+        for language, pk in resolve_translations(pks, languages).items():
+            rows.append([master_pk, language, pk])
+    cursor = connection.cursor()
+    cursor.execute('DELETE FROM %s WHERE master_id IN (%s)' % (table,
+        ', '.join(['%s'] * len(master_pks))), master_pks)
+    if rows:
+        cursor.executemany('INSERT INTO %s (master_id, language, translation_id) '
+            'VALUES (%%s, %%s, %%s)' % table, rows)
+    transaction.commit_unless_managed(using=using)
+
+def rebuild(model, using=DEFAULT_DB_ALIAS, chunk_size=1000):
+    """
+    Rewrites the table of ``model``, ``chunk_size`` masters at a time.
+    """
+    info = require_fallback_info(model)
+    connection = connections[using]
+    connection.cursor().execute('DELETE FROM %s' % connection.ops.quote_name(get_table(info)))
+    queryset = info.translation_of_model._default_manager.using(using).order_by('pk')
+    last_pk = None
+    while True:
+        chunk = queryset
+        if last_pk is not None:
+            chunk = queryset.filter(pk__gt=last_pk)
+        chunk = list(chunk.values_list('pk', flat=True)[:chunk_size])
+        refresh(info, chunk, using)
+        if len(chunk) < chunk_size:
+            break
+        last_pk = chunk[-1]
+    transaction.commit_unless_managed(using=using)
+
+def get_resolved_translations(model, language, master_pks=None, using=None):
+    """
+    The translations of ``model`` shown in ``language``, one per master of
+    ``master_pks`` or of all masters.
+    """
+    info = require_fallback_info(model)
+    translated_model = info.translated_model
+    using = get_read_database(translated_model, using)
+    qn = connections[using].ops.quote_name
+    table = qn(get_table(info))
+    where = ['%s.translation_id = %s.%s' % (table, qn(translated_model._meta.db_table),
+        qn(translated_model._meta.pk.column)), '%s.language = %%s' % table]
+    params = [language]
+    if master_pks is not None:
+        master_pks = list(master_pks)
+        if not master_pks:
+            return translated_model._default_manager.none()
+        where.append('%s.master_id IN (%s)' % (table, ', '.join(['%s'] * len(master_pks))))
+        params.extend(master_pks)
+    return translated_model._default_manager.using(using).extra(tables=[get_table(info)],
+        where=where, params=params)
+
+def get_resolved_translation(obj, language, using=None):
+    """
+    The translation of a master shown in ``language``, ``None`` when its
+    model has no fallback table. Cached on the master per language.
+    """
+    if not translation_pool.is_registered(obj.__class__) or not get_fallback_info(obj.__class__):
+        return None
+    if not hasattr(obj, 'resolved_translations'):
+        obj.resolved_translations = {}
+    if language not in obj.resolved_translations:
+        translations = list(get_resolved_translations(obj.__class__, language, [obj.pk], using))
+        obj.resolved_translations[language] = translations and translations[0] or None
+    return obj.resolved_translations[language]
+
+def annotate_with_resolved_translations(list_or_instance, language, using=None):
+    """
+    Sets ``translation``, the translation shown in ``language``, on a master
+    object or each object in a list, and caches it like
+    ``get_resolved_translation``.
+    """
+    if not list_or_instance:
+        return list_or_instance
+    object_list = isinstance(list_or_instance, models.Model) and [list_or_instance] or list_or_instance
+    info = require_fallback_info(object_list[0].__class__)
+    translations = get_resolved_translations(object_list[0].__class__, language,
+        [obj.pk for obj in object_list], using)
+    by_master = dict([(getattr(translation, info.translation_of_field + '_id'), translation) \
+        for translation in translations])
+    for obj in object_list:
+        obj.translation = by_master.get(obj.pk)
+        if not hasattr(obj, 'resolved_translations'):
+            obj.resolved_translations = {}
+        obj.resolved_translations[language] = obj.translation
+    return list_or_instance
+
+def refresh_on_change(sender, instance, using=None, **kwargs):
+    if not translation_pool.is_registered_translation(sender):
+        return
+    info = get_fallback_info(sender)
+    if info is None:
+        return
+    using = using or router.db_for_write(sender, instance=instance)
+    # the rows of a master the translation was moved away from
+    cursor = connections[using].cursor()
+    cursor.execute('SELECT master_id FROM %s WHERE translation_id = %%s' \
+        % connections[using].ops.quote_name(get_table(info)), [instance.pk])
+    master_pks = set([row[0] for row in cursor.fetchall()])
+    master_pks.add(getattr(instance, info.translation_of_field + '_id'))
+    refresh(info, master_pks, using)
+
+def create_fallback_tables(sender, db=DEFAULT_DB_ALIAS, **kwargs):
+    create_tables(db)
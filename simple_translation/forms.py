@@ -2,6 +2,7 @@ from django.forms.models import model_to_dict, fields_for_model
 from django.forms.models import  ModelForm, ModelFormMetaclass, modelform_factory, model_to_dict
 from django.forms.util import ErrorList, ErrorDict
 from django.core.exceptions import NON_FIELD_ERRORS
+from simple_translation.instrumentation import instrument
 from simple_translation.translation_pool import translation_pool
 
 class TranslationModelFormMetaclass(ModelFormMetaclass):
@@ -33,6 +34,10 @@ class TranslationModelFormMetaclass(ModelFormMetaclass):
 class TranslationModelForm(ModelForm):
     __metaclass__ = TranslationModelFormMetaclass
     
+    # set by TranslationAdmin.get_form to save looking the translation up again
+    child_instance = None
+    
+    @instrument('translation_form_init', lambda self, *args, **kwargs: self._meta.model)
     def __init__(self, data=None, files=None, auto_id='id_%s', prefix=None,
         initial={}, error_class=ErrorList, label_suffix=':',
         empty_permitted=False, instance=None):
@@ -43,7 +48,9 @@ class TranslationModelForm(ModelForm):
         
         current_language = self.base_fields[info.language_field].initial
 
-        if instance and instance.pk:
+        if self.child_instance is not None:
+            child_instance = self.child_instance
+        elif instance and instance.pk:
             try:
                 child_instance = child_model.objects.get(**{
                     info.translation_of_field: instance.pk,
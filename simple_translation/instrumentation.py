@@ -0,0 +1,257 @@
+"""
+Instrumentation of the translation_pool, utils and middleware operations. ::
+
+    from simple_translation.instrumentation import operation_finished
+
+    def log_operation(sender, operation, elapsed, rows, queries, cache_hit, **kwargs):
+        logger.info('%s %s %.4fs', operation, sender, elapsed)
+    operation_finished.connect(log_operation)
+
+The sender is the model the operation worked on, ``nested`` is set for
+operations called by other instrumented operations. Nothing is measured
+while no receiver is connected and no timing is started. Queries and their time are counted on all
+databases that log them, with ``DEBUG`` or ``connection.use_debug_cursor``.
+
+``stats`` keeps counters per operation and model in the process, set
+``SIMPLE_TRANSLATION_STATS = True`` to collect them. They are shown on the
+``translation-stats/`` admin page of every ``TranslationAdmin`` and by the
+``translation_stats`` management command.
+
+``start_timing`` and ``stop_timing`` collect the calls of the operations in
+the current thread and time their queries with a cursor wrapper, without
+logging the queries. ``TranslationTimingMiddleware`` uses them.
+"""
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.dispatch import Signal
+
+operation_finished = Signal(providing_args=['operation', 'elapsed', 'rows', 'queries',
+    'query_time', 'cache_hit', 'nested'])
+
+_local = threading.local()
+
+def count_queries():
+    """
+    The number of queries logged per database alias, ``None`` if no
+    database logs them.
+    """
+    counts = {}
+    for connection in connections.all():
+        if settings.DEBUG or connection.use_debug_cursor:
+            counts[connection.alias] = len(connection.queries)
+    return counts or None
+
+def get_query_stats(start):
+    """
+    The number and time of the queries logged since ``count_queries``
+    returned ``start``.
+    """
+    queries, query_time = 0, 0.0
+    for alias, count in (count_queries() or {}).items():
+        # the queries can be reset by a request in between
+        logged = connections[alias].queries[min(start.get(alias, 0), count):]
+        queries += len(logged)
+        query_time += sum([float(query['time']) for query in logged])
+    return queries, query_time
+
+class TimingCursorWrapper(object):
+
+    def __init__(self, cursor, timer):
+        self.cursor = cursor
+        self.timer = timer
+
+    def execute(self, sql, params=()):
+        start = time.time()
+        try:
+            return self.cursor.execute(sql, params)
+        finally:
+            self.timer.record_query(time.time() - start)
+
+    def executemany(self, sql, param_list):
+        start = time.time()
+        try:
+            return self.cursor.executemany(sql, param_list)
+        finally:
+            self.timer.record_query(time.time() - start)
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+class OperationTimer(object):
+    """
+    Calls and elapsed time per operation, and the queries of the outermost
+    operations, in one thread between ``start_timing`` and ``stop_timing``.
+    """
+
+    def __init__(self):
+        # operation -> [calls, elapsed]
+        self.timings = {}
+        self.total = self.query_time = 0.0
+        self.queries = 0
+
+    def record(self, operation, elapsed, nested):
+        timing = self.timings.setdefault(operation, [0, 0.0])
+        timing[0] += 1
+        timing[1] += elapsed
+        if not nested:
+            self.total += elapsed
+
+    def record_query(self, elapsed):
+        self.queries += 1
+        self.query_time += elapsed
+
+    def time_cursors(self):
+        # connections are thread local, the cursor method is shadowed for
+        # this thread only
+        for connection in connections.all():
+            connection.cursor = self.get_cursor_factory(connection)
+
+    def untime_cursors(self):
+        for connection in connections.all():
+            connection.__dict__.pop('cursor', None)
+
+    def get_cursor_factory(self, connection):
+        cursor = connection.__class__.cursor
+        def timed_cursor():
+            return TimingCursorWrapper(cursor(connection), self)
+        return timed_cursor
+
+def start_timing():
+    _local.timer = OperationTimer()
+
+def stop_timing():
+    """
+    The ``OperationTimer`` of the current thread, ``None`` if no timing
+    was started.
+    """
+    timer = getattr(_local, 'timer', None)
+    _local.timer = None
+    return timer
+
+def instrument(operation, get_model, get_rows=None, get_cache_hit=None):
+    """
+    Sends ``operation_finished`` after every call of the decorated function
+    and records it on the timer of the thread. ``get_model`` and ``get_cache_hit`` are called with the arguments before
+    the call, ``get_rows`` with the result after it.
+    """
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            timer = getattr(_local, 'timer', None)
+            send = bool(operation_finished.receivers)
+            if not send and timer is None:
+                return func(*args, **kwargs)
+            if send:
+                model = get_model(*args, **kwargs)
+                cache_hit = get_cache_hit and get_cache_hit(*args, **kwargs) or False
+                start_queries = count_queries()
+            depth = getattr(_local, 'depth', 0)
+            queries = query_time = None
+            _local.depth = depth + 1
+            if timer is not None and not depth:
+                timer.time_cursors()
+            start = time.time()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                _local.depth = depth
+                if timer is not None and not depth:
+                    timer.untime_cursors()
+            elapsed = time.time() - start
+            if timer is not None:
+                timer.record(operation, elapsed, depth > 0)
+            if not send:
+                return result
+            if start_queries is not None:
+                queries, query_time = get_query_stats(start_queries)
+            operation_finished.send(sender=model, operation=operation, elapsed=elapsed,
+                rows=get_rows and get_rows(result) or 0, queries=queries, query_time=query_time,
+                cache_hit=cache_hit, nested=depth > 0)
+            return result
+        # the template engine checks the filter arguments of the real function
+        wrapper._decorated_function = getattr(func, '_decorated_function', func)
+        return wraps(func)(wrapper)
+    return decorator
+
+def model_of(list_or_instance):
+    if not list_or_instance:
+        return None
+    if isinstance(list_or_instance, (list, tuple)):
+        return list_or_instance[0].__class__
+    return list_or_instance.__class__
+
+def is_annotated(list_or_instance):
+    if not isinstance(list_or_instance, (list, tuple)):
+        list_or_instance = [list_or_instance]
+    for obj in list_or_instance:
+        if not hasattr(obj, 'translations'):
+            return False
+    return True
+
+def count_translations(list_or_instance):
+    if not list_or_instance:
+        return 0
+    if not isinstance(list_or_instance, (list, tuple)):
+        list_or_instance = [list_or_instance]
+    return sum([len(getattr(obj, 'translations', [])) for obj in list_or_instance])
+
+class TranslationStats(object):
+    """
+    Calls, cache hits, rows, queries and elapsed time per operation and model.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def enable(self):
+        operation_finished.connect(self.record, dispatch_uid='simple_translation.stats')
+
+    def disable(self):
+        operation_finished.disconnect(dispatch_uid='simple_translation.stats')
+
+    def reset(self):
+        self.lock.acquire()
+        try:
+            self.counters = {}
+        finally:
+            self.lock.release()
+
+    def record(self, sender, operation, elapsed, rows, queries, cache_hit, **kwargs):
+        model = sender and '%s.%s' % (sender._meta.app_label, sender._meta.object_name) or ''
+        self.lock.acquire()
+        try:
+            counter = self.counters.get((operation, model))
+            if counter is None:
+                counter = self.counters[(operation, model)] = {'operation': operation, 'model': model,
+                    'calls': 0, 'cache_hits': 0, 'rows': 0, 'queries': 0, 'elapsed': 0.0}
+            counter['calls'] += 1
+            counter['cache_hits'] += cache_hit and 1 or 0
+            counter['rows'] += rows
+            counter['queries'] += queries or 0
+            counter['elapsed'] += elapsed
+        finally:
+            self.lock.release()
+
+    def get_counters(self, models=None):
+        """
+        A copy of the counters, of ``models`` only if given, sorted by
+        elapsed time.
+        """
+        if models is not None:
+            models = ['%s.%s' % (model._meta.app_label, model._meta.object_name) for model in models]
+        self.lock.acquire()
+        try:
+            counters = [dict(counter) for counter in self.counters.values() \
+                if models is None or counter['model'] in models]
+        finally:
+            self.lock.release()
+        return sorted(counters, key=lambda counter: -counter['elapsed'])
+
+stats = TranslationStats()
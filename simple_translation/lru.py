@@ -0,0 +1,70 @@
+"""
+A bounded map dropping the least recently used entries, shared by the
+threads of a process.
+"""
+import threading
+try:
+    from collections import OrderedDict
+except ImportError: # pragma: no cover
+    from django.utils.datastructures import SortedDict as OrderedDict
+
+class LRUCache(object):
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # most recently used last
+        self.entries = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        self.lock.acquire()
+        try:
+            try:
+                value = self.entries.pop(key)
+            except KeyError:
+                return default
+            self.entries[key] = value
+            return value
+        finally:
+            self.lock.release()
+
+    def set(self, key, value):
+        """
+        Returns the (key, value) of the entries dropped to make room.
+        """
+        dropped = []
+        self.lock.acquire()
+        try:
+            self.entries.pop(key, None)
+            self.entries[key] = value
+            while len(self.entries) > self.max_size:
+                # the first key, SortedDict has no popitem(last=False)
+                old_key = iter(self.entries).next()
+                dropped.append((old_key, self.entries.pop(old_key)))
+        finally:
+            self.lock.release()
+        return dropped
+
+    def pop(self, key, default=None):
+        self.lock.acquire()
+        try:
+            return self.entries.pop(key, default)
+        finally:
+            self.lock.release()
+
+    def keys(self):
+        self.lock.acquire()
+        try:
+            return self.entries.keys()
+        finally:
+            self.lock.release()
+
+    def clear(self):
+        self.lock.acquire()
+        try:
+            self.entries.clear()
+        finally:
+            self.lock.release()
@@ -0,0 +1,32 @@
+from optparse import make_option
+
+from django.conf import settings
+from django.core.management.base import NoArgsCommand, CommandError
+
+from simple_translation.snapshots import compile_snapshot, get_snapshot_dir
+from simple_translation.translation_pool import translation_pool
+
+class Command(NoArgsCommand):
+    help = 'Compiles the translations of all models registered in the translation_pool ' \
+        'into one snapshot file per model and language.'
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--output', dest='output', default=None,
+            help='Directory to write the snapshots to, defaults to settings.SIMPLE_TRANSLATION_SNAPSHOT_DIR.'),
+        make_option('--database', dest='database', default=None,
+            help='Database to read from, defaults to the router.'),
+        make_option('--chunk-size', type='int', dest='chunk_size', default=1000,
+            help='Number of translations read per query.'),
+    )
+
+    def handle_noargs(self, **options):
+        directory = options.get('output') or get_snapshot_dir()
+        if not directory:
+            raise CommandError('Set SIMPLE_TRANSLATION_SNAPSHOT_DIR or pass --output.')
+        translation_pool.discover_translations()
+        for model, info in translation_pool.translated_models_dict.items():
+            for language, language_name in settings.LANGUAGES:
+                path = compile_snapshot(directory, info, language, options.get('database'),
+                    options.get('chunk_size') or 1000)
+                if int(options.get('verbosity', 1)) > 0:
+                    self.stdout.write('Compiled %s\n' % path)
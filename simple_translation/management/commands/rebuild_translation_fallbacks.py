@@ -0,0 +1,24 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from simple_translation import fallbacks
+
+class Command(NoArgsCommand):
+    help = 'Rebuilds the fallback tables of all models registered with fallback_table.'
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--database', dest='database', default=DEFAULT_DB_ALIAS,
+            help='Database to rebuild the tables in.'),
+        make_option('--chunk-size', type='int', dest='chunk_size', default=1000,
+            help='Number of masters refreshed per query.'),
+    )
+
+    def handle_noargs(self, **options):
+        using = options.get('database') or DEFAULT_DB_ALIAS
+        fallbacks.create_tables(using)
+        for info in fallbacks.get_fallback_infos():
+            fallbacks.rebuild(info.translated_model, using, options.get('chunk_size') or 1000)
+            if int(options.get('verbosity', 1)) > 0:
+                self.stdout.write('Rebuilt the fallback table for %s\n' % info.translated_model.__name__)
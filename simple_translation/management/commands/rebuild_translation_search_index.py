@@ -0,0 +1,26 @@
+from optparse import make_option
+
+from django.core.management.base import NoArgsCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from simple_translation.search import get_search_index
+from simple_translation.translation_pool import translation_pool
+
+class Command(NoArgsCommand):
+    help = 'Rebuilds the search index of all models registered with search_fields.'
+
+    option_list = NoArgsCommand.option_list + (
+        make_option('--database', dest='database', default=DEFAULT_DB_ALIAS,
+            help='Database to rebuild the search index in.'),
+    )
+
+    def handle_noargs(self, **options):
+        using = options.get('database') or DEFAULT_DB_ALIAS
+        search_index = get_search_index()
+        search_index.create_tables(using)
+        translation_pool.discover_translations()
+        for model, info in translation_pool.translated_models_dict.items():
+            if info.search_fields:
+                search_index.rebuild(model, using)
+                if int(options.get('verbosity', 1)) > 0:
+                    self.stdout.write('Rebuilt the search index for %s\n' % model.__name__)
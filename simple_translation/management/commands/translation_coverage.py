@@ -0,0 +1,70 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import get_model
+
+from simple_translation.coverage import TranslationCoverage
+from simple_translation.translation_pool import translation_pool
+
+class Command(BaseCommand):
+    args = '[app_label.Model ...]'
+    help = 'Prints the number of masters translated and missing per language ' \
+        'for the given or all models registered in the translation_pool.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--languages', dest='languages', default=None,
+            help='Comma separated languages, defaults to settings.LANGUAGES.'),
+        make_option('--missing', action='store_true', dest='missing', default=False,
+            help='Write the model, language and primary key of every missing translation as csv.'),
+        make_option('--output', dest='output', default=None,
+            help='File to write the missing translations to, defaults to stdout.'),
+        make_option('--chunk-size', type='int', dest='chunk_size', default=None,
+            help='Number of missing primary keys read per query.'),
+        make_option('--database', dest='database', default=None,
+            help='Database to read from, defaults to the router.'),
+    )
+
+    def get_models(self, labels):
+        translation_pool.discover_translations()
+        if not labels:
+            return sorted(translation_pool.translated_models_dict.keys(),
+                key=lambda model: (model._meta.app_label, model._meta.object_name))
+        models = []
+        for label in labels:
+            try:
+                app_label, model_name = label.split('.')
+            except ValueError:
+                raise CommandError('Enter models as app_label.Model, not %r.' % label)
+            model = get_model(app_label, model_name)
+            if model is None or not translation_pool.is_registered(model):
+                raise CommandError('%s is not registered in the translation_pool.' % label)
+            models.append(model)
+        return models
+
+    def handle(self, *labels, **options):
+        languages = options.get('languages') and options['languages'].split(',') or None
+        coverages = [TranslationCoverage(model, languages, options.get('database'),
+            options.get('chunk_size')) for model in self.get_models(labels)]
+
+        if options.get('missing'):
+            out = options.get('output') and open(options['output'], 'w') or self.stdout
+            try:
+                for coverage in coverages:
+                    opts = coverage.model._meta
+                    for language in coverage.languages:
+                        for pk in coverage.iter_missing(language):
+                            out.write('%s.%s,%s,%s\n' % (opts.app_label, opts.object_name, language, pk))
+            finally:
+                if out is not self.stdout:
+                    out.close()
+            if not options.get('output'):
+                return
+
+        self.stdout.write('%-30s %-10s %10s %10s %10s\n' % ('model', 'language',
+            'translated', 'missing', 'percent'))
+        for coverage in coverages:
+            opts = coverage.model._meta
+            for row in coverage.get_report():
+                row['model'] = '%s.%s' % (opts.app_label, opts.object_name)
+                self.stdout.write('%(model)-30s %(language)-10s %(translated)10d %(missing)10d '
+                    '%(percent)9.1f%%\n' % row)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.client import Client
+
+from simple_translation.instrumentation import stats
+
+class Command(BaseCommand):
+    args = '[path path ...]'
+    help = 'Requests the given paths in process and prints the time spent in ' \
+        'translation operations per operation and model.'
+
+    def handle(self, *paths, **options):
+        stats.enable()
+        old_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        try:
+            client = Client()
+            for path in paths:
+                response = client.get(path)
+                self.stdout.write('%s %s\n' % (response.status_code, path))
+        finally:
+            connection.use_debug_cursor = old_debug_cursor
+        self.stdout.write('%-40s %-30s %8s %10s %8s %8s %10s\n' % ('operation', 'model',
+            'calls', 'cache hits', 'rows', 'queries', 'seconds'))
+        for counter in stats.get_counters():
+            self.stdout.write('%(operation)-40s %(model)-30s %(calls)8d %(cache_hits)10d '
+                '%(rows)8d %(queries)8d %(elapsed)10.4f\n' % counter)
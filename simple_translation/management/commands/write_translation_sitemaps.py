@@ -0,0 +1,85 @@
+import os
+from optparse import make_option
+
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand, CommandError
+
+from simple_translation.sitemaps import get_translation_sitemaps, \
+    iter_sitemap_xml, iter_sitemap_index_xml
+
+def write_sitemap_page(args):
+    """
+    Writes one sitemap file, runs in a worker process. The page range is
+    read by the parent, so workers only read their own masters.
+    """
+    section, page, page_range, path, domain, chunk_size = args
+    sitemap = get_translation_sitemaps(chunk_size)[section]
+    site = Site(domain=domain, name=domain)
+    tmp_path = '%s.tmp' % path
+    out = open(tmp_path, 'wb')
+    try:
+        for bit in iter_sitemap_xml(sitemap.get_urls(page=page, site=site, page_range=page_range)):
+            out.write(bit)
+    finally:
+        out.close()
+    os.rename(tmp_path, path)
+    return path
+
+class Command(BaseCommand):
+    args = '<directory>'
+    help = 'Writes a sitemap index and sitemap files with language alternates ' \
+        'for all models registered in the translation_pool.'
+    
+    option_list = BaseCommand.option_list + (
+        make_option('--processes', type='int', dest='processes', default=None,
+            help='Number of worker processes, defaults to the number of cpus.'),
+        make_option('--domain', dest='domain', default=None,
+            help='Domain of the urls, defaults to the current site.'),
+        make_option('--base-url', dest='base_url', default=None,
+            help='Url the sitemap files are served from, defaults to http://<domain>/.'),
+        make_option('--chunk-size', type='int', dest='chunk_size', default=None,
+            help='Number of masters loaded per query.'),
+    )
+
+    def handle(self, directory=None, **options):
+        if not directory:
+            raise CommandError('Enter the directory to write the sitemaps to.')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        domain = options.get('domain') or Site.objects.get_current().domain
+        base_url = options.get('base_url') or 'http://%s/' % domain
+        chunk_size = options.get('chunk_size')
+        processes = options.get('processes')
+        
+        tasks = []
+        for section, sitemap in sorted(get_translation_sitemaps(chunk_size).items()):
+            for page, page_range in enumerate(sitemap.get_page_ranges()):
+                filename = 'sitemap-%s-%s.xml' % (section, page + 1)
+                tasks.append((section, page + 1, page_range,
+                    os.path.join(directory, filename), domain, chunk_size))
+        
+        if processes == 1:
+            paths = [write_sitemap_page(task) for task in tasks]
+        else:
+            from django.db import connections
+            from multiprocessing import Pool
+            # forked workers must not use or close the connections of the
+            # parent, they open their own
+            for connection in connections.all():
+                connection.close()
+            pool = Pool(processes)
+            try:
+                paths = pool.map(write_sitemap_page, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        
+        locations = ['%s%s' % (base_url, os.path.basename(path)) for path in paths]
+        out = open(os.path.join(directory, 'sitemap.xml'), 'wb')
+        try:
+            for bit in iter_sitemap_index_xml(locations):
+                out.write(bit)
+        finally:
+            out.close()
+        if int(options.get('verbosity', 1)) > 0:
+            self.stdout.write('Wrote %s sitemaps to %s\n' % (len(paths), directory))
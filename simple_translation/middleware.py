@@ -1,11 +1,19 @@
+import logging
+
 from django.conf import settings
 from django.middleware.locale import LocaleMiddleware
 from django.utils import translation
+from django.utils.translation.trans_real import parse_accept_lang_header
 
+from simple_translation.instrumentation import instrument, start_timing, stop_timing
+from simple_translation.lru import LRUCache
+from simple_translation.routing import get_read_database
 from simple_translation.translation_pool import translation_pool
+from simple_translation.view_cache import record_list
 
-def filter_queryset_language(request, queryset):
-    language = getattr(request, 'LANGUAGE_CODE', None)
+@instrument('filter_queryset_language', lambda request, queryset, *args, **kwargs: queryset.model)
+def filter_queryset_language(request, queryset, language=None, using=None):
+    language = language or getattr(request, 'LANGUAGE_CODE', None)
 
     if not language:
         return queryset
@@ -19,15 +27,81 @@ def filter_queryset_language(request, queryset):
         info = translation_pool.get_info(model)
         filter_expr = '%s' % info.language_field
     if filter_expr:
-        queryset = queryset.filter( \
+        queryset = queryset.using(get_read_database(model, using or queryset._db)).filter( \
             **{filter_expr: language}).distinct()
+        record_list(model)
 
     return queryset
     
+class LanguageNegotiator(object):
+    """
+    Resolves the language of a request against ``settings.LANGUAGES`` like
+    ``LocaleMiddleware``, with the supported languages looked up once and a
+    bounded LRU cache from raw ``Accept-Language`` headers to languages,
+    shared by the threads of the process. The languages in ``settings.LANGUAGES`` are expected to have catalogs.
+    """
+    
+    def __init__(self, languages=None, cache_size=256):
+        languages = languages or settings.LANGUAGES
+        self.supported = {}
+        for code, name in languages:
+            self.supported[code.lower()] = code
+        for code, name in languages:
+            # e.g. en for en-gb, the first sublanguage wins
+            self.supported.setdefault(code.lower().split('-')[0], code)
+        self.default = self.supported.get(settings.LANGUAGE_CODE.lower(), languages[0][0])
+        self.cache = LRUCache(cache_size)
+        
+    def lookup(self, lang_code):
+        lang_code = lang_code.lower()
+        return self.supported.get(lang_code) or self.supported.get(lang_code.split('-')[0])
+        
+    def negotiate(self, accept):
+        for accept_lang, unused in parse_accept_lang_header(accept):
+            if accept_lang == '*':
+                break
+            lang_code = self.lookup(accept_lang)
+            if lang_code:
+                return lang_code
+        return self.default
+        
+    def get_language_from_header(self, accept):
+        language = self.cache.get(accept)
+        if language is None:
+            language = self.negotiate(accept)
+            self.cache.set(accept, language)
+        return language
+        
+    def get_language_from_request(self, request):
+        if hasattr(request, 'session'):
+            lang_code = request.session.get('django_language', None)
+            if lang_code in self.supported.values():
+                return lang_code
+        lang_code = request.COOKIES.get(settings.LANGUAGE_COOKIE_NAME)
+        if lang_code:
+            lang_code = self.lookup(lang_code)
+            if lang_code:
+                return lang_code
+        return self.get_language_from_header(request.META.get('HTTP_ACCEPT_LANGUAGE', ''))
+
 class MultilingualGenericsMiddleware(LocaleMiddleware):
+    """
+    With ``SIMPLE_TRANSLATION_FAST_NEGOTIATION = True`` and no
+    ``LocaleMiddleware`` the language of requests without a language in
+    the url is negotiated by a ``LanguageNegotiator``.
+    """
     
     language_fallback_middlewares = ['django.middleware.locale.LocaleMiddleware']
     
+    negotiation_cache_size = 256
+    
+    def __init__(self):
+        # the settings are read once, middleware is loaded at startup
+        self.has_fallback = self.has_language_fallback_middlewares()
+        self.negotiator = None
+        if getattr(settings, 'SIMPLE_TRANSLATION_FAST_NEGOTIATION', False) and not self.has_fallback:
+            self.negotiator = LanguageNegotiator(cache_size=self.negotiation_cache_size)
+    
     def has_language_fallback_middlewares(self):
         has_fallback = False
         for middleware in self.language_fallback_middlewares: 
@@ -36,20 +110,60 @@ class MultilingualGenericsMiddleware(LocaleMiddleware):
         return has_fallback
         
     def process_request(self, request):
-        pass
+        if self.negotiator is not None:
+            translation.activate(self.negotiator.get_language_from_request(request))
+            request.LANGUAGE_CODE = translation.get_language()
         
     def process_view(self, request, view_func, view_args, view_kwargs):
         language = None
         if 'language_code' in view_kwargs:
             # get language and set tralslation
             language = view_kwargs.pop('language_code')
+            request.language_from_url = True
             translation.activate(language)
             request.LANGUAGE_CODE = translation.get_language()
 
         if 'queryset' in view_kwargs:
-            view_kwargs['queryset'] = filter_queryset_language(request, view_kwargs['queryset'])  
+            queryset = filter_queryset_language(request, view_kwargs['queryset'])
+            if translation_pool.is_registered_translation(queryset.model):
+                # templates of translations usually show their master too
+                info = translation_pool.get_info(queryset.model)
+                queryset = queryset.select_related(info.translation_of_field)
+            view_kwargs['queryset'] = queryset
 
     def process_response(self, request, response):
-        if not self.has_language_fallback_middlewares():
+        if not self.has_fallback:
             return super(MultilingualGenericsMiddleware, self).process_response(request, response)
         return response
+
+logger = logging.getLogger('simple_translation.timing')
+
+class TranslationTimingMiddleware(object):
+    """
+    Reports the time spent in simple_translation operations and their
+    queries as a ``Server-Timing`` header, and as a log line on the
+    ``simple_translation.timing`` logger with
+    ``SIMPLE_TRANSLATION_TIMING_LOG = True``. Only the queries of these
+    operations are timed, on all databases.
+    """
+        
+    def process_request(self, request):
+        start_timing()
+        
+    def process_response(self, request, response):
+        timer = stop_timing()
+        if timer is None:
+            return response
+        timings = timer.timings
+        metrics = ['%s;dur=%.3f;desc="%d calls"' % (operation, elapsed * 1000, calls) \
+            for operation, (calls, elapsed) in sorted(timings.items())]
+        metrics.append('simple_translation;dur=%.3f' % (timer.total * 1000))
+        metrics.append('simple_translation_db;dur=%.3f;desc="%d queries"' % (
+            timer.query_time * 1000, timer.queries))
+        response['Server-Timing'] = ', '.join(metrics)
+        if getattr(settings, 'SIMPLE_TRANSLATION_TIMING_LOG', False):
+            logger.info('path=%s status=%s total_ms=%.3f queries=%d query_ms=%.3f %s', request.path,
+                response.status_code, timer.total * 1000, timer.queries, timer.query_time * 1000,
+                ' '.join(['%s_ms=%.3f %s_calls=%d' % (operation, elapsed * 1000, operation, calls) \
+                    for operation, (calls, elapsed) in sorted(timings.items())]))
+        return response
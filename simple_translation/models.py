@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.signals import request_started, request_finished
+from django.db.models import signals
+
+from simple_translation.conditional import bump_generation
+from simple_translation.fallbacks import refresh_on_change, create_fallback_tables
+from simple_translation.instrumentation import stats
+from simple_translation.routing import pin_on_write, start_request, finish_request
+from simple_translation.slugs import invalidate_slug_index
+from simple_translation.view_cache import invalidate_on_save, invalidate_on_delete
+from simple_translation.search import update_search_index, remove_from_search_index, \
+    start_search_queue, stop_search_queue, create_search_tables
+
+signals.post_save.connect(update_search_index)
+signals.post_delete.connect(remove_from_search_index)
+signals.post_syncdb.connect(create_search_tables)
+signals.post_save.connect(refresh_on_change)
+signals.post_delete.connect(refresh_on_change)
+signals.post_save.connect(invalidate_slug_index)
+signals.post_delete.connect(invalidate_slug_index)
+signals.post_syncdb.connect(create_fallback_tables)
+signals.post_save.connect(bump_generation)
+signals.post_delete.connect(bump_generation)
+signals.post_save.connect(invalidate_on_save)
+signals.post_delete.connect(invalidate_on_delete)
+signals.post_save.connect(pin_on_write)
+signals.post_delete.connect(pin_on_write)
+request_started.connect(start_request)
+request_finished.connect(finish_request)
+request_started.connect(start_search_queue)
+request_finished.connect(stop_search_queue)
+
+if getattr(settings, 'SIMPLE_TRANSLATION_STATS', False):
+    stats.enable()
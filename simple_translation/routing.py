@@ -0,0 +1,86 @@
+"""
+Database routing of translation reads. ::
+
+    translation_pool.annotate_with_translations(entries, using='replica')
+
+Without ``using`` the reads of the pool, the ``utils`` helpers and
+``filter_queryset_language`` go to ``router.db_for_read``. After a master
+or translation is saved or deleted they go to the database written to for
+the rest of the request, so a replica lagging behind is not read.
+
+Outside requests, in commands or tasks, the reads follow a write for
+``SIMPLE_TRANSLATION_PIN_SECONDS``, 5 by default, or until the end of a
+``pin_writes`` block::
+
+    with pin_writes():
+        ...
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import router
+
+_local = threading.local()
+
+def pin_to_database(using):
+    if getattr(_local, 'in_request', False) or getattr(_local, 'scopes', 0):
+        expires = None
+    else:
+        expires = time.time() + getattr(settings, 'SIMPLE_TRANSLATION_PIN_SECONDS', 5)
+    _local.pinned = (using, expires)
+
+def unpin(**kwargs):
+    _local.pinned = None
+
+def start_request(**kwargs):
+    _local.pinned = None
+    _local.in_request = True
+
+def finish_request(**kwargs):
+    _local.pinned = None
+    _local.in_request = False
+
+@contextmanager
+def pin_writes():
+    """
+    Reads follow the writes in the block until it ends.
+    """
+    outer_pinned = getattr(_local, 'pinned', None)
+    _local.pinned = None
+    _local.scopes = getattr(_local, 'scopes', 0) + 1
+    try:
+        yield
+    finally:
+        _local.scopes -= 1
+        _local.pinned = outer_pinned
+
+def get_pinned_database():
+    pinned = getattr(_local, 'pinned', None)
+    if pinned is None:
+        return None
+    using, expires = pinned
+    if expires is not None and time.time() > expires:
+        _local.pinned = None
+        return None
+    return using
+
+def get_read_database(model, using=None, instance=None):
+    """
+    ``using``, the database written to in this request or the database the
+    router reads ``model`` from.
+    """
+    if using is not None:
+        return using
+    pinned = get_pinned_database()
+    if pinned is not None:
+        return pinned
+    if instance is not None:
+        return router.db_for_read(model, instance=instance)
+    return router.db_for_read(model)
+
+def pin_on_write(sender, instance, using=None, **kwargs):
+    from simple_translation.translation_pool import translation_pool
+    if translation_pool.is_registered(sender) or translation_pool.is_registered_translation(sender):
+        pin_to_database(using or router.db_for_write(sender, instance=instance))
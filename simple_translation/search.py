@@ -0,0 +1,417 @@
+"""
+Per language full text search over the ``search_fields`` of registered
+translated models. ::
+
+    translation_pool.register_translation(Entry, EntryTitle, search_fields=('title',))
+
+    from simple_translation.search import get_search_index
+    entries = get_search_index().search(Entry, 'some words', language='de')
+
+Uses a SQLite FTS5 table or a PostgreSQL tsvector table when the database
+supports it and an in-process inverted index otherwise. The index is kept
+up to date by the post_save and post_delete signals of the translated models.
+"""
+import re
+import threading
+
+from django.conf import settings
+from django.db import connections, router, transaction, DEFAULT_DB_ALIAS
+from django.utils.encoding import force_unicode
+from django.utils.importlib import import_module
+
+from simple_translation.routing import get_read_database
+from simple_translation.translation_pool import translation_pool
+
+_search_index = None
+
+def tokenize(text):
+    return re.findall(r'\w+', force_unicode(text).lower(), re.UNICODE)
+
+class BaseSearchIndex(object):
+    """
+    Subclasses implement ``update``, ``remove``, ``rebuild`` and
+    ``search_hits``.
+    """
+
+    chunk_size = 1000
+    # masters matched by ``search_queryset`` at most
+    max_hits = 1000
+
+    def get_document(self, info, translation):
+        return u' '.join([force_unicode(getattr(translation, field) or u'') \
+            for field in info.search_fields])
+
+    def get_master_pk(self, info, translation):
+        return getattr(translation, info.translation_of_field + '_id')
+
+    def get_searchable_info(self, model):
+        info = translation_pool.get_info(model)
+        if info and info.search_fields:
+            return info
+
+    def iter_translations(self, info, using=None):
+        queryset = info.translated_model._default_manager.using(
+            get_read_database(info.translated_model, using)).order_by('pk')
+        last_pk = None
+        while True:
+            chunk = queryset
+            if last_pk is not None:
+                chunk = queryset.filter(pk__gt=last_pk)
+            chunk = list(chunk[:self.chunk_size])
+            for translation in chunk:
+                yield translation
+            if len(chunk) < self.chunk_size:
+                break
+            last_pk = chunk[-1].pk
+
+    def create_tables(self, using=DEFAULT_DB_ALIAS):
+        pass
+
+    def flush(self):
+        pass
+
+    def start_queue(self):
+        pass
+
+    def stop_queue(self):
+        pass
+
+    def add_many(self, translations, using=None):
+        """
+        Indexes new translations of one model.
+        """
+        for translation in translations:
+            self.update(translation, using)
+
+    def search_pks(self, model, query, language=None, fallback=True, using=None):
+        """
+        Master primary keys ordered by the best match in ``language`` and then
+        by the best match in any other language if ``fallback`` is set.
+        """
+        info = self.get_searchable_info(model)
+        tokens = tokenize(query)
+        if not info or not tokens:
+            return []
+        languages = [code for code, name in settings.LANGUAGES]
+        if language and not fallback:
+            languages = [language]
+        best = {}
+        for master_pk, hit_language, score in self.search_hits(info, tokens, languages, using):
+            key = (language and hit_language != language, -score)
+            if master_pk not in best or key < best[master_pk]:
+                best[master_pk] = key
+        return [pk for pk, key in sorted(best.items(), key=lambda item: (item[1], item[0]))]
+
+    def search(self, model, query, language=None, fallback=True, limit=None, using=None):
+        pks = self.search_pks(model, query, language, fallback, using)[:limit]
+        objects = model._default_manager.using(get_read_database(model, using)).in_bulk(pks)
+        return [objects[pk] for pk in pks if pk in objects]
+
+    def search_queryset(self, model, query, using=None):
+        """
+        The masters matching ``query`` in any language, unordered, to filter
+        other querysets with. Keeps the ``max_hits`` best matches.
+        """
+        return model._default_manager.using(get_read_database(model, using)).filter(
+            pk__in=self.search_pks(model, query, using=using)[:self.max_hits])
+
+class PythonSearchIndex(BaseSearchIndex):
+    """
+    In-process inverted index per translated model and language, built on
+    first use. Other processes do not see updates, use it for development
+    or small sites only.
+    """
+
+    def __init__(self):
+        # translated model -> language -> token -> translation pk -> count
+        self.indexes = {}
+        # translated model -> translation pk -> (master pk, language, tokens)
+        self.documents = {}
+
+    def _add(self, info, translation):
+        language = getattr(translation, info.language_field)
+        tokens = tokenize(self.get_document(info, translation))
+        postings = self.indexes[info.translated_model].setdefault(language, {})
+        for token in tokens:
+            counts = postings.setdefault(token, {})
+            counts[translation.pk] = counts.get(translation.pk, 0) + 1
+        self.documents[info.translated_model][translation.pk] = \
+            (self.get_master_pk(info, translation), language, set(tokens))
+
+    def _remove(self, info, pk):
+        document = self.documents[info.translated_model].pop(pk, None)
+        if document is None:
+            return
+        master_pk, language, tokens = document
+        postings = self.indexes[info.translated_model].get(language, {})
+        for token in tokens:
+            postings.get(token, {}).pop(pk, None)
+
+    def _ensure_index(self, info, using=None):
+        if info.translated_model not in self.indexes:
+            self.rebuild(info.translation_of_model, using)
+
+    def update(self, translation, using=None):
+        info = self.get_searchable_info(translation.__class__)
+        if info and info.translated_model in self.indexes:
+            self._remove(info, translation.pk)
+            self._add(info, translation)
+
+    def remove(self, translation, using=None):
+        info = self.get_searchable_info(translation.__class__)
+        if info and info.translated_model in self.indexes:
+            self._remove(info, translation.pk)
+
+    def rebuild(self, model, using=None):
+        info = self.get_searchable_info(model)
+        self.indexes[info.translated_model] = {}
+        self.documents[info.translated_model] = {}
+        for translation in self.iter_translations(info, using):
+            self._add(info, translation)
+
+    def search_hits(self, info, tokens, languages, using=None):
+        self._ensure_index(info, using)
+        documents = self.documents[info.translated_model]
+        for language in languages:
+            postings = self.indexes[info.translated_model].get(language, {})
+            matches = None
+            for token in tokens:
+                counts = postings.get(token, {})
+                if matches is None:
+                    matches = dict(counts)
+                else:
+                    matches = dict([(pk, score + counts[pk]) \
+                        for pk, score in matches.items() if pk in counts])
+                if not matches:
+                    break
+            for pk, score in (matches or {}).items():
+                yield documents[pk][0], language, score
+
+class DatabaseSearchIndex(BaseSearchIndex):
+    """
+    Keeps one row per translation in a table next to the translated model,
+    in the database the router writes the translated model to. Subclasses
+    give the SQL, ``%(table)s`` is the quoted table name.
+
+    Saves and deletes in a request are queued and written with one delete
+    and one insert per model at the end of the request, before a search and
+    when ``chunk_size`` are queued. Outside requests they are written at once.
+    """
+
+    # statements creating the table
+    create_sql = ()
+    # the row of a translation: translation pk, master pk, language, document
+    insert_sql = None
+    key_column = None
+    # condition on the table matching the query
+    match_sql = None
+    # master pk, language and score of the matches in %(languages)s
+    search_sql = None
+
+    def __init__(self):
+        self.local = threading.local()
+
+    def get_table(self, info):
+        return '%s_search' % info.translated_model._meta.db_table
+
+    def format_sql(self, sql, info, using, **kwargs):
+        kwargs['table'] = connections[using].ops.quote_name(self.get_table(info))
+        return sql % kwargs
+
+    def get_row(self, info, translation):
+        return [translation.pk, self.get_master_pk(info, translation),
+            getattr(translation, info.language_field), self.get_document(info, translation)]
+
+    def create_tables(self, using=DEFAULT_DB_ALIAS):
+        translation_pool.discover_translations()
+        table_names = connections[using].introspection.table_names()
+        for info in translation_pool.translated_models_dict.values():
+            if info.search_fields and self.get_table(info) not in table_names and \
+                router.allow_syncdb(using, info.translated_model):
+                cursor = connections[using].cursor()
+                for sql in self.create_sql:
+                    cursor.execute(self.format_sql(sql, info, using))
+        transaction.commit_unless_managed(using=using)
+
+    def get_pending(self):
+        # (database, translated model) -> translation pk -> translation or None
+        if not hasattr(self.local, 'pending'):
+            self.local.pending = {}
+        return self.local.pending
+
+    def start_queue(self):
+        self.flush()
+        self.local.queueing = True
+
+    def stop_queue(self):
+        self.local.queueing = False
+        self.flush()
+
+    def queue(self, translation, using, removed=False):
+        info = self.get_searchable_info(translation.__class__)
+        if not info:
+            return
+        using = using or router.db_for_write(info.translated_model, instance=translation)
+        pending = self.get_pending().setdefault((using, info.translated_model), {})
+        pending[translation.pk] = not removed and translation or None
+        if len(pending) >= self.chunk_size or not getattr(self.local, 'queueing', False):
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the queued saves and deletes of this thread.
+        """
+        pending, self.local.pending = self.get_pending(), {}
+        for (using, translated_model), translations in pending.items():
+            info = self.get_searchable_info(translated_model)
+            pks = translations.keys()
+            cursor = connections[using].cursor()
+            cursor.execute(self.format_sql('DELETE FROM %(table)s WHERE %(key)s IN (%(pks)s)', info, using,
+                key=self.key_column, pks=', '.join(['%s'] * len(pks))), pks)
+            rows = [self.get_row(info, translation) for translation in translations.values() \
+                if translation is not None]
+            if rows:
+                cursor.executemany(self.format_sql(self.insert_sql, info, using), rows)
+            transaction.commit_unless_managed(using=using)
+
+    def update(self, translation, using=None):
+        self.queue(translation, using)
+
+    def remove(self, translation, using=None):
+        self.queue(translation, using, removed=True)
+
+    def add_many(self, translations, using=None):
+        info = translations and self.get_searchable_info(translations[0].__class__)
+        if info:
+            using = using or router.db_for_write(info.translated_model)
+            connections[using].cursor().executemany(self.format_sql(self.insert_sql, info, using),
+                [self.get_row(info, translation) for translation in translations])
+            transaction.commit_unless_managed(using=using)
+
+    def rebuild(self, model, using=None):
+        info = self.get_searchable_info(model)
+        using = using or router.db_for_write(info.translated_model)
+        cursor = connections[using].cursor()
+        cursor.execute(self.format_sql('DELETE FROM %(table)s', info, using))
+        rows = []
+        for translation in self.iter_translations(info, using):
+            rows.append(self.get_row(info, translation))
+            if len(rows) == self.chunk_size:
+                cursor.executemany(self.format_sql(self.insert_sql, info, using), rows)
+                rows = []
+        if rows:
+            cursor.executemany(self.format_sql(self.insert_sql, info, using), rows)
+        transaction.commit_unless_managed(using=using)
+
+    def search_query(self, tokens):
+        return u' '.join(tokens)
+
+    def search_hits(self, info, tokens, languages, using=None):
+        self.flush()
+        using = get_read_database(info.translated_model, using)
+        cursor = connections[using].cursor()
+        cursor.execute(self.format_sql(self.search_sql, info, using,
+            languages=', '.join(['%s'] * len(languages))), [self.search_query(tokens)] + list(languages))
+        return cursor.fetchall()
+
+    def search_queryset(self, model, query, using=None):
+        """
+        The masters matching ``query`` in any language, with a subquery on
+        the table.
+        """
+        info = self.get_searchable_info(model)
+        tokens = tokenize(query)
+        using = get_read_database(model, using)
+        if not info or not tokens:
+            return model._default_manager.using(using).none()
+        self.flush()
+        qn = connections[using].ops.quote_name
+        sql = '%s.%s IN (SELECT master_id FROM %%(table)s WHERE %s)' % (qn(model._meta.db_table),
+            qn(model._meta.pk.column), self.match_sql)
+        return model._default_manager.using(using).extra(where=[self.format_sql(sql, info, using)],
+            params=[self.search_query(tokens)])
+
+class SQLiteSearchIndex(DatabaseSearchIndex):
+
+    create_sql = ('CREATE VIRTUAL TABLE %(table)s USING fts5('
+        'document, language UNINDEXED, master_id UNINDEXED)',)
+    insert_sql = 'INSERT INTO %(table)s (rowid, master_id, language, document) VALUES (%%s, %%s, %%s, %%s)'
+    key_column = 'rowid'
+    match_sql = '%(table)s MATCH %%s'
+    search_sql = 'SELECT master_id, language, -bm25(%(table)s) FROM %(table)s ' \
+        'WHERE %(table)s MATCH %%s AND language IN (%(languages)s)'
+
+    def search_query(self, tokens):
+        return u' '.join([u'"%s"' % token.replace(u'"', u'""') for token in tokens])
+
+class PostgreSQLSearchIndex(DatabaseSearchIndex):
+    """
+    Uses the ``simple`` text search configuration for all languages so one
+    GIN index serves every query.
+    """
+
+    create_sql = (
+        'CREATE TABLE %(table)s (translation_id integer PRIMARY KEY, '
+            'master_id integer NOT NULL, language varchar(15) NOT NULL, '
+            'document tsvector NOT NULL)',
+        'CREATE INDEX %(index)s ON %(table)s USING gin(document)',
+    )
+    insert_sql = 'INSERT INTO %(table)s (translation_id, master_id, language, document) ' \
+        'VALUES (%%s, %%s, %%s, to_tsvector(\'simple\', %%s))'
+    key_column = 'translation_id'
+    match_sql = 'document @@ plainto_tsquery(\'simple\', %%s)'
+    search_sql = 'SELECT master_id, language, ts_rank(document, query) ' \
+        'FROM %(table)s, plainto_tsquery(\'simple\', %%s) query ' \
+        'WHERE document @@ query AND language IN (%(languages)s)'
+
+    def format_sql(self, sql, info, using, **kwargs):
+        kwargs['index'] = connections[using].ops.quote_name('%s_document' % self.get_table(info))
+        return super(PostgreSQLSearchIndex, self).format_sql(sql, info, using, **kwargs)
+
+def has_sqlite_fts5(using=DEFAULT_DB_ALIAS):
+    cursor = connections[using].cursor()
+    cursor.execute('PRAGMA compile_options')
+    return 'ENABLE_FTS5' in [row[0] for row in cursor.fetchall()]
+
+def get_search_index():
+    """
+    ``settings.SIMPLE_TRANSLATION_SEARCH_INDEX`` can name a search index
+    class, otherwise it is chosen for the default database. Translations
+    routed to other databases need the same kind of database.
+    """
+    global _search_index
+    if _search_index is None:
+        path = getattr(settings, 'SIMPLE_TRANSLATION_SEARCH_INDEX', None)
+        connection = connections[DEFAULT_DB_ALIAS]
+        if path:
+            module, attr = path.rsplit('.', 1)
+            index_class = getattr(import_module(module), attr)
+        elif connection.vendor == 'sqlite' and has_sqlite_fts5():
+            index_class = SQLiteSearchIndex
+        elif connection.vendor == 'postgresql':
+            index_class = PostgreSQLSearchIndex
+        else:
+            index_class = PythonSearchIndex
+        _search_index = index_class()
+    return _search_index
+
+def update_search_index(sender, instance, using=None, **kwargs):
+    if translation_pool.is_registered_translation(sender) and \
+        translation_pool.get_info(sender).search_fields:
+        get_search_index().update(instance, using)
+
+def remove_from_search_index(sender, instance, using=None, **kwargs):
+    if translation_pool.is_registered_translation(sender) and \
+        translation_pool.get_info(sender).search_fields:
+        get_search_index().remove(instance, using)
+
+def start_search_queue(**kwargs):
+    if _search_index is not None:
+        _search_index.start_queue()
+
+def stop_search_queue(**kwargs):
+    if _search_index is not None:
+        _search_index.stop_queue()
+
+def create_search_tables(sender, db=DEFAULT_DB_ALIAS, **kwargs):
+    get_search_index().create_tables(db)
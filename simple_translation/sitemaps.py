@@ -0,0 +1,199 @@
+"""
+Sitemaps with ``xhtml:link`` alternates for models registered in the
+translation_pool.
+
+Masters are walked in primary key chunks with one translation query per
+chunk and the xml is streamed, so neither the views nor the
+``write_translation_sitemaps`` command hold a whole sitemap in memory.
+"""
+from django.conf import settings
+from django.contrib.sitemaps import Sitemap
+from django.contrib.sites.models import Site, get_current_site
+from django.core import urlresolvers
+from django.core.paginator import EmptyPage, PageNotAnInteger
+from django.http import HttpResponse, Http404
+from django.utils.encoding import smart_str
+from django.utils.html import escape
+
+from simple_translation.translation_pool import translation_pool
+from simple_translation.utils import annotate_with_translation_urls
+
+class TranslationSitemap(Sitemap):
+    """
+    One ``<url>`` per translation with every translation of the same master
+    as alternates. A page holds at most ``limit`` urls.
+    """
+    chunk_size = 500
+
+    def __init__(self, model, queryset=None, chunk_size=None):
+        self.model = model
+        self.queryset = queryset
+        self.chunk_size = chunk_size or self.chunk_size
+
+    def get_queryset(self):
+        if self.queryset is not None:
+            return self.queryset._clone()
+        return self.model._default_manager.all()
+
+    def get_masters_per_page(self):
+        return max(1, self.limit // len(settings.LANGUAGES))
+
+    def _get_num_pages(self):
+        per_page = self.get_masters_per_page()
+        return (self.get_queryset().count() + per_page - 1) // per_page
+    num_pages = property(_get_num_pages)
+
+    def get_page_range(self, page=1):
+        """
+        (first primary key, ``None``) of ``page``, read with one offset query
+        on the primary keys, ``None`` if there are no masters. The page
+        holds the masters per page from its first primary key on.
+        """
+        try:
+            page = int(page)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if page < 1:
+            raise EmptyPage('That page contains no results')
+        offset = (page - 1) * self.get_masters_per_page()
+        pks = list(self.get_queryset().order_by('pk').values_list('pk', flat=True)[offset:offset + 1])
+        if not pks:
+            if page == 1:
+                return None
+            raise EmptyPage('That page contains no results')
+        return (pks[0], None)
+
+    def get_page_ranges(self):
+        """
+        (first primary key, first primary key of the next page or ``None``)
+        of every page, read in one pass over the primary keys for the
+        ``write_translation_sitemaps`` command.
+        """
+        per_page = self.get_masters_per_page()
+        pks = self.get_queryset().order_by('pk').values_list('pk', flat=True).iterator()
+        bounds = [pk for index, pk in enumerate(pks) if not index % per_page]
+        return zip(bounds, bounds[1:] + [None])
+
+    def iter_masters(self, page=1, page_range=None):
+        """
+        The masters of ``page`` with their translations. A ``page_range``
+        from ``get_page_ranges`` saves reading the page bounds.
+        """
+        if page_range is None:
+            page_range = self.get_page_range(page)
+        if page_range is None:
+            return
+        lower_pk, upper_pk = page_range
+        queryset = self.get_queryset().order_by('pk').filter(pk__gte=lower_pk)
+        if upper_pk is not None:
+            queryset = queryset.filter(pk__lt=upper_pk)
+        remaining = self.get_masters_per_page()
+        last_pk = None
+        while remaining > 0:
+            chunk_queryset = queryset
+            if last_pk is not None:
+                chunk_queryset = queryset.filter(pk__gt=last_pk)
+            chunk = list(chunk_queryset[:min(self.chunk_size, remaining)])
+            if not chunk:
+                break
+            annotate_with_translation_urls(chunk)
+            for master in chunk:
+                yield master
+            if len(chunk) < self.chunk_size:
+                break
+            remaining -= len(chunk)
+            last_pk = chunk[-1].pk
+
+    def _get(self, name, obj, default=None):
+        attr = getattr(self, name, None)
+        if attr is None:
+            return default
+        if callable(attr):
+            return attr(obj)
+        return attr
+
+    def get_urls(self, page=1, site=None, page_range=None):
+        if site is None:
+            site = Site.objects.get_current()
+        for master in self.iter_masters(page, page_range):
+            alternates = [(language, 'http://%s%s' % (site.domain, url)) \
+                for language, url in master.translation_urls]
+            for translation, (language, location) in zip(master.translations, alternates):
+                priority = self._get('priority', translation)
+                yield {
+                    'item': translation,
+                    'location': location,
+                    'lastmod': self._get('lastmod', translation),
+                    'changefreq': self._get('changefreq', translation),
+                    'priority': str(priority is not None and priority or ''),
+                    'alternates': alternates,
+                }
+
+def get_translation_sitemaps(chunk_size=None):
+    """
+    A ``TranslationSitemap`` for every model registered in the translation_pool.
+    """
+    translation_pool.discover_translations()
+    sitemaps = {}
+    for model in translation_pool.translated_models_dict:
+        opts = model._meta
+        sitemaps['%s-%s' % (opts.app_label, opts.object_name.lower())] = \
+            TranslationSitemap(model, chunk_size=chunk_size)
+    return sitemaps
+
+def iter_sitemap_xml(urls):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n' \
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" ' \
+        'xmlns:xhtml="http://www.w3.org/1999/xhtml">\n'
+    for url in urls:
+        bits = ['<url><loc>%s</loc>' % escape(url['location'])]
+        for language, location in url['alternates']:
+            bits.append('<xhtml:link rel="alternate" hreflang="%s" href="%s"/>' % (
+                escape(language), escape(location)))
+        if url['lastmod']:
+            bits.append('<lastmod>%s</lastmod>' % url['lastmod'].strftime('%Y-%m-%d'))
+        if url['changefreq']:
+            bits.append('<changefreq>%s</changefreq>' % url['changefreq'])
+        if url['priority']:
+            bits.append('<priority>%s</priority>' % url['priority'])
+        bits.append('</url>\n')
+        yield smart_str(u''.join(bits))
+    yield '</urlset>\n'
+
+def iter_sitemap_index_xml(locations):
+    yield '<?xml version="1.0" encoding="UTF-8"?>\n' \
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    for location in locations:
+        yield smart_str(u'<sitemap><loc>%s</loc></sitemap>\n' % escape(location))
+    yield '</sitemapindex>\n'
+
+def index(request, sitemaps=None):
+    sitemaps = sitemaps or get_translation_sitemaps()
+    current_site = get_current_site(request)
+    protocol = request.is_secure() and 'https' or 'http'
+    locations = []
+    for section, site in sitemaps.items():
+        sitemap_url = urlresolvers.reverse('simple_translation.sitemaps.sitemap', kwargs={'section': section})
+        locations.append('%s://%s%s' % (protocol, current_site.domain, sitemap_url))
+        for page in range(2, site.num_pages + 1):
+            locations.append('%s://%s%s?p=%s' % (protocol, current_site.domain, sitemap_url, page))
+    return HttpResponse(iter_sitemap_index_xml(locations), mimetype='application/xml')
+
+def sitemap(request, section, sitemaps=None):
+    sitemaps = sitemaps or get_translation_sitemaps()
+    if section not in sitemaps:
+        raise Http404("No sitemap available for section: %r" % section)
+    urls = sitemaps[section].get_urls(page=request.GET.get("p", 1), site=get_current_site(request))
+    try:
+        # fail before the response starts streaming
+        first_url = urls.next()
+    except StopIteration:
+        first_url = None
+    except (EmptyPage, PageNotAnInteger):
+        raise Http404("No page '%s'" % request.GET.get("p", 1))
+    def iter_urls():
+        if first_url is not None:
+            yield first_url
+            for url in urls:
+                yield url
+    return HttpResponse(iter_sitemap_xml(iter_urls()), mimetype='application/xml')
@@ -0,0 +1,230 @@
+"""
+In-process index of translated slugs. ::
+
+    translation_pool.register_translation(Entry, EntryTitle, slug_field='slug')
+
+    from simple_translation.slugs import get_slug_index
+    master_pk, translation_pk = get_slug_index().lookup(Entry, 'de', 'titel')
+
+Maps (language, slug) to the primary keys of the master and the translation
+in a bounded LRU map per process, filled on first lookup or by ``warm``.
+Slugs that do not exist are remembered too. The translated detail views use
+it for slug lookups, so a hot detail page is read by primary key.
+
+Entries of a translation are dropped by its post_save and post_delete
+signals, which also append the changed slugs to a log per model in the
+cache. Every process reads the log at most once per ``check_interval`` and
+drops only those entries, or all entries of the model when the log was
+evicted. The log needs a cache shared by all processes, with the dummy
+cache only the own writes are noticed.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from simple_translation.lru import LRUCache
+from simple_translation.routing import get_read_database
+from simple_translation.translation_pool import translation_pool
+
+CHANGES_KEY = 'simple_translation.slugs.%s.%s'
+CHANGE_KEY = 'simple_translation.slugs.%s.%s.%s'
+
+_slug_index = None
+
+def get_slug_info(model):
+    info = translation_pool.get_info(model)
+    if info and info.slug_field:
+        return info
+
+def get_changes_key(translated_model, number=None):
+    opts = translated_model._meta
+    if number is None:
+        return CHANGES_KEY % (opts.app_label, opts.object_name.lower())
+    return CHANGE_KEY % (opts.app_label, opts.object_name.lower(), number)
+
+def log_slug_changes(translated_model, changes):
+    """
+    Appends ``changes``, a list of (translation pk, language, slug), to the
+    log of ``translated_model`` read by the other processes.
+    """
+    key = get_changes_key(translated_model)
+    cache.add(key, 0)
+    try:
+        number = cache.incr(key)
+    except ValueError:
+        # the dummy cache, or the log was evicted in between
+        return
+    cache.set(get_changes_key(translated_model, number), changes)
+
+class SlugIndex(object):
+
+    # more changes since the last check drop all entries of the model
+    max_changes = 100
+
+    def __init__(self, max_size=10000, check_interval=1):
+        self.max_size = max_size
+        self.check_interval = check_interval
+        self.lock = threading.RLock()
+        # (translated model, language, slug) -> (master pk, translation pk) or None
+        self.entries = LRUCache(max_size)
+        # (translated model, translation pk) -> key in entries
+        self.keys = {}
+        # translated model -> number of the last change read from the log
+        self.numbers = {}
+        # translated model -> time of the next read of the log
+        self.next_checks = {}
+
+    def check_changes(self, info):
+        translated_model = info.translated_model
+        now = time.time()
+        self.lock.acquire()
+        try:
+            if now < self.next_checks.get(translated_model, 0):
+                return
+            self.next_checks[translated_model] = now + self.check_interval
+            first_check = translated_model not in self.numbers
+            last_number = self.numbers.get(translated_model, 0)
+        finally:
+            self.lock.release()
+        number = cache.get(get_changes_key(translated_model)) or 0
+        if first_check or number == last_number:
+            changes = []
+        elif last_number < number <= last_number + self.max_changes:
+            keys = [get_changes_key(translated_model, n) for n in xrange(last_number + 1, number + 1)]
+            logged = cache.get_many(keys)
+            if len(logged) == len(keys):
+                changes = sum([logged[key] for key in keys], [])
+            else:
+                changes = None
+        else:
+            # evicted, reset or too far behind
+            changes = None
+        self.lock.acquire()
+        try:
+            if changes is None:
+                self.clear(translated_model)
+            for pk, language, slug in changes or []:
+                self.discard_translation(translated_model, pk, language, slug)
+            self.numbers[translated_model] = number
+        finally:
+            self.lock.release()
+
+    def set(self, key, value):
+        self.lock.acquire()
+        try:
+            if value is not None:
+                self.keys[(key[0], value[1])] = key
+            for old_key, old_value in self.entries.set(key, value):
+                if old_value is not None:
+                    self.keys.pop((old_key[0], old_value[1]), None)
+        finally:
+            self.lock.release()
+
+    def discard(self, key):
+        self.lock.acquire()
+        try:
+            value = self.entries.pop(key)
+            if value is not None:
+                self.keys.pop((key[0], value[1]), None)
+        finally:
+            self.lock.release()
+
+    def discard_translation(self, translated_model, pk, language, slug):
+        self.lock.acquire()
+        try:
+            key = self.keys.get((translated_model, pk))
+            if key is not None:
+                self.discard(key)
+            # a slug remembered as missing
+            self.discard((translated_model, language, slug))
+        finally:
+            self.lock.release()
+
+    def lookup(self, model, language, slug, using=None):
+        """
+        (master pk, translation pk) of the translation of ``model`` with
+        ``slug`` in ``language``, ``None`` if there is none.
+        """
+        info = get_slug_info(model)
+        self.check_changes(info)
+        key = (info.translated_model, language, slug)
+        missing = object()
+        value = self.entries.get(key, missing)
+        if value is missing:
+            translated_model = info.translated_model
+            rows = list(translated_model._default_manager.using(get_read_database(translated_model, using)) \
+                .filter(**{info.slug_field: slug, info.language_field: language}) \
+                .values_list(info.translation_of_field, 'pk')[:1])
+            value = rows and tuple(rows[0]) or None
+            self.set(key, value)
+        return value
+
+    def warm(self, model, using=None, chunk_size=1000):
+        """
+        Reads the slugs of ``model`` in all languages until the index is full.
+        """
+        info = get_slug_info(model)
+        self.check_changes(info)
+        translated_model = info.translated_model
+        languages = [code for code, name in settings.LANGUAGES]
+        queryset = translated_model._default_manager.using(get_read_database(translated_model, using)) \
+            .filter(**{'%s__in' % info.language_field: languages}).order_by('pk') \
+            .values_list('pk', info.translation_of_field, info.language_field, info.slug_field)
+        last_pk = None
+        while len(self.entries) < self.max_size:
+            chunk = queryset
+            if last_pk is not None:
+                chunk = queryset.filter(pk__gt=last_pk)
+            chunk = list(chunk[:chunk_size])
+            for pk, master_pk, language, slug in chunk:
+                if len(self.entries) >= self.max_size:
+                    break
+                self.set((translated_model, language, slug), (master_pk, pk))
+            if len(chunk) < chunk_size:
+                break
+            last_pk = chunk[-1][0]
+
+    def invalidate(self, translations):
+        """
+        Drops the entries of ``translations`` of one model here and logs
+        them for the other processes.
+        """
+        if not translations:
+            return
+        info = get_slug_info(translations[0].__class__)
+        translated_model = info.translated_model
+        changes = [(translation.pk, getattr(translation, info.language_field),
+            getattr(translation, info.slug_field)) for translation in translations]
+        for pk, language, slug in changes:
+            self.discard_translation(translated_model, pk, language, slug)
+        log_slug_changes(translated_model, changes)
+
+    def clear(self, model=None):
+        self.lock.acquire()
+        try:
+            if model is None:
+                self.entries.clear()
+                self.keys.clear()
+                return
+            for key in [key for key in self.entries.keys() if key[0] is model]:
+                self.discard(key)
+        finally:
+            self.lock.release()
+
+def get_slug_index():
+    """
+    ``settings.SIMPLE_TRANSLATION_SLUG_INDEX_SIZE`` bounds the number of
+    slugs kept, 10000 by default. The log of changes is read at most every
+    ``settings.SIMPLE_TRANSLATION_SLUG_INDEX_CHECK_SECONDS``, 1 by default.
+    """
+    global _slug_index
+    if _slug_index is None:
+        _slug_index = SlugIndex(getattr(settings, 'SIMPLE_TRANSLATION_SLUG_INDEX_SIZE', 10000),
+            getattr(settings, 'SIMPLE_TRANSLATION_SLUG_INDEX_CHECK_SECONDS', 1))
+    return _slug_index
+
+def invalidate_slug_index(sender, instance, **kwargs):
+    if translation_pool.is_registered_translation(sender) and get_slug_info(sender):
+        get_slug_index().invalidate([instance])
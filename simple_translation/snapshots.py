@@ -0,0 +1,299 @@
+"""
+Read-only snapshot files of the translations of registered models. ::
+
+    python manage.py compile_translation_snapshots
+
+    SIMPLE_TRANSLATION_SNAPSHOT_DIR = '/var/lib/mysite/snapshots'
+    SIMPLE_TRANSLATION_POOL = 'simple_translation.snapshots.SnapshotTranslationPool'
+
+The command writes one file per translated model and language with the
+sorted primary keys of the masters, an offset table and the field values
+of their translations. The pool maps the files into memory, so all worker
+processes share them through the page cache, and annotates masters from
+them without a query.
+
+The version of a snapshot is the highest primary key of the masters when
+it was compiled. Masters created later are annotated from the database,
+changes to older masters show up once the snapshots are compiled again.
+Files are replaced atomically and reopened when they change.
+"""
+import bisect
+import datetime
+import decimal
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+import time
+
+from django.conf import settings
+from django.db.models import Max, Model
+from django.utils import simplejson
+
+from simple_translation.instrumentation import instrument, model_of, count_translations
+from simple_translation.routing import get_read_database
+from simple_translation.translation_pool import TranslationPool
+
+MAGIC = 'STSNAP1\n'
+# version, number of masters, compiled at, length of the json header
+HEADER = struct.Struct('<QQdI')
+KEY = struct.Struct('<Q')
+# every SPARSE_STEP-th key is kept in memory to narrow the search
+SPARSE_STEP = 64
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+def _encode_datetime(value):
+    delta = value - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+def _encode_time(value):
+    return ((value.hour * 60 + value.minute) * 60 + value.second) * 1000000 + value.microsecond
+
+def _decode_time(value):
+    seconds, microseconds = divmod(value, 1000000)
+    minutes, seconds = divmod(seconds, 60)
+    return datetime.time(minutes // 60, minutes % 60, seconds, microseconds)
+
+# internal type -> (encode, decode) of values json can not keep exactly
+CODECS = {
+    'DateTimeField': (_encode_datetime, lambda value: EPOCH + datetime.timedelta(microseconds=value)),
+    'DateField': (lambda value: value.toordinal(), datetime.date.fromordinal),
+    'TimeField': (_encode_time, _decode_time),
+    'DecimalField': (str, decimal.Decimal),
+}
+
+def get_snapshot_dir():
+    return getattr(settings, 'SIMPLE_TRANSLATION_SNAPSHOT_DIR', None)
+
+def get_snapshot_path(directory, info, language):
+    opts = info.translated_model._meta
+    return os.path.join(directory, '%s.%s.%s.snapshot' % (opts.app_label, opts.object_name.lower(), language))
+
+def compile_snapshot(directory, info, language, using=None, chunk_size=1000):
+    """
+    Writes the snapshot of the translations of ``info`` in ``language`` and
+    returns its path. The translations are read ``chunk_size`` at a time and
+    the keys, offsets and records spooled to temporary files, so only one
+    chunk is held in memory.
+    """
+    translated_model = info.translated_model
+    using = get_read_database(translated_model, using)
+    version = info.translation_of_model._default_manager.using(using) \
+        .aggregate(version=Max('pk'))['version'] or 0
+    fields = [field.attname for field in translated_model._meta.fields]
+    types = [field.get_internal_type() for field in translated_model._meta.fields]
+    encoders = [(index, CODECS[internal_type][0]) for index, internal_type in enumerate(types) \
+        if internal_type in CODECS]
+    queryset = translated_model._default_manager.using(using).filter(**{
+        info.language_field: language,
+        '%s__lte' % info.translation_of_field: version,
+    }).order_by(info.translation_of_field, 'pk').values_list(
+        *[field.name for field in translated_model._meta.fields])
+    master_index = fields.index(info.translation_of_field + '_id')
+    encoder = simplejson.JSONEncoder(separators=(',', ':'))
+    header = simplejson.dumps({'model': '%s.%s' % (translated_model._meta.app_label,
+        translated_model._meta.object_name), 'language': language, 'fields': fields, 'types': types})
+
+    keys_file = tempfile.TemporaryFile(dir=directory)
+    offsets_file = tempfile.TemporaryFile(dir=directory)
+    records_file = tempfile.TemporaryFile(dir=directory)
+    try:
+        count, offset, last_key = 0, 0, None
+        offsets_file.write(KEY.pack(0))
+        while True:
+            chunk = queryset
+            if last_key is not None:
+                # the other translations of the last master are skipped anyway
+                chunk = queryset.filter(**{'%s__gt' % info.translation_of_field: last_key})
+            chunk = list(chunk[:chunk_size])
+            keys, offsets, records = [], [], []
+            for row in chunk:
+                # the first translation of a master in a language wins
+                if row[master_index] == last_key:
+                    continue
+                row = list(row)
+                for index, encode in encoders:
+                    if row[index] is not None:
+                        row[index] = encode(row[index])
+                record = encoder.encode(row)
+                last_key = row[master_index]
+                offset += len(record)
+                keys.append(last_key)
+                offsets.append(offset)
+                records.append(record)
+            count += len(keys)
+            keys_file.write(struct.pack('<%dQ' % len(keys), *keys))
+            offsets_file.write(struct.pack('<%dQ' % len(offsets), *offsets))
+            records_file.write(''.join(records))
+            if len(chunk) < chunk_size:
+                break
+
+        path = get_snapshot_path(directory, info, language)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.snapshot')
+        out = os.fdopen(fd, 'wb')
+        try:
+            out.write(MAGIC)
+            out.write(HEADER.pack(version, count, time.time(), len(header)))
+            out.write(header)
+            for spool in (keys_file, offsets_file, records_file):
+                spool.seek(0)
+                shutil.copyfileobj(spool, out)
+        finally:
+            out.close()
+    finally:
+        keys_file.close()
+        offsets_file.close()
+        records_file.close()
+    os.chmod(tmp_path, 0644)
+    os.rename(tmp_path, path)
+    return path
+
+class PackedKeys(object):
+    """
+    The sorted primary keys of a snapshot as a sequence for ``bisect``.
+    """
+    def __init__(self, buf, offset, count):
+        self.buf = buf
+        self.offset = offset
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        return KEY.unpack_from(self.buf, self.offset + index * KEY.size)[0]
+
+class Snapshot(object):
+
+    def __init__(self, path):
+        self.path = path
+        snapshot_file = open(path, 'rb')
+        try:
+            stat = os.fstat(snapshot_file.fileno())
+            self.mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        finally:
+            snapshot_file.close()
+        self.stamp = (stat.st_ino, stat.st_mtime, stat.st_size)
+        if self.mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError('%s is not a translation snapshot' % path)
+        self.version, self.count, self.compiled_at, header_length = \
+            HEADER.unpack_from(self.mmap, len(MAGIC))
+        start = len(MAGIC) + HEADER.size
+        header = simplejson.loads(self.mmap[start:start + header_length])
+        self.fields = header['fields']
+        self.language = header['language']
+        self.decoders = [(index, CODECS[internal_type][1]) for index, internal_type \
+            in enumerate(header['types']) if internal_type in CODECS]
+        keys_start = start + header_length
+        self.keys = PackedKeys(self.mmap, keys_start, self.count)
+        self.offsets = PackedKeys(self.mmap, keys_start + self.count * KEY.size, self.count + 1)
+        self.data_start = keys_start + (2 * self.count + 1) * KEY.size
+        self.sparse_keys = [self.keys[index] for index in xrange(0, self.count, SPARSE_STEP)]
+
+    def get(self, pk):
+        """
+        The field values of the translation of the master ``pk``, ``None``
+        if it has none in the snapshot.
+        """
+        block = bisect.bisect_right(self.sparse_keys, pk) - 1
+        if block < 0:
+            return None
+        lo = block * SPARSE_STEP
+        index = bisect.bisect_left(self.keys, pk, lo, min(lo + SPARSE_STEP, self.count))
+        if index == self.count or self.keys[index] != pk:
+            return None
+        values = simplejson.loads(self.mmap[self.data_start + self.offsets[index]:
+            self.data_start + self.offsets[index + 1]])
+        for index, decode in self.decoders:
+            if values[index] is not None:
+                values[index] = decode(values[index])
+        return values
+
+    def close(self):
+        self.mmap.close()
+
+class SnapshotTranslationPool(TranslationPool):
+    """
+    Annotates masters from the snapshots in ``directory`` or
+    ``settings.SIMPLE_TRANSLATION_SNAPSHOT_DIR``. Compact or ``through``
+    annotations, an explicit ``using`` and masters newer than a snapshot
+    are read from the database.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or get_snapshot_dir()
+        self.snapshots = {}
+
+    def get_snapshot(self, info, language):
+        if not self.directory:
+            return None
+        path = get_snapshot_path(self.directory, info, language)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        snapshot = self.snapshots.get(path)
+        if snapshot is None or snapshot.stamp != (stat.st_ino, stat.st_mtime, stat.st_size):
+            # a compiled snapshot replaced the file
+            snapshot = self.snapshots[path] = Snapshot(path)
+            # compiled with the fields of the model in its order
+            opts = info.translated_model._meta
+            snapshot.positional = snapshot.fields == [field.attname for field in opts.fields]
+            snapshot.master_cache_name = opts.get_field(info.translation_of_field).get_cache_name()
+        return snapshot
+
+    def get_translation(self, info, snapshot, master):
+        values = snapshot.get(master.pk)
+        if values is None:
+            return None
+        opts = info.translated_model._meta
+        if snapshot.positional:
+            translation = info.translated_model(*values)
+        else:
+            attnames = set([field.attname for field in opts.fields])
+            translation = info.translated_model(**dict([(str(name), value) \
+                for name, value in zip(snapshot.fields, values) if name in attnames]))
+        translation._state.adding = False
+        setattr(translation, snapshot.master_cache_name, master)
+        return translation
+
+    def annotate_from_database(self, *args, **kwargs):
+        # not instrumented again, the calls are counted once
+        return TranslationPool.annotate_with_translations._decorated_function(self, *args, **kwargs)
+
+    @instrument('annotate_with_translations', lambda self, list_or_instance, *args, **kwargs: \
+        model_of(list_or_instance), get_rows=count_translations)
+    def annotate_with_translations(self, list_or_instance, compact=False, fields=None, through=None,
+        using=None):
+        self.discover_translations()
+        if not list_or_instance or compact or through or using:
+            return self.annotate_from_database(list_or_instance,
+                compact=compact, fields=fields, through=through, using=using)
+        object_list = isinstance(list_or_instance, Model) and [list_or_instance] or list_or_instance
+        model = object_list[0].__class__
+        if not self.is_registered(model):
+            return self.annotate_from_database(list_or_instance)
+        info = self.get_info(model)
+        languages = [language_code for language_code, language_name in settings.LANGUAGES]
+        snapshots = [self.get_snapshot(info, language) for language in languages]
+        if None in snapshots:
+            return self.annotate_from_database(list_or_instance)
+        version = min([snapshot.version for snapshot in snapshots])
+        newer = []
+        for obj in object_list:
+            if obj.pk > version:
+                newer.append(obj)
+                continue
+            obj.translations = []
+            for snapshot in snapshots:
+                translation = self.get_translation(info, snapshot, obj)
+                if translation is not None:
+                    obj.translations.append(translation)
+        if newer:
+            self.annotate_from_database(newer)
+        from_snapshot = [obj for obj in object_list if obj.pk <= version]
+        self.annotate_with_extra_translations(from_snapshot, info, languages)
+        self.resolve_translations(from_snapshot, info, languages)
+        return list_or_instance
@@ -3,28 +3,54 @@ from django import template
 from django.template.loader import render_to_string
 from django.db import models
 from simple_translation.translation_pool import translation_pool
-from simple_translation.utils import get_preferred_translation_from_request, get_preferred_translation_from_lang
+from simple_translation.utils import get_preferred_translation_from_request, get_preferred_translation_from_lang, \
+    annotate_with_translation_urls
 
 register = template.Library()
 
-def annotate_with_translations(object_or_list):
-    return translation_pool.annotate_with_translations(object_or_list)
+def annotate_with_translations(object_or_list, through=None):
+    """
+    ``{% with comments|annotate_with_translations:"entry" as comments %}``
+    """
+    return translation_pool.annotate_with_translations(object_or_list, through=through)
 register.filter(annotate_with_translations)
+
+def annotate_with_compact_translations(object_or_list, fields=None):
+    """
+    ``{% with entries|annotate_with_compact_translations:"title,slug" as entries %}``
+    """
+    return translation_pool.annotate_with_translations(object_or_list, compact=True,
+        fields=fields and fields.split(',') or None)
+register.filter(annotate_with_compact_translations)
  
 register.filter(get_preferred_translation_from_request)
 register.filter(get_preferred_translation_from_lang)
+register.filter(annotate_with_translation_urls)
     
 def render_language_choices(obj, request):
-    if not hasattr(obj, 'translations'):
-        annotate_with_translations(obj)
+    if not hasattr(obj, 'translation_urls'):
+        annotate_with_translation_urls(obj)
     language = getattr(request, 'LANGUAGE_CODE', settings.LANGUAGE_CODE)
     translations = [translation for translation in obj.translations if translation.language != language]
+    translation_urls = [(lang, url) for lang, url in obj.translation_urls if lang != language]
     opts = obj.__class__._meta
     app_label = opts.app_label
     return render_to_string([
         'simple_translation/%s/%s/language_choices.html' % (app_label, opts.object_name.lower()),
         'simple_translation/%s/language_choices.html' % app_label,
         'simple_translation/language_choices.html'
-    ], {'translations': translations})
+    ], {'translations': translations, 'translation_urls': translation_urls})
 register.filter(render_language_choices)
+
+def render_alternate_links(obj, request):
+    if not hasattr(obj, 'translation_urls'):
+        annotate_with_translation_urls(obj)
+    opts = obj.__class__._meta
+    app_label = opts.app_label
+    return render_to_string([
+        'simple_translation/%s/%s/alternate_links.html' % (app_label, opts.object_name.lower()),
+        'simple_translation/%s/alternate_links.html' % app_label,
+        'simple_translation/alternate_links.html'
+    ], {'translation_urls': [(lang, request.build_absolute_uri(url)) for lang, url in obj.translation_urls]})
+register.filter(render_alternate_links)
         
@@ -0,0 +1,334 @@
+"""
+Benchmarks for the hot paths of simple_translation on generated test app data. ::
+
+    python -m simple_translation.test.benchmarks --masters=10,1000,1000000 \
+        --languages=2,10,60 --output=results.json
+    python -m simple_translation.test.benchmarks --output=new.json --compare=results.json
+
+Every result is a json object with the operation, the number of masters and
+languages, the wall time and queries per call and the peak memory in kB
+allocated by the calls. Memory is measured in a forked process on linux.
+"""
+import atexit
+import datetime
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import time
+from optparse import OptionParser
+
+try:
+    import json
+except ImportError: # pragma: no cover
+    from django.utils import simplejson as json
+
+LANGUAGE_CODES = [
+    'en', 'de', 'fr', 'es', 'it', 'nl', 'pt', 'sv', 'da', 'nb',
+    'fi', 'pl', 'cs', 'sk', 'hu', 'ro', 'bg', 'el', 'tr', 'ru',
+    'uk', 'hr', 'sr', 'sl', 'et', 'lv', 'lt', 'ga', 'cy', 'is',
+    'mt', 'sq', 'mk', 'be', 'ka', 'hy', 'az', 'kk', 'he', 'ar',
+    'fa', 'ur', 'hi', 'bn', 'ta', 'te', 'th', 'vi', 'id', 'ms',
+    'ja', 'ko', 'zh', 'sw', 'af', 'eu', 'ca', 'gl', 'eo', 'la',
+]
+
+PAGE_SIZE = 100
+
+NEGOTIATION_CALLS = 1000
+
+BULK_SIZE = 1000
+
+ACCEPT_LANGUAGE_HEADERS = [
+    'en-US,en;q=0.9',
+    'de-DE,de;q=0.9,en;q=0.8',
+    'fr-CH, fr;q=0.9, en;q=0.8, de;q=0.7, *;q=0.5',
+    'xx-YY, zz;q=0.5',
+]
+
+def get_languages(count):
+    return tuple([(code, code.upper()) for code in LANGUAGE_CODES[:count]])
+
+def generate_entries(masters, languages, chunk_size=10000):
+    """
+    Replaces all entries with ``masters`` entries that have a title in every
+    language. Rows are inserted with executemany so a million masters is
+    feasible.
+    """
+    from django.db import connection, transaction
+    from simple_translation.test.testapp.models import Entry, EntryTitle
+
+    cursor = connection.cursor()
+    cursor.execute('DELETE FROM %s' % EntryTitle._meta.db_table)
+    search_table = '%s_search' % EntryTitle._meta.db_table
+    if search_table in connection.introspection.table_names():
+        cursor.execute('DELETE FROM %s' % search_table)
+    cursor.execute('DELETE FROM %s' % Entry._meta.db_table)
+    entry_sql = 'INSERT INTO %s (id, is_published) VALUES (%%s, %%s)' % Entry._meta.db_table
+    title_sql = 'INSERT INTO %s (entry_id, language, title, slug, pub_date) ' \
+        'VALUES (%%s, %%s, %%s, %%s, %%s)' % EntryTitle._meta.db_table
+    now = datetime.datetime.now()
+    for start in xrange(1, masters + 1, chunk_size):
+        pks = xrange(start, min(start + chunk_size, masters + 1))
+        cursor.executemany(entry_sql, [(pk, True) for pk in pks])
+        cursor.executemany(title_sql, [(pk, code, 'Entry %s %s' % (pk, code),
+            'entry-%s-%s' % (pk, code), now) for pk in pks for code, name in languages])
+    transaction.commit_unless_managed()
+
+def _read_memory_status(field):
+    for line in open('/proc/self/status'):
+        if line.startswith(field):
+            return int(line.split()[1])
+
+def _measure(func, repeat):
+    from django.db import connection, reset_queries
+    reset_queries()
+    start = time.time()
+    for i in xrange(repeat):
+        func()
+    wall_time = (time.time() - start) / repeat
+    return {
+        'wall_time': wall_time,
+        'queries': len(connection.queries) / float(repeat),
+        'repeat': repeat,
+    }
+
+def measure(func, repeat=1, measure_memory=True):
+    """
+    Runs ``func`` ``repeat`` times. With ``measure_memory`` the calls run
+    in a forked child that resets its peak resident size before the calls.
+    """
+    if not (measure_memory and hasattr(os, 'fork') and os.path.exists('/proc/self/clear_refs')):
+        result = _measure(func, repeat)
+        result['peak_memory_kb'] = None
+        return result
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if not pid:
+        os.close(read_fd)
+        try:
+            open('/proc/self/clear_refs', 'w').write('5')
+            rss = _read_memory_status('VmRSS:')
+            result = _measure(func, repeat)
+            result['peak_memory_kb'] = max(0, _read_memory_status('VmHWM:') - rss)
+            os.write(write_fd, json.dumps(result))
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    data = ''
+    while True:
+        bit = os.read(read_fd, 4096)
+        if not bit:
+            break
+        data += bit
+    os.close(read_fd)
+    os.waitpid(pid, 0)
+    if not data:
+        raise RuntimeError('Measuring %r failed' % func)
+    return json.loads(data)
+
+class MockRequest(object):
+    REQUEST = {}
+    GET = {}
+
+    def __init__(self, language):
+        self.LANGUAGE_CODE = language
+
+def get_operations(client, languages):
+    """
+    Returns (name, setup, call), ``setup`` returns the arguments for
+    ``call`` and is not measured.
+    """
+    from django.conf import settings
+    from django.core.management import call_command
+    from django.middleware.locale import LocaleMiddleware
+    from django.template import Template, Context
+    from django.test.client import RequestFactory
+    from simple_translation.middleware import filter_queryset_language, MultilingualGenericsMiddleware
+    from simple_translation.snapshots import SnapshotTranslationPool
+    from simple_translation.translation_pool import translation_pool
+    from simple_translation.utils import get_preferred_translation_from_lang, \
+        get_preferred_translation_from_request
+    from simple_translation.test.testapp.models import Entry, EntryTitle
+
+    language = languages[-1][0]
+    request = MockRequest(language)
+
+    def get_entry():
+        return (Entry.objects.order_by('pk')[0],)
+
+    def get_page():
+        return (list(Entry.objects.order_by('pk')[:PAGE_SIZE]),)
+
+    snapshot_dir = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, snapshot_dir, True)
+    snapshot_pool = SnapshotTranslationPool(snapshot_dir)
+
+    def get_snapshot_page():
+        # compiled once for the generated data
+        if not os.listdir(snapshot_dir):
+            call_command('compile_translation_snapshots', output=snapshot_dir, verbosity=0)
+        return get_page()
+
+    def get_annotated_page():
+        return (translation_pool.annotate_with_translations(get_page()[0]),)
+
+    factory = RequestFactory()
+    header_requests = [factory.get('/', HTTP_ACCEPT_LANGUAGE=header) for header in ACCEPT_LANGUAGE_HEADERS]
+
+    def get_header_requests():
+        return ([header_requests[i % len(header_requests)] for i in xrange(NEGOTIATION_CALLS)],)
+
+    def get_fast_middleware():
+        settings.SIMPLE_TRANSLATION_FAST_NEGOTIATION = True
+        try:
+            return MultilingualGenericsMiddleware()
+        finally:
+            del settings.SIMPLE_TRANSLATION_FAST_NEGOTIATION
+
+    # slugs are unique, every call creates new ones
+    counter = itertools.count()
+    now = datetime.datetime.now()
+
+    def get_bulk_items():
+        items = []
+        for i in xrange(BULK_SIZE):
+            n = counter.next()
+            items.append(({'is_published': True}, dict([(code, {'title': 'Bulk %s' % n,
+                'slug': 'bulk-%s-%s' % (n, code), 'pub_date': now}) for code, name in languages])))
+        return items
+
+    def create_with_orm():
+        for master_kwargs, translations in get_bulk_items():
+            entry = Entry.objects.create(**master_kwargs)
+            for code, kwargs in translations.items():
+                EntryTitle.objects.create(entry=entry, language=code, **kwargs)
+
+    locale_middleware = LocaleMiddleware()
+    fast_middleware = get_fast_middleware()
+
+    template = Template('{% load simple_translation_tags %}{% for entry in entries %}'
+        '{{ entry|get_preferred_translation_from_request:request }}'
+        '{{ entry|render_language_choices:request }}{% endfor %}')
+
+    return [
+        ('annotate_with_translations_single', get_entry,
+            lambda entry: translation_pool.annotate_with_translations(entry)),
+        ('annotate_with_translations_list', get_page,
+            lambda entries: translation_pool.annotate_with_translations(entries)),
+        ('annotate_with_compact_translations_list', get_page,
+            lambda entries: translation_pool.annotate_with_translations(entries, compact=True)),
+        ('snapshot_annotate_with_translations_list', get_snapshot_page,
+            lambda entries: snapshot_pool.annotate_with_translations(entries)),
+        ('get_preferred_translation_from_lang', get_annotated_page,
+            lambda entries: [get_preferred_translation_from_lang(entry, language) for entry in entries]),
+        ('get_preferred_translation_from_request', get_annotated_page,
+            lambda entries: [get_preferred_translation_from_request(entry, request) for entry in entries]),
+        ('filter_queryset_language', lambda: (),
+            lambda: list(filter_queryset_language(request, Entry.objects.all())[:PAGE_SIZE])),
+        ('admin_changelist', lambda: (),
+            lambda: client.get('/admin/testapp/entry/')),
+        ('admin_change_view', get_entry,
+            lambda entry: client.get('/admin/testapp/entry/%s/' % entry.pk, {'language': language})),
+        ('template_filters', get_page,
+            lambda entries: template.render(Context({'entries': entries, 'request': request}))),
+        ('locale_middleware_process_request_x%s' % NEGOTIATION_CALLS, get_header_requests,
+            lambda requests: [locale_middleware.process_request(r) for r in requests]),
+        ('fast_negotiation_process_request_x%s' % NEGOTIATION_CALLS, get_header_requests,
+            lambda requests: [fast_middleware.process_request(r) for r in requests]),
+        ('bulk_create_with_translations_x%s' % BULK_SIZE, lambda: (),
+            lambda: translation_pool.bulk_create_with_translations(Entry, get_bulk_items())),
+        ('orm_create_with_translations_x%s' % BULK_SIZE, lambda: (), create_with_orm),
+    ]
+
+def run_benchmarks(masters_list, languages_list, repeat=3, measure_memory=True, out=sys.stderr):
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.management import call_command
+    from django.test.client import Client
+
+    call_command('syncdb', interactive=False, verbosity=0)
+    User.objects.create_superuser('super', 'super@example.com', 'super')
+    client = Client()
+    client.login(username='super', password='super')
+
+    results = []
+    for language_count in languages_list:
+        settings.LANGUAGES = get_languages(language_count)
+        for masters in masters_list:
+            generate_entries(masters, settings.LANGUAGES)
+            for name, setup, call in get_operations(client, settings.LANGUAGES):
+                args = setup()
+                result = measure(lambda: call(*args), repeat, measure_memory)
+                result.update({
+                    'operation': name,
+                    'masters': masters,
+                    'languages': language_count,
+                })
+                out.write('%(operation)s masters=%(masters)s languages=%(languages)s '
+                    'wall_time=%(wall_time).6f queries=%(queries)s peak_memory_kb=%(peak_memory_kb)s\n' % result)
+                results.append(result)
+    return results
+
+def compare(old_results, new_results, threshold=0.2):
+    """
+    Returns the results that got slower by more than ``threshold`` or
+    issue more queries than before.
+    """
+    old = dict([((r['operation'], r['masters'], r['languages']), r) for r in old_results])
+    regressions = []
+    for result in new_results:
+        previous = old.get((result['operation'], result['masters'], result['languages']))
+        if not previous:
+            continue
+        if result['queries'] > previous['queries'] or \
+            result['wall_time'] > previous['wall_time'] * (1 + threshold):
+            regressions.append((previous, result))
+    return regressions
+
+def main():
+    parser = OptionParser(usage='%prog [options]')
+    parser.add_option('--masters', default='10,1000',
+        help='Comma separated numbers of masters, up to 1000000.')
+    parser.add_option('--languages', default='2,10',
+        help='Comma separated numbers of languages, up to %s.' % len(LANGUAGE_CODES))
+    parser.add_option('--repeat', type='int', default=3)
+    parser.add_option('--no-memory', action='store_false', dest='memory', default=True,
+        help='Do not measure peak memory.')
+    parser.add_option('--output', help='Write the json results to this file.')
+    parser.add_option('--compare', help='Compare with the json results in this file.')
+    parser.add_option('--threshold', type='float', default=0.2,
+        help='Allowed relative increase of wall time when comparing.')
+    options, args = parser.parse_args()
+
+    from simple_translation.test.run_tests import configure_settings
+    configure_settings(
+        DATABASES = {
+            'default':  {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': ':memory:'
+            }
+        },
+        DEBUG = True,
+        LANGUAGES = get_languages(len(LANGUAGE_CODES)),
+    )
+
+    results = run_benchmarks([int(n) for n in options.masters.split(',')],
+        [int(n) for n in options.languages.split(',')], options.repeat, options.memory)
+
+    data = json.dumps(results, indent=2)
+    if options.output:
+        open(options.output, 'w').write(data)
+    else:
+        sys.stdout.write(data + '\n')
+
+    if options.compare:
+        regressions = compare(json.load(open(options.compare)), results, options.threshold)
+        for previous, result in regressions:
+            sys.stderr.write('REGRESSION %(operation)s masters=%(masters)s languages=%(languages)s: ' % result +
+                'wall_time %.6f -> %.6f queries %s -> %s\n' % (previous['wall_time'],
+                    result['wall_time'], previous['queries'], result['queries']))
+        sys.exit(regressions and 1 or 0)
+
+if __name__ == '__main__':
+    main()
@@ -1,14 +1,19 @@
 import sys
 
-def run_tests():
+def configure_settings(**overrides):
     
     from django.conf import settings
     
-    settings.configure(
+    options = dict(
         DATABASES = {
             'default':  {
                 'ENGINE': 'django.db.backends.sqlite3',
                 'NAME': 'simple_translation.db'
+            },
+            # stands in for a read replica, see simple_translation.test.testapp.routers
+            'replica':  {
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': 'simple_translation_replica.db'
             }
         },
         
@@ -55,6 +60,13 @@ def run_tests():
         TEST_RUNNER = 'xmlrunner.extra.djangotestrunner.XMLTestRunner',
         TEST_OUTPUT_VERBOSE = True
     )
+    options.update(overrides)
+    settings.configure(**options)
+    return settings
+
+def run_tests():
+    
+    settings = configure_settings()
     
     from django.test.utils import get_runner
 
@@ -18,6 +18,7 @@ class EntryAdmin(TranslationAdmin):
         
     list_display = ('description', 'languages', 'is_published')
     list_editable = ('is_published',)
+    search_fields = ('title',)
     
     def __init__(self, *args, **kwargs):
         super(EntryAdmin, self).__init__(*args, **kwargs)
@@ -33,4 +34,12 @@ class EntryAdmin(TranslationAdmin):
         )})
         return fieldsets
            
-admin.site.register(Entry, EntryAdmin)
\ No newline at end of file
+admin.site.register(Entry, EntryAdmin)
+
+class EntryAllLanguagesAdmin(TranslationAdmin):
+    
+    edit_all_languages = True
+
+# edits all languages in one form
+all_languages_site = admin.AdminSite(name='all_languages')
+all_languages_site.register(Entry, EntryAllLanguagesAdmin)
@@ -0,0 +1,47 @@
+from django.conf.urls.defaults import *
+
+from simple_translation.test.testapp.models import Entry, EntryTitle
+from simple_translation.urlresolvers import language_prefix_patterns
+from simple_translation.view_cache import translation_cache_page
+from simple_translation.views import TranslatedListView, TranslatedDetailView, \
+    TranslatedArchiveIndexView, TranslatedYearArchiveView, TranslatedMonthArchiveView, \
+    TranslatedDayArchiveView, TranslatedDateDetailView
+
+entry_info_dict = {
+    'model': EntryTitle,
+    'date_field': 'pub_date',
+    'allow_future': True
+}
+
+entry_info_month_dict = dict(entry_info_dict, month_format='%m')
+
+entry_patterns = patterns('',
+    url(r'^$', TranslatedArchiveIndexView.as_view(**entry_info_dict), name='entry_archive_index'),
+    
+    url(r'^(?P<year>\d{4})/$', 
+        TranslatedYearArchiveView.as_view(**entry_info_dict), name='entry_archive_year'),
+    
+    url(r'^(?P<year>\d{4})/(?P<month>\d{2})/$', 
+        TranslatedMonthArchiveView.as_view(**entry_info_month_dict), name='entry_archive_month'),
+    
+    url(r'^(?P<year>\d{4})/(?P<month>\d{2})/(?P<day>\d{2})/$', 
+        TranslatedDayArchiveView.as_view(**entry_info_month_dict), name='entry_archive_day'),
+    
+    url(r'^(?P<year>\d{4})/(?P<month>\d{2})/(?P<day>\d{2})/(?P<slug>[-\w]+)/$', 
+        TranslatedDateDetailView.as_view(**entry_info_month_dict), name='entry_detail'),
+    
+    url(r'^entries/$', TranslatedListView.as_view(model=Entry, paginate_by=10), name='entry_list'),
+    
+    url(r'^entries/(?P<slug>[-\w]+)/$', 
+        TranslatedDetailView.as_view(model=Entry, slug_field='entrytitle__slug'), name='entry_master_detail'),
+    
+    url(r'^cached/entries/$', translation_cache_page(60)(TranslatedListView.as_view(model=Entry)),
+        name='cached_entry_list'),
+    
+    url(r'^cached/entries/(?P<slug>[-\w]+)/$', translation_cache_page(60)(
+        TranslatedDetailView.as_view(model=Entry, slug_field='entrytitle__slug')), name='cached_entry_master_detail'),
+)
+
+urlpatterns = patterns('',
+    language_prefix_patterns(entry_patterns, app_name='testapp')
+)
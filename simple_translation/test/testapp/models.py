@@ -24,4 +24,17 @@ class EntryTitle(models.Model):
             'day': self.pub_date.strftime('%d'),
             'slug': self.slug
         })
-    get_absolute_url = models.permalink(_get_absolute_url)
\ No newline at end of file
+    get_absolute_url = models.permalink(_get_absolute_url)
+
+class Comment(models.Model):
+    entry = models.ForeignKey(Entry)
+    reply_to = models.ForeignKey('self', null=True, blank=True)
+    body = models.TextField()
+
+class EntryBody(models.Model):
+    entry = models.ForeignKey(Entry)
+    language = models.CharField(max_length=2, choices=settings.LANGUAGES)
+    body = models.TextField()
+
+    def __unicode__(self):
+        return self.body
@@ -4,8 +4,11 @@ from django.contrib import admin
 
 admin.autodiscover()
 
+from simple_translation.test.testapp.admin import all_languages_site
+
 urlpatterns = patterns('',
     (r'^admin/', include(admin.site.urls)),
+    (r'^all-languages-admin/', include(all_languages_site.urls)),
     (r'^jsi18n/(?P<packages>\S+?)/$', 'django.views.i18n.javascript_catalog'),
 )
 
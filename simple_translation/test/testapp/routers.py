@@ -0,0 +1,18 @@
+class ReplicaRouter(object):
+    """
+    Reads the test app models from the replica and writes them to the
+    default database.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label == 'testapp':
+            return 'replica'
+        return None
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == 'testapp':
+            return 'default'
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
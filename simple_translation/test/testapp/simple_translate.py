@@ -1,5 +1,6 @@
-from simple_translation.test.testapp.models import Entry, EntryTitle
+from simple_translation.test.testapp.models import Entry, EntryTitle, EntryBody
 from simple_translation.translation_pool import translation_pool
 
-translation_pool.register_translation(Entry, EntryTitle)
+translation_pool.register_translation(Entry, EntryTitle, search_fields=('title',))
+translation_pool.register_translation(Entry, EntryBody, attribute='bodies', lazy=True)
 
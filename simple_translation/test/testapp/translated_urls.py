@@ -1,8 +1,9 @@
-from django.conf import settings
 from django.conf.urls.defaults import *
 
 from django.contrib import admin
 
+from simple_translation.urlresolvers import language_prefix_patterns
+
 admin.autodiscover()
 
 urlpatterns = patterns('',
@@ -10,16 +11,7 @@ urlpatterns = patterns('',
     (r'^jsi18n/(?P<packages>\S+?)/$', 'django.views.i18n.javascript_catalog'),
 )
 
-urlpatterns +=  patterns('', url(r'^',
-    include('simple_translation.test.testapp.urls', app_name='testapp')
-    )
-)
-
-for langcode in dict(settings.LANGUAGES).keys():
-    urlpatterns +=  patterns('', url(r'^%s/' % langcode,
-        include('simple_translation.test.testapp.urls',
-            namespace=langcode, app_name='testapp'),
-        kwargs={'language_code': langcode}
-    )
+urlpatterns += patterns('',
+    language_prefix_patterns('simple_translation.test.testapp.urls', app_name='testapp')
 )
 
@@ -1,9 +1,21 @@
+import difflib
+import pprint
+from unittest.util import safe_repr
+
+from django.conf import settings
+from django.core import urlresolvers
+from django.core.signals import request_started
+from django.db import connection, reset_queries
 from django.template.defaultfilters import slugify
 from django.test.testcases import TestCase
 from simple_translation.test.testapp.models import Entry, EntryTitle
+from simple_translation.urlresolvers import clear_reverse_cache
 
 class SimpleTranslationBaseTestCase(TestCase):
     
+    # the replica database is written to by the routing tests
+    multi_db = True
+    
     def assertNotIn(self, member, container, msg=None):
         """Just like self.assertTrue(a not in b), but with a nicer default message."""
         if member in container:
@@ -130,6 +142,35 @@ class SimpleTranslationBaseTestCase(TestCase):
             return message + diff
         return message + (DIFF_OMITTED % len(diff))
 
+    def set_root_urlconf(self, urlconf):
+        """Switch ROOT_URLCONF, resolvers for None are cached by django."""
+        old_urlconf = settings.ROOT_URLCONF
+        settings.ROOT_URLCONF = urlconf
+        urlresolvers._resolver_cache.clear()
+        clear_reverse_cache()
+        return old_urlconf
+
+    def assertQueryBudget(self, num, func, *args, **kwargs):
+        """
+        Like assertNumQueries, but lists the executed queries on failure so
+        an N+1 shows up in the test output.
+        """
+        old_debug_cursor = connection.use_debug_cursor
+        connection.use_debug_cursor = True
+        # the test client would reset the queries on every request
+        request_started.disconnect(reset_queries)
+        start = len(connection.queries)
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            connection.use_debug_cursor = old_debug_cursor
+            request_started.connect(reset_queries)
+        queries = connection.queries[start:]
+        if len(queries) != num:
+            self.fail('%s: %d queries executed, %d expected\n%s' % (func, len(queries), num,
+                '\n'.join([query['sql'] for query in queries])))
+        return result
+
     def create_entry_with_title(self, title=None, slug=None, language=None, published_at=None):
     	kwargs = {'is_published': True}
         entry = Entry.objects.create(**kwargs)
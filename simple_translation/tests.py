@@ -1,10 +1,49 @@
 import datetime
-from django.core.urlresolvers import reverse
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from StringIO import StringIO
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.signals import request_started, request_finished
+from django.core.urlresolvers import reverse, resolve, Resolver404
 from django.conf import settings
+from django.db import connection, connections, router, transaction
+from django.contrib import admin
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.http import HttpResponse
+from django.core.paginator import EmptyPage
 from django.template import Template, Context
+from django.test.client import RequestFactory
+from django.utils import simplejson
+from django.utils.datastructures import SortedDict
 from simple_translation.test.testcases import SimpleTranslationBaseTestCase
-from simple_translation.translation_pool import TranslationPool
+from simple_translation.translation_pool import TranslationPool, TranslationAllreadyRegistered, \
+    TranslationNotRegistered, get_translation_pool
+from simple_translation.sitemaps import TranslationSitemap
+from simple_translation.slugs import SlugIndex, get_slug_index, get_changes_key, log_slug_changes
+from simple_translation.snapshots import SnapshotTranslationPool, Snapshot
+from simple_translation import search
+from simple_translation.search import get_search_index, PythonSearchIndex
+from simple_translation.lru import LRUCache
+from simple_translation.instrumentation import stats, start_timing, stop_timing, operation_finished
+from simple_translation.conditional import translation_condition
+from simple_translation.coverage import TranslationCoverage
+from simple_translation import fallbacks
+from simple_translation.view_cache import translation_cache_page
+from simple_translation.middleware import LanguageNegotiator, MultilingualGenericsMiddleware, \
+    filter_queryset_language
+from simple_translation.routing import unpin, pin_writes, get_pinned_database
+from simple_translation.test.testapp.routers import ReplicaRouter
+from simple_translation.test.testapp.models import Entry, EntryTitle, EntryBody, Comment
+from simple_translation.urlresolvers import LanguagePrefixURLResolver, cached_reverse
+from simple_translation.utils import annotate_with_translation_urls, \
+    get_preferred_translation_from_lang
 
 class SimpleTranslationTestCase(SimpleTranslationBaseTestCase):
 
@@ -294,3 +333,1311 @@ class SimpleTranslationTestCase(SimpleTranslationBaseTestCase):
         for entry in entries:
             translated_languages = [t.language for t in entry.translations]
             self.assertSequenceEqual(translated_languages, settings_languages)
+
+    def test_13_test_class_based_views(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        old_urlconf = self.set_root_urlconf('simple_translation.test.testapp.class_based_urls')
+        old_middleware = settings.MIDDLEWARE_CLASSES
+        settings.MIDDLEWARE_CLASSES = old_middleware +[
+            'simple_translation.middleware.MultilingualGenericsMiddleware']
+        
+        published_at = datetime.datetime.now() - datetime.timedelta(hours=-1)
+        for title in ('title1', 'title2', 'title3'):
+            en_title, entry = self.create_entry_with_title(title='english' + title, published_at=published_at)
+            de_title = self.create_entry_title(entry, title='german' + title, language='de', published_at=published_at)
+        
+        # count, page, translations for the page
+        list_url = reverse('de:entry_list')
+        self.assertNumQueries(3, lambda: self.client.get(list_url))
+        response = self.client.get(list_url)
+        self.assertContains(response, 'germantitle1 - German')
+        self.assertNotContains(response, 'englishtitle1 - English')
+        
+        # translated slug and language in one query, translations
+        detail_url = reverse('en:entry_master_detail', kwargs={'slug': 'englishtitle2'})
+        self.assertNumQueries(2, lambda: self.client.get(detail_url))
+        response = self.client.get(detail_url)
+        self.assertContains(response, 'englishtitle2 - English')
+        self.assertContains(response, '/de/%s/germantitle2/' % published_at.strftime('%Y/%m/%d'))
+        
+        response = self.client.get(reverse('de:entry_master_detail', kwargs={'slug': 'englishtitle2'}))
+        self.assertEquals(response.status_code, 404)
+        
+        response = self.client.get(reverse('de:entry_archive_index'))
+        self.assertContains(response, 'germantitle3')
+        self.assertNotContains(response, 'englishtitle3')
+        
+        response = self.client.get(de_title.get_absolute_url())
+        self.assertContains(response, 'germantitle3 - German')
+        
+        self.set_root_urlconf(old_urlconf)
+        settings.MIDDLEWARE_CLASSES = old_middleware
+
+    def test_14_test_language_prefix_resolver(self):
+        languages = [('l%02d' % i, 'Language %s' % i) for i in range(60)] + [('de', 'German')]
+        resolver = LanguagePrefixURLResolver(r'^', 'simple_translation.test.testapp.urls',
+            app_name='testapp', languages=languages)
+        
+        match = resolver.resolve('de/2011/01/02/german/')
+        self.assertEquals(match.url_name, 'entry_detail')
+        self.assertEquals(match.namespaces, ['de'])
+        self.assertEquals(match.kwargs['language_code'], 'de')
+        self.assertEquals(match.kwargs['slug'], 'german')
+        
+        match = resolver.resolve('2011/')
+        self.assertEquals(match.url_name, 'entry_archive_year')
+        self.assertFalse('language_code' in match.kwargs)
+        
+        self.assertRaises(Resolver404, resolver.resolve, 'fr/2011/')
+        
+        old_urlconf = self.set_root_urlconf('simple_translation.test.testapp.translated_urls')
+        self.assertEquals(resolve('/de/').kwargs['language_code'], 'de')
+        self.assertEquals(reverse('de:entry_archive_year', kwargs={'year': '2011'}), '/de/2011/')
+        self.assertEquals(reverse('entry_archive_year', kwargs={'year': '2011'}), '/2011/')
+        self.set_root_urlconf(old_urlconf)
+
+    def test_15_test_translation_urls(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        old_urlconf = self.set_root_urlconf('simple_translation.test.testapp.translated_urls')
+        old_middleware = settings.MIDDLEWARE_CLASSES
+        settings.MIDDLEWARE_CLASSES = old_middleware +[
+            'simple_translation.middleware.MultilingualGenericsMiddleware']
+        
+        kwargs = {'year': '2011', 'month': '01', 'day': '02', 'slug': 'german'}
+        self.assertEquals(cached_reverse('de:entry_detail', kwargs=kwargs),
+            reverse('de:entry_detail', kwargs=kwargs))
+        self.assertEquals(cached_reverse('entry_archive_year', args=['2011']), '/2011/')
+        
+        published_at = datetime.datetime.now() - datetime.timedelta(hours=-1)
+        entries = []
+        for title in ('title1', 'title2'):
+            en_title, entry = self.create_entry_with_title(title='english' + title, published_at=published_at)
+            de_title = self.create_entry_title(entry, title='german' + title, language='de', published_at=published_at)
+            entries.append(entry)
+        
+        self.assertNumQueries(1, lambda: annotate_with_translation_urls(entries))
+        self.assertEquals(entries[1].translation_urls, [
+            ('en', en_title.get_absolute_url()),
+            ('de', de_title.get_absolute_url()),
+        ])
+        
+        class MockRequest(object):
+            def build_absolute_uri(self, location):
+                return 'http://testserver' + location
+        
+        ctxt = Context({'entry': entries[1], 'request': MockRequest()})
+        tpl = Template('{% load simple_translation_tags %}{{ entry|render_alternate_links:request }}')
+        self.assertTrue('<link rel="alternate" hreflang="de" href="http://testserver%s" />'
+            % de_title.get_absolute_url() in tpl.render(ctxt))
+        
+        self.set_root_urlconf(old_urlconf)
+        settings.MIDDLEWARE_CLASSES = old_middleware
+
+    def test_16_test_translation_sitemaps(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        old_urlconf = self.set_root_urlconf('simple_translation.test.testapp.translated_urls')
+        old_middleware = settings.MIDDLEWARE_CLASSES
+        settings.MIDDLEWARE_CLASSES = old_middleware +[
+            'simple_translation.middleware.MultilingualGenericsMiddleware']
+        
+        published_at = datetime.datetime.now() - datetime.timedelta(hours=-1)
+        for title in ('title1', 'title2', 'title3'):
+            en_title, entry = self.create_entry_with_title(title='english' + title, published_at=published_at)
+            de_title = self.create_entry_title(entry, title='german' + title, language='de', published_at=published_at)
+        
+        sitemap = TranslationSitemap(Entry, chunk_size=2)
+        sitemap.limit = 4
+        self.assertEquals(sitemap.num_pages, 2)
+        
+        class MockSite(object):
+            domain = 'example.com'
+        
+        # the first primary key of the page, masters and translations for each chunk
+        self.assertNumQueries(3, lambda: list(sitemap.get_urls(page=1, site=MockSite())))
+        urls = list(sitemap.get_urls(page=2, site=MockSite()))
+        # the page ranges read once are handed to the workers
+        page_ranges = sitemap.get_page_ranges()
+        self.assertEquals(len(page_ranges), 2)
+        self.assertNumQueries(2, lambda: list(TranslationSitemap(Entry, chunk_size=2).get_urls(
+            page=2, site=MockSite(), page_range=page_ranges[1])))
+        self.assertEquals([url['location'] for url in urls], [
+            'http://example.com%s' % en_title.get_absolute_url(),
+            'http://example.com%s' % de_title.get_absolute_url(),
+        ])
+        self.assertEquals(urls[0]['alternates'], [
+            ('en', 'http://example.com%s' % en_title.get_absolute_url()),
+            ('de', 'http://example.com%s' % de_title.get_absolute_url()),
+        ])
+        
+        directory = tempfile.mkdtemp()
+        try:
+            call_command('write_translation_sitemaps', directory, processes=1,
+                domain='example.com', chunk_size=2, verbosity=0)
+            index = open(os.path.join(directory, 'sitemap.xml')).read()
+            self.assertTrue('<loc>http://example.com/sitemap-testapp-entry-1.xml</loc>' in index)
+            shard = open(os.path.join(directory, 'sitemap-testapp-entry-1.xml')).read()
+            self.assertEquals(shard.count('<url>'), 6)
+            self.assertTrue('<xhtml:link rel="alternate" hreflang="de" href="http://example.com%s"/>'
+                % de_title.get_absolute_url() in shard)
+        finally:
+            shutil.rmtree(directory)
+        
+        # a sitemap reused across requests shows masters created later
+        for title in ('title4', 'title5', 'title6'):
+            self.create_entry_with_title(title='english' + title, published_at=published_at)
+        self.assertEquals(sitemap.num_pages, 3)
+        self.assertEquals(len(list(sitemap.get_urls(page=2, site=MockSite()))), 3)
+        self.assertEquals(len(list(sitemap.get_urls(page=3, site=MockSite()))), 2)
+        self.assertRaises(EmptyPage, lambda: list(sitemap.get_urls(page=4, site=MockSite())))
+        
+        self.set_root_urlconf(old_urlconf)
+        settings.MIDDLEWARE_CLASSES = old_middleware
+
+    def test_17_test_search_index(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        published_at = datetime.datetime.now() - datetime.timedelta(hours=-1)
+        en_title1, entry1 = self.create_entry_with_title(title='red apple', published_at=published_at)
+        de_title1 = self.create_entry_title(entry1, title='roter apfel', language='de', published_at=published_at)
+        en_title2, entry2 = self.create_entry_with_title(title='green apfel apfel', published_at=published_at)
+        en_title3, entry3 = self.create_entry_with_title(title='blue', published_at=published_at)
+        
+        database_index = get_search_index()
+        for index in (database_index, PythonSearchIndex()):
+            search._search_index = index
+            # german match first, english fallback after
+            self.assertEquals(index.search(Entry, 'Apfel', language='de'), [entry1, entry2])
+            self.assertEquals(index.search(Entry, 'apfel', language='de', fallback=False), [entry1])
+            self.assertEquals(index.search(Entry, 'red apple'), [entry1])
+            self.assertEquals(index.search(Entry, 'red green'), [])
+            
+            # kept up to date by signals
+            en_title3.title = 'blue apple'
+            en_title3.save()
+            self.assertEquals(index.search(Entry, 'apple', language='en'), [entry1, entry3])
+            en_title3.delete()
+            self.assertEquals(index.search(Entry, 'apple', language='en'), [entry1])
+            en_title3 = self.create_entry_title(entry3, title='blue', published_at=published_at)
+            self.assertEquals(list(index.search_queryset(Entry, 'apfel').order_by('pk')), [entry1, entry2])
+        search._search_index = database_index
+        
+        # saves in a request are written at its end, one delete and one insert
+        database_index.start_queue()
+        en_title2.title = 'green pear'
+        en_title2.save()
+        en_title3.title = 'blue pear'
+        en_title3.save()
+        self.assertQueryBudget(2, database_index.stop_queue)
+        self.assertEquals(database_index.search(Entry, 'pear'), [entry2, entry3])
+        
+        superuser = User(username="super", is_staff=True, is_active=True, 
+            is_superuser=True)
+        superuser.set_password("super")
+        superuser.save()
+        self.client.login(username='super', password='super')
+        
+        list_url = reverse('admin:testapp_entry_changelist')
+        response = self.client.get(list_url, {'q': 'roter'})
+        self.assertContains(response, '<a href="%s/?language=de">DE</a>' % entry1.pk)
+        self.assertNotContains(response, '<a href="%s/?language=en">EN</a>' % entry2.pk)
+
+    def test_18_test_query_budgets(self):
+        # every public path issues a fixed number of queries, whatever the
+        # page size and the number of languages
+        superuser = User(username="super", is_staff=True, is_active=True, 
+            is_superuser=True)
+        superuser.set_password("super")
+        superuser.save()
+        self.client.login(username='super', password='super')
+        old_middleware = settings.MIDDLEWARE_CLASSES
+        settings.MIDDLEWARE_CLASSES = old_middleware +[
+            'simple_translation.middleware.MultilingualGenericsMiddleware']
+        
+        languages = (
+            ('en', 'English'),
+            ('de', 'German'),
+            ('fr', 'French'),
+        )
+        # cached by django after the first lookup
+        ContentType.objects.get_for_model(Entry)
+        
+        published_at = datetime.datetime.now() - datetime.timedelta(hours=-1)
+        template = Template('{% load simple_translation_tags %}'
+            '{% for entry in entries|annotate_with_translation_urls %}'
+            '{{ entry|get_preferred_translation_from_request:request }}'
+            '{{ entry|render_language_choices:request }}{% endfor %}')
+        unannotated_template = Template('{% load simple_translation_tags %}{% for entry in entries %}'
+            '{{ entry|get_preferred_translation_from_request:request }}'
+            '{{ entry|render_language_choices:request }}{% endfor %}')
+        for language_count in (2, 3):
+            settings.LANGUAGES = languages[:language_count]
+            for page_size in (1, 5):
+                EntryTitle.objects.all().delete()
+                Entry.objects.all().delete()
+                for i in range(page_size):
+                    title, entry = self.create_entry_with_title(title='entry %s' % i, published_at=published_at)
+                    for code, name in settings.LANGUAGES[1:]:
+                        self.create_entry_title(entry, title='entry %s %s' % (i, code), language=code,
+                            published_at=published_at)
+                
+                # session, user and messages are 3 queries of every admin request
+                
+                # count, page, translations for the page
+                self.assertQueryBudget(6, self.client.get, reverse('admin:testapp_entry_changelist'))
+                
+                # object, translations
+                change_url = reverse('admin:testapp_entry_change', args=(entry.pk,))
+                self.assertQueryBudget(5, self.client.get, change_url, {'language': 'de'})
+                
+                self.assertQueryBudget(3, self.client.get, reverse('admin:testapp_entry_add'))
+                
+                # object, translations
+                delete_url = reverse('admin:testapp_entry_delete_translation', args=(entry.pk,))
+                self.assertQueryBudget(5, self.client.get, delete_url, {'language': 'de'})
+                
+                old_urlconf = self.set_root_urlconf('simple_translation.test.testapp.translated_urls')
+                # dates, latest with their entries, session, user
+                self.assertQueryBudget(4, self.client.get, reverse('de:entry_archive_index'))
+                self.set_root_urlconf('simple_translation.test.testapp.class_based_urls')
+                # count, page, translations for the page, session, user
+                self.assertQueryBudget(5, self.client.get, reverse('de:entry_list'))
+                self.set_root_urlconf('simple_translation.test.testapp.translated_urls')
+                
+                class MockRequest(object):
+                    LANGUAGE_CODE = 'de'
+                    REQUEST = {}
+                context = Context({'entries': list(Entry.objects.all()), 'request': MockRequest()})
+                # translations for all entries
+                self.assertQueryBudget(1, template.render, context)
+                # without annotate_with_translation_urls the translations are
+                # read once per entry, get_preferred_translation_from_request
+                # annotates and render_language_choices reuses them
+                context = Context({'entries': list(Entry.objects.all()), 'request': MockRequest()})
+                self.assertQueryBudget(page_size, unannotated_template.render, context)
+                self.set_root_urlconf(old_urlconf)
+        
+        # translations in languages removed from settings.LANGUAGES are found
+        settings.LANGUAGES = languages[:2]
+        request = RequestFactory().get(change_url, {'language': 'fr'})
+        translation = admin.site._registry[Entry].get_translation(request, Entry.objects.get(pk=entry.pk))
+        self.assertEquals(translation.title, 'entry %s fr' % (page_size - 1))
+        
+        settings.MIDDLEWARE_CLASSES = old_middleware
+
+    def test_19_test_instrumentation(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        published_at = datetime.datetime.now() - datetime.timedelta(hours=-1)
+        for title in ('title1', 'title2'):
+            en_title, entry = self.create_entry_with_title(title='english' + title, published_at=published_at)
+            de_title = self.create_entry_title(entry, title='german' + title, language='de', published_at=published_at)
+        
+        stats.reset()
+        stats.enable()
+        entries = list(Entry.objects.all())
+        self.assertQueryBudget(1, TranslationPool().annotate_with_translations, entries)
+        get_preferred_translation_from_lang(entries[0], 'de')
+        entry = Entry.objects.get(pk=entries[1].pk)
+        # queries are counted while the connection logs them
+        self.assertQueryBudget(1, get_preferred_translation_from_lang, entry, 'de')
+        # and on every database
+        connections['replica'].use_debug_cursor = True
+        try:
+            TranslationPool().annotate_with_translations(list(Entry.objects.all()), using='replica')
+        finally:
+            connections['replica'].use_debug_cursor = False
+        
+        counters = dict([(counter['operation'], counter) for counter in stats.get_counters([Entry])])
+        self.assertEquals(counters['annotate_with_translations']['calls'], 3)
+        self.assertEquals(counters['annotate_with_translations']['rows'], 6)
+        self.assertEquals(counters['annotate_with_translations']['queries'], 3)
+        self.assertEquals(counters['get_preferred_translation_from_lang']['calls'], 2)
+        self.assertEquals(counters['get_preferred_translation_from_lang']['cache_hits'], 1)
+        
+        superuser = User(username="super", is_staff=True, is_active=True, 
+            is_superuser=True)
+        superuser.set_password("super")
+        superuser.save()
+        self.client.login(username='super', password='super')
+        
+        stats_url = reverse('admin:testapp_entry_translation_stats')
+        response = self.client.get(stats_url)
+        self.assertContains(response, '<th scope="row">get_preferred_translation_from_lang</th>')
+        response = self.client.post(stats_url)
+        self.assertEquals(stats.get_counters(), [])
+        
+        old_urlconf = self.set_root_urlconf('simple_translation.test.testapp.class_based_urls')
+        out = StringIO()
+        call_command('translation_stats', reverse('de:entry_list'), stdout=out)
+        self.assertTrue('200 /de/entries/' in out.getvalue())
+        self.assertTrue('annotate_with_translations' in out.getvalue())
+        self.set_root_urlconf(old_urlconf)
+        
+        stats.disable()
+        stats.reset()
+        get_preferred_translation_from_lang(Entry.objects.get(pk=entries[1].pk), 'de')
+        self.assertEquals(stats.get_counters(), [])
+
+    def test_20_test_timing_middleware(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        old_urlconf = self.set_root_urlconf('simple_translation.test.testapp.class_based_urls')
+        old_middleware = settings.MIDDLEWARE_CLASSES
+        settings.MIDDLEWARE_CLASSES = old_middleware +[
+            'simple_translation.middleware.MultilingualGenericsMiddleware',
+            'simple_translation.middleware.TranslationTimingMiddleware']
+        settings.SIMPLE_TRANSLATION_TIMING_LOG = True
+        records = []
+        class ListHandler(logging.Handler):
+            def emit(self, record):
+                records.append(record.getMessage())
+        handler = ListHandler()
+        logger = logging.getLogger('simple_translation.timing')
+        old_level = logger.level
+        logger.setLevel(logging.INFO)
+        logger.addHandler(handler)
+        
+        published_at = datetime.datetime.now() - datetime.timedelta(hours=-1)
+        en_title, entry = self.create_entry_with_title(title='english', published_at=published_at)
+        de_title = self.create_entry_title(entry, title='german', language='de', published_at=published_at)
+        
+        response = self.client.get(reverse('de:entry_list'))
+        server_timing = response['Server-Timing']
+        self.assertTrue('annotate_with_translations;dur=' in server_timing)
+        self.assertTrue('filter_queryset_language;dur=' in server_timing)
+        self.assertTrue('simple_translation;dur=' in server_timing)
+        # the translations of the page
+        self.assertTrue('simple_translation_db;dur=' in server_timing)
+        self.assertTrue('desc="1 queries"' in server_timing)
+        self.assertEquals(len(records), 1)
+        self.assertTrue(records[0].startswith('path=/de/entries/ status=200 total_ms='))
+        # the queries of the operations are timed on every database, but
+        # not logged
+        self.assertFalse([connection for connection in connections.all() if connection.use_debug_cursor])
+        start_timing()
+        try:
+            TranslationPool().annotate_with_translations(list(Entry.objects.all()), using='replica')
+        finally:
+            timer = stop_timing()
+        self.assertEquals((timer.queries, timer.timings['annotate_with_translations'][0]), (1, 1))
+        self.assertEquals(connections['replica'].queries, [])
+        self.assertFalse('cursor' in connections['replica'].__dict__)
+        
+        logger.removeHandler(handler)
+        logger.setLevel(old_level)
+        del settings.SIMPLE_TRANSLATION_TIMING_LOG
+        self.set_root_urlconf(old_urlconf)
+        settings.MIDDLEWARE_CLASSES = old_middleware
+
+    def test_21_test_conditional_get(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        old_urlconf = self.set_root_urlconf('simple_translation.test.testapp.translated_urls')
+        old_middleware = settings.MIDDLEWARE_CLASSES
+        settings.MIDDLEWARE_CLASSES = old_middleware +[
+            'simple_translation.middleware.MultilingualGenericsMiddleware',
+            'simple_translation.conditional.TranslationConditionalGetMiddleware']
+        
+        published_at = datetime.datetime.now() - datetime.timedelta(hours=-1)
+        en_title, entry = self.create_entry_with_title(title='english', published_at=published_at)
+        de_title = self.create_entry_title(entry, title='german', language='de', published_at=published_at)
+        
+        de_index = reverse('de:entry_archive_index')
+        response = self.client.get(de_index)
+        self.assertContains(response, 'german')
+        self.assertEquals(response['Content-Language'], 'de')
+        etag = response['ETag']
+        self.assertNotEquals(self.client.get(reverse('en:entry_archive_index'))['ETag'], etag)
+        
+        # the view is not called
+        response = self.assertQueryBudget(0, self.client.get, de_index, HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 304)
+        
+        de_title.title = 'german changed'
+        de_title.save()
+        response = self.client.get(de_index, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'german changed')
+        self.assertNotEquals(response['ETag'], etag)
+        
+        # language from the request
+        @translation_condition(Entry)
+        def view(request):
+            return HttpResponse('')
+        request = RequestFactory().get('/')
+        request.LANGUAGE_CODE = 'en'
+        response = view(request)
+        self.assertEquals(response['Content-Language'], 'en')
+        self.assertTrue('Accept-Language' in response['Vary'])
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH=response['ETag'])
+        request.LANGUAGE_CODE = 'en'
+        self.assertEquals(view(request).status_code, 304)
+        
+        # views of one master only change with it
+        other_title, other_entry = self.create_entry_with_title(title='other', published_at=published_at)
+        @translation_condition(Entry, master_pk=lambda request, pk: pk)
+        def detail_view(request, pk):
+            return HttpResponse('')
+        request = RequestFactory().get('/')
+        request.LANGUAGE_CODE = 'en'
+        etag = detail_view(request, entry.pk)['ETag']
+        self.assertNotEquals(detail_view(request, other_entry.pk)['ETag'], etag)
+        other_title.title = 'other changed'
+        other_title.save()
+        request = RequestFactory().get('/', HTTP_IF_NONE_MATCH=etag)
+        request.LANGUAGE_CODE = 'en'
+        self.assertEquals(detail_view(request, entry.pk).status_code, 304)
+        en_title.title = 'english changed'
+        en_title.save()
+        self.assertEquals(detail_view(request, entry.pk).status_code, 200)
+        
+        self.set_root_urlconf(old_urlconf)
+        settings.MIDDLEWARE_CLASSES = old_middleware
+
+    def test_22_test_view_cache(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        cache.clear()
+        old_urlconf = self.set_root_urlconf('simple_translation.test.testapp.class_based_urls')
+        old_middleware = settings.MIDDLEWARE_CLASSES
+        settings.MIDDLEWARE_CLASSES = old_middleware +[
+            'simple_translation.middleware.MultilingualGenericsMiddleware']
+        
+        published_at = datetime.datetime.now() - datetime.timedelta(hours=-1)
+        en_title1, entry1 = self.create_entry_with_title(title='englishtitle1', published_at=published_at)
+        de_title1 = self.create_entry_title(entry1, title='germantitle1', language='de', published_at=published_at)
+        en_title2, entry2 = self.create_entry_with_title(title='englishtitle2', published_at=published_at)
+        
+        de_list = reverse('de:cached_entry_list')
+        de_detail1 = reverse('de:cached_entry_master_detail', kwargs={'slug': 'germantitle1'})
+        en_detail2 = reverse('en:cached_entry_master_detail', kwargs={'slug': 'englishtitle2'})
+        for url in (de_list, de_detail1, en_detail2):
+            self.assertEquals(self.client.get(url).status_code, 200)
+            self.assertQueryBudget(0, self.client.get, url)
+        # lists are recorded without listening to the instrumentation
+        self.assertEquals([key for key, receiver in operation_finished.receivers \
+            if key[0] == 'simple_translation.view_cache'], [])
+        
+        # the pages of the master in other languages link to the translation
+        en_title1.title = 'english changed'
+        en_title1.slug = 'english-changed'
+        en_title1.save()
+        self.assertContains(self.client.get(de_detail1), en_title1.get_absolute_url())
+        self.assertQueryBudget(0, self.client.get, en_detail2)
+        
+        de_title1.title = 'german changed'
+        de_title1.save()
+        self.assertContains(self.client.get(de_list), 'german changed - German')
+        self.assertContains(self.client.get(de_detail1), 'german changed - German')
+        self.assertQueryBudget(0, self.client.get, en_detail2)
+        
+        # new translations show up in the lists of their language
+        self.create_entry_title(entry2, title='germantitle2', language='de', published_at=published_at)
+        self.assertContains(self.client.get(de_list), 'germantitle2 - German')
+        # and as language choice of their master
+        self.assertContains(self.client.get(en_detail2), '/de/')
+        
+        # language filtered querysets mark a page as a list without loading objects
+        @translation_cache_page(60)
+        def count_view(request):
+            return HttpResponse(str(filter_queryset_language(request, Entry.objects.all()).count()))
+        en_title3, entry3 = self.create_entry_with_title(title='englishtitle3', published_at=published_at)
+        request = RequestFactory().get('/count/')
+        request.LANGUAGE_CODE = 'de'
+        self.assertEquals(count_view(request).content, '2')
+        self.assertEquals(self.assertQueryBudget(0, count_view, request).content, '2')
+        self.create_entry_title(entry3, title='germantitle3', language='de', published_at=published_at)
+        self.assertEquals(count_view(request).content, '3')
+        
+        self.set_root_urlconf(old_urlconf)
+        settings.MIDDLEWARE_CLASSES = old_middleware
+        
+    def test_23_test_fast_language_negotiation(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        negotiator = LanguageNegotiator(cache_size=2)
+        self.assertEquals(negotiator.get_language_from_header('fr-CH, de;q=0.9'), 'de')
+        self.assertEquals(negotiator.get_language_from_header('de-AT'), 'de')
+        self.assertEquals(negotiator.get_language_from_header('fr, *'), 'en')
+        # the least recently used header is dropped
+        self.assertEquals(negotiator.cache.keys(), ['de-AT', 'fr, *'])
+        negotiator.get_language_from_header('de-AT')
+        self.assertEquals(negotiator.cache.keys(), ['fr, *', 'de-AT'])
+        
+        # shared by threads
+        def negotiate(offset):
+            for i in range(200):
+                negotiator.get_language_from_header('de;q=0.%d' % ((i + offset) % 9 + 1))
+        threads = [threading.Thread(target=negotiate, args=(offset,)) for offset in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(len(negotiator.cache), 2)
+        
+        # without collections.OrderedDict
+        lru = LRUCache(2)
+        lru.entries = SortedDict()
+        for key in ('a', 'b', 'c'):
+            lru.set(key, key)
+        lru.get('b')
+        self.assertEquals(lru.set('d', 'd'), [('c', 'c')])
+        self.assertEquals(lru.keys(), ['b', 'd'])
+        
+        factory = RequestFactory()
+        request = factory.get('/', HTTP_ACCEPT_LANGUAGE='en-US;q=0.5, de;q=0.8')
+        self.assertEquals(negotiator.get_language_from_request(request), 'de')
+        request.COOKIES[settings.LANGUAGE_COOKIE_NAME] = 'en'
+        self.assertEquals(negotiator.get_language_from_request(request), 'en')
+        
+        old_middleware = settings.MIDDLEWARE_CLASSES
+        settings.MIDDLEWARE_CLASSES = ['simple_translation.middleware.MultilingualGenericsMiddleware']
+        settings.SIMPLE_TRANSLATION_FAST_NEGOTIATION = True
+        try:
+            middleware = MultilingualGenericsMiddleware()
+            request = factory.get('/', HTTP_ACCEPT_LANGUAGE='de-DE,de;q=0.9')
+            middleware.process_request(request)
+            self.assertEquals(request.LANGUAGE_CODE, 'de')
+            self.assertEquals(middleware.negotiator.cache.keys(), ['de-DE,de;q=0.9'])
+            response = middleware.process_response(request, HttpResponse())
+            self.assertEquals(response['Content-Language'], 'de')
+            
+            # LocaleMiddleware negotiates the language itself
+            settings.MIDDLEWARE_CLASSES = ['django.middleware.locale.LocaleMiddleware',
+                'simple_translation.middleware.MultilingualGenericsMiddleware']
+            middleware = MultilingualGenericsMiddleware()
+            self.assertEquals(middleware.negotiator, None)
+        finally:
+            del settings.SIMPLE_TRANSLATION_FAST_NEGOTIATION
+            settings.MIDDLEWARE_CLASSES = old_middleware
+        
+    def test_24_test_compact_translations(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        old_urlconf = self.set_root_urlconf('simple_translation.test.testapp.translated_urls')
+        published_at = datetime.datetime(2011, 1, 2)
+        for title in ('title1', 'title2'):
+            en_title, entry = self.create_entry_with_title(title='english' + title, published_at=published_at)
+            self.create_entry_title(entry, title='german' + title, language='de', published_at=published_at)
+        
+        entries = list(Entry.objects.order_by('pk'))
+        self.assertQueryBudget(1, TranslationPool().annotate_with_translations, entries, compact=True)
+        translation = get_preferred_translation_from_lang(entries[0], 'de')
+        self.assertEquals(translation.language, 'de')
+        self.assertEquals(unicode(translation), u'germantitle1')
+        self.assertEquals(translation.entry, entries[0])
+        self.assertEquals(translation.entry_id, entries[0].pk)
+        self.assertEquals(translation.pk, EntryTitle.objects.get(slug='germantitle1').pk)
+        self.assertEquals(translation.get_absolute_url(), '/2011/01/02/germantitle1/')
+        self.assertEquals(translation.get_language_display(), 'German')
+        self.assertRaises(AttributeError, setattr, translation, 'extra', 1)
+        self.assertRaises(AttributeError, setattr, translation, 'title', 'changed')
+        
+        # the fields asked for and those the url and __unicode__ read
+        entry = Entry.objects.get(pk=entries[1].pk)
+        TranslationPool().annotate_with_translations(entry, compact=True, fields=['title'])
+        self.assertEquals([(t.language, t.title) for t in entry.translations],
+            [('en', 'englishtitle2'), ('de', 'germantitle2')])
+        self.assertEquals(entry.translations[0].get_absolute_url(), '/2011/01/02/englishtitle2/')
+        TranslationPool().annotate_with_translations(entry, compact=True, fields=['slug'])
+        self.assertEquals(unicode(entry.translations[0]), u'englishtitle2')
+        
+        entries = list(Entry.objects.order_by('pk'))
+        template = Template('{% load simple_translation_tags %}'
+            '{% with entries|annotate_with_compact_translations as entries %}{% for entry in entries %}'
+            '{{ entry|get_preferred_translation_from_request:request }} '
+            '{{ entry|render_language_choices:request }}{% endfor %}{% endwith %}')
+        request = RequestFactory().get('/')
+        request.LANGUAGE_CODE = 'de'
+        output = self.assertQueryBudget(1, template.render, Context({'entries': entries, 'request': request}))
+        self.assertTrue('germantitle1' in output)
+        self.assertTrue('/2011/01/02/englishtitle2/' in output)
+        self.set_root_urlconf(old_urlconf)
+        
+    def test_25_test_translations_through_relations(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        published_at = datetime.datetime(2011, 1, 2)
+        entries = []
+        for title in ('title1', 'title2'):
+            en_title, entry = self.create_entry_with_title(title='english' + title, published_at=published_at)
+            self.create_entry_title(entry, title='german' + title, language='de', published_at=published_at)
+            entries.append(entry)
+        comment1 = Comment.objects.create(entry=entries[0], body='first')
+        comment2 = Comment.objects.create(entry=entries[1], body='second')
+        Comment.objects.create(entry=entries[0], reply_to=comment1, body='reply')
+        Comment.objects.create(entry=entries[1], reply_to=comment2, body='reply')
+        Comment.objects.create(entry=entries[0], reply_to=comment2, body='reply')
+        
+        comments = list(Comment.objects.order_by('pk'))
+        # one query for the entries and one for their translations
+        self.assertQueryBudget(2, TranslationPool().annotate_with_translations, comments, through='entry')
+        def get_titles():
+            return [get_preferred_translation_from_lang(comment.entry, 'de').title for comment in comments]
+        self.assertEquals(self.assertQueryBudget(0, get_titles),
+            ['germantitle1', 'germantitle2', 'germantitle1', 'germantitle2', 'germantitle1'])
+        
+        # one query per level
+        replies = list(Comment.objects.filter(reply_to__isnull=False).order_by('pk'))
+        self.assertQueryBudget(3, TranslationPool().annotate_with_translations, replies,
+            through='reply_to__entry', compact=True)
+        def get_titles():
+            return [get_preferred_translation_from_lang(reply.reply_to.entry, 'en').title for reply in replies]
+        self.assertEquals(self.assertQueryBudget(0, get_titles),
+            ['englishtitle1', 'englishtitle2', 'englishtitle2'])
+        
+        # select_related objects are not loaded again
+        comments = list(Comment.objects.select_related('entry').order_by('pk'))
+        self.assertQueryBudget(1, TranslationPool().annotate_with_translations, comments, through='entry')
+        self.assertEquals(len(comments[4].entry.translations), 2)
+        
+        self.assertRaises(ValueError, TranslationPool().annotate_with_translations, comments, through='body')
+        
+    def test_26_test_replica_routing(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        published_at = datetime.datetime(2011, 1, 2)
+        en_title, entry = self.create_entry_with_title(title='primarytitle', published_at=published_at)
+        # the replica has not caught up yet
+        replica_entry = Entry.objects.using('replica').create(pk=entry.pk, is_published=True)
+        replica_entry.entrytitle_set.create(pk=en_title.pk, title='replicatitle', slug='replicatitle',
+            language='en', pub_date=published_at)
+        unpin()
+        
+        old_routers = router.routers
+        router.routers = [ReplicaRouter()]
+        try:
+            request = RequestFactory().get('/')
+            request.LANGUAGE_CODE = 'en'
+            request_started.send(sender=self.__class__)
+            entries = list(Entry.objects.using('default').all())
+            TranslationPool().annotate_with_translations(entries)
+            self.assertEquals(entries[0].translations[0].title, 'replicatitle')
+            TranslationPool().annotate_with_translations(entries, using='default')
+            self.assertEquals(entries[0].translations[0].title, 'primarytitle')
+            entry = Entry.objects.using('default').get(pk=entry.pk)
+            self.assertEquals(get_preferred_translation_from_lang(entry, 'en', using='default').title,
+                'primarytitle')
+            queryset = filter_queryset_language(request, Entry.objects.all())
+            self.assertEquals(queryset.db, 'replica')
+            self.assertEquals(filter_queryset_language(request, Entry.objects.all(), using='default').db,
+                'default')
+            
+            # reads go to the primary for the rest of the request after a save
+            en_title.title = 'changedtitle'
+            en_title.save()
+            TranslationPool().annotate_with_translations(entries)
+            self.assertEquals(entries[0].translations[0].title, 'changedtitle')
+            self.assertEquals(filter_queryset_language(request, Entry.objects.all()).db, 'default')
+            
+            # the next request reads from the replica again
+            request_started.send(sender=self.__class__)
+            TranslationPool().annotate_with_translations(entries)
+            self.assertEquals(entries[0].translations[0].title, 'replicatitle')
+            request_finished.send(sender=self.__class__)
+            
+            # outside requests the pin ends with the block or expires
+            with pin_writes():
+                en_title.save()
+                self.assertEquals(get_pinned_database(), 'default')
+            self.assertEquals(get_pinned_database(), None)
+            settings.SIMPLE_TRANSLATION_PIN_SECONDS = 0
+            try:
+                en_title.save()
+                time.sleep(0.01)
+                self.assertEquals(get_pinned_database(), None)
+            finally:
+                del settings.SIMPLE_TRANSLATION_PIN_SECONDS
+        finally:
+            router.routers = old_routers
+            unpin()
+        
+    def test_27_test_annotate_many(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        published_at = datetime.datetime(2011, 1, 2)
+        for title in ('title1', 'title2', 'title3'):
+            en_title, entry = self.create_entry_with_title(title='english' + title, published_at=published_at)
+            self.create_entry_title(entry, title='german' + title, language='de', published_at=published_at)
+            Comment.objects.create(entry=entry, body=title)
+        
+        latest = list(Entry.objects.order_by('-pk')[:2])
+        oldest = list(Entry.objects.order_by('pk')[:2])
+        self.assertQueryBudget(1, TranslationPool().annotate_many_with_translations, latest, oldest)
+        self.assertEquals([get_preferred_translation_from_lang(entry, 'de').title for entry in latest + oldest],
+            ['germantitle3', 'germantitle2', 'germantitle1', 'germantitle2'])
+        
+        comments = list(Comment.objects.order_by('pk'))
+        self.assertQueryBudget(2, TranslationPool().annotate_many_with_translations, comments[:1], comments[1:],
+            through='entry', compact=True)
+        self.assertEquals([len(comment.entry.translations) for comment in comments], [2, 2, 2])
+        self.assertQueryBudget(0, TranslationPool().annotate_many_with_translations, [], [])
+        
+    def test_28_test_translation_coverage(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+            ('fr', 'French'),
+        )
+        published_at = datetime.datetime(2011, 1, 2)
+        entries = []
+        for title in ('title1', 'title2', 'title3', 'title4'):
+            en_title, entry = self.create_entry_with_title(title='english' + title, published_at=published_at)
+            entries.append(entry)
+        for entry in entries[:3]:
+            self.create_entry_title(entry, title='german%s' % entry.pk, language='de', published_at=published_at)
+        
+        coverage = TranslationCoverage(Entry, chunk_size=1)
+        report = self.assertQueryBudget(2, coverage.get_report)
+        self.assertEquals([(row['language'], row['translated'], row['missing'], row['percent']) for row in report],
+            [('en', 4, 0, 100.0), ('de', 3, 1, 75.0), ('fr', 0, 4, 0.0)])
+        self.assertEquals(list(coverage.iter_missing('de')), [entries[3].pk])
+        # one query per chunk and one to find the end
+        self.assertQueryBudget(5, lambda: self.assertEquals(list(coverage.iter_missing('fr')),
+            [entry.pk for entry in entries]))
+        
+        out = StringIO()
+        call_command('translation_coverage', 'testapp.Entry', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEquals(len(lines), 4)
+        self.assertEquals(lines[2].split(), ['testapp.Entry', 'de', '3', '1', '75.0%'])
+        
+        out = StringIO()
+        call_command('translation_coverage', languages='de,fr', missing=True, stdout=out)
+        self.assertEquals(out.getvalue().splitlines(), ['testapp.Entry,de,%s' % entries[3].pk] +
+            ['testapp.Entry,fr,%s' % entry.pk for entry in entries])
+        
+    def test_29_test_admin_language_filters(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        published_at = datetime.datetime(2011, 1, 2)
+        entries = []
+        for title in ('title1', 'title2', 'title3'):
+            en_title, entry = self.create_entry_with_title(title='english' + title, published_at=published_at)
+            entries.append(entry)
+        self.create_entry_title(entries[1], title='germantitle2', language='de', published_at=published_at)
+        
+        superuser = User(username="super", is_staff=True, is_active=True, 
+            is_superuser=True)
+        superuser.set_password("super")
+        superuser.save()
+        self.client.login(username='super', password='super')
+        
+        entry_admin = admin.site._registry[Entry]
+        entry_admin.translation_list_filter = True
+        entry_admin.list_display = ('description', 'languages', 'translation_count')
+        try:
+            changelist_url = reverse('admin:testapp_entry_changelist')
+            response = self.client.get(changelist_url, {'missing_language': 'de'})
+            self.assertEquals([obj.pk for obj in response.context['cl'].result_list], [entries[2].pk, entries[0].pk])
+            # the counts of all languages are read with two queries
+            self.assertContains(response, 'German (1)')
+            self.assertContains(response, 'German (2)')
+            self.assertContains(response, 'English (0)')
+            
+            response = self.client.get(changelist_url, {'has_language': 'de'})
+            self.assertEquals([obj.pk for obj in response.context['cl'].result_list], [entries[1].pk])
+            
+            response = self.client.get(changelist_url, {'has_language': 'en', 'missing_language': 'de'})
+            self.assertEquals(len(response.context['cl'].result_list), 2)
+            
+            # sorted by the number of translations, counted in the changelist query
+            response = self.assertQueryBudget(8, self.client.get, changelist_url, {'o': '2', 'ot': 'desc'})
+            result_list = response.context['cl'].result_list
+            self.assertEquals(result_list[0].pk, entries[1].pk)
+            self.assertEquals([obj.translation_count for obj in result_list], [2, 1, 1])
+            
+            response = self.client.get(changelist_url, {'has_language': 'xx'})
+            self.assertEquals(response.status_code, 302)
+        finally:
+            del entry_admin.translation_list_filter
+            del entry_admin.list_display
+        
+    def test_30_test_edit_all_languages(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        published_at = datetime.datetime(2011, 1, 2)
+        en_title, entry = self.create_entry_with_title(title='englishtitle', published_at=published_at)
+        
+        superuser = User(username="super", is_staff=True, is_active=True, 
+            is_superuser=True)
+        superuser.set_password("super")
+        superuser.save()
+        self.client.login(username='super', password='super')
+        
+        change_url = reverse('all_languages:testapp_entry_change', args=(entry.pk,))
+        response = self.client.get(change_url)
+        formset = response.context['inline_admin_formsets'][0].formset
+        self.assertEquals([form.initial.get('language') for form in formset.forms], ['en', 'de'])
+        
+        def get_data(**kwargs):
+            data = {
+                'is_published': 'on',
+                'entrytitle_set-TOTAL_FORMS': '2',
+                'entrytitle_set-INITIAL_FORMS': '1',
+                'entrytitle_set-MAX_NUM_FORMS': '2',
+                'entrytitle_set-0-id': en_title.pk,
+                'entrytitle_set-0-entry': entry.pk,
+                'entrytitle_set-0-language': 'en',
+                'entrytitle_set-0-title': 'englishtitle',
+                'entrytitle_set-0-slug': 'englishtitle',
+                'entrytitle_set-0-pub_date_0': '2011-01-02',
+                'entrytitle_set-0-pub_date_1': '00:00:00',
+                'entrytitle_set-1-entry': entry.pk,
+                'entrytitle_set-1-language': 'de',
+            }
+            data.update(kwargs)
+            return data
+        
+        # the untouched german form is not saved
+        response = self.client.post(change_url, get_data(**{'entrytitle_set-0-title': 'changed'}))
+        self.assertEquals(response.status_code, 302)
+        self.assertEquals([(t.language, t.title) for t in EntryTitle.objects.filter(entry=entry)],
+            [('en', 'changed')])
+        
+        response = self.client.post(change_url, get_data(**{
+            'entrytitle_set-1-title': 'germantitle',
+            'entrytitle_set-1-slug': 'germantitle',
+            'entrytitle_set-1-pub_date_0': '2011-01-02',
+            'entrytitle_set-1-pub_date_1': '00:00:00',
+        }))
+        self.assertEquals(response.status_code, 302)
+        self.assertEquals(sorted([(t.language, t.title) for t in EntryTitle.objects.filter(entry=entry)]),
+            [('de', 'germantitle'), ('en', 'englishtitle')])
+        
+        # the languages are validated together
+        response = self.client.post(change_url, get_data(**{
+            'entrytitle_set-TOTAL_FORMS': '2',
+            'entrytitle_set-INITIAL_FORMS': '2',
+            'entrytitle_set-1-id': EntryTitle.objects.get(language='de').pk,
+            'entrytitle_set-1-language': 'en',
+            'entrytitle_set-1-title': 'germantitle',
+            'entrytitle_set-1-slug': 'germantitle',
+            'entrytitle_set-1-pub_date_0': '2011-01-02',
+            'entrytitle_set-1-pub_date_1': '00:00:00',
+        }))
+        self.assertEquals(response.status_code, 200)
+        self.assertContains(response, 'There can only be one translation per language.')
+        self.assertEquals(EntryTitle.objects.get(slug='germantitle').language, 'de')
+        
+    def test_31_test_translation_fields_json(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        published_at = datetime.datetime(2011, 1, 2)
+        en_title, entry = self.create_entry_with_title(title='englishtitle', published_at=published_at)
+        self.create_entry_title(entry, title='germantitle', language='de', published_at=published_at)
+        
+        superuser = User(username="super", is_staff=True, is_active=True, 
+            is_superuser=True)
+        superuser.set_password("super")
+        superuser.save()
+        self.client.login(username='super', password='super')
+        ContentType.objects.get_for_model(Entry)
+        
+        url = reverse('admin:testapp_entry_translation_fields', args=(entry.pk,))
+        # session, user, master and translations
+        response = self.assertQueryBudget(4, self.client.get, url, {'language': 'de'})
+        self.assertEquals(response['Content-Type'], 'application/json')
+        data = simplejson.loads(response.content)
+        self.assertEquals(data['language'], 'de')
+        self.assertEquals(data['languages'], ['en', 'de'])
+        self.assertTrue(data['exists'])
+        self.assertEquals(data['values']['title'], 'germantitle')
+        self.assertTrue('value="germantitle"' in data['fields']['title'])
+        self.assertFalse('language' in data['fields'])
+        self.assertTrue('delete-translation/?language=de' in data['delete_link'])
+        
+        en_title.delete()
+        data = simplejson.loads(self.client.get(url, {'language': 'en'}).content)
+        self.assertFalse(data['exists'])
+        self.assertEquals(data['values']['title'], '')
+        self.assertEquals(data['delete_link'], '')
+        
+        self.assertEquals(self.client.get(url, {'language': 'fr'}).status_code, 400)
+        self.assertEquals(self.client.get(reverse('admin:testapp_entry_translation_fields',
+            args=(entry.pk + 1,)), {'language': 'de'}).status_code, 404)
+        
+        # the tabs load the fields instead of the page
+        response = self.client.get(reverse('admin:testapp_entry_change', args=(entry.pk,)), {'language': 'de'})
+        self.assertContains(response, "url: 'translation-fields/'")
+        
+    def test_32_test_bulk_create_with_translations(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        published_at = datetime.datetime(2011, 1, 2)
+        existing_title, existing_entry = self.create_entry_with_title(title='existing', published_at=published_at)
+        items = [({'is_published': i % 2 == 0}, {
+            'de': {'title': 'german%s' % i, 'slug': 'german%s' % i, 'pub_date': published_at},
+            'en': {'title': 'english%s' % i, 'slug': 'english%s' % i, 'pub_date': published_at},
+        }) for i in range(5)]
+        # the highest primary key, the insert and the new primary keys of both
+        # models and the search index per chunk, the caller's transaction is
+        # not committed
+        commits = []
+        old_commit = transaction.commit
+        transaction.commit = lambda *args, **kwargs: commits.append(True)
+        try:
+            masters = self.assertQueryBudget(21, TranslationPool().bulk_create_with_translations, Entry, items,
+                chunk_size=2)
+        finally:
+            transaction.commit = old_commit
+        self.assertEquals(commits, [])
+        self.assertEquals(len(masters), 5)
+        self.assertEquals(Entry.objects.count(), 6)
+        self.assertEquals(EntryTitle.objects.count(), 11)
+        self.assertEquals([master.is_published for master in masters], [True, False, True, False, True])
+        for i, master in enumerate(masters):
+            self.assertEquals([(t.language, t.title) for t in master.translations],
+                [('en', 'english%s' % i), ('de', 'german%s' % i)])
+            self.assertEquals(master.translations[0], EntryTitle.objects.get(slug='english%s' % i))
+            self.assertEquals(get_preferred_translation_from_lang(Entry.objects.get(pk=master.pk), 'de').title,
+                'german%s' % i)
+        self.assertEquals(EntryTitle.objects.get(slug='existing').entry, existing_entry)
+        self.assertEquals(get_search_index().search_pks(Entry, 'german3'), [masters[3].pk])
+        
+        # a failing chunk is rolled back
+        self.assertRaises(Exception, TranslationPool().bulk_create_with_translations, Entry,
+            [({'is_published': True}, {'en': {'title': 'duplicate', 'slug': 'existing', 'pub_date': published_at}})])
+        
+    def test_33_test_extra_translated_models(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        published_at = datetime.datetime(2011, 1, 2)
+        entries = []
+        for title in ('title1', 'title2', 'title3'):
+            en_title, entry = self.create_entry_with_title(title=title, published_at=published_at)
+            self.create_entry_title(entry, title='german' + title, language='de', published_at=published_at)
+            entries.append(entry)
+        EntryBody.objects.create(entry=entries[0], language='de', body='Inhalt1')
+        EntryBody.objects.create(entry=entries[0], language='en', body='body1')
+        EntryBody.objects.create(entry=entries[2], language='en', body='body3')
+        EntryBody.objects.create(entry=entries[2], language='fr', body='corps3')
+        
+        pool = TranslationPool()
+        self.assertTrue(pool.is_registered_translation(EntryBody))
+        self.assertEquals(pool.get_info(EntryBody).translation_of_model, Entry)
+        self.assertEquals(pool.get_info(Entry).translated_model, EntryTitle)
+        self.assertRaises(TranslationAllreadyRegistered, pool.register_translation, Entry, EntryBody)
+        self.assertRaises(TranslationNotRegistered, pool.register_translation, Comment, EntryBody,
+            attribute='bodies')
+        
+        # the lazy bodies are not read until used, then for the whole list at once
+        entries = self.assertQueryBudget(1, pool.annotate_with_translations, list(Entry.objects.all()))
+        self.assertEquals([len(entry.translations) for entry in entries], [2, 2, 2])
+        bodies = self.assertQueryBudget(1, lambda: [[body.body for body in entry.bodies] for entry in entries])
+        self.assertEquals(bodies, [['body1', 'Inhalt1'], [], ['body3']])
+        self.assertFalse(entries[1].bodies)
+        self.assertEquals(entries[2].bodies[0].language, 'en')
+        
+        body_info = pool.get_info(EntryBody)
+        body_info.lazy = False
+        try:
+            # one query per translated model
+            entries = self.assertQueryBudget(2, pool.annotate_with_translations, list(Entry.objects.all()))
+            self.assertEquals([[body.body for body in entry.bodies] for entry in entries],
+                [['body1', 'Inhalt1'], [], ['body3']])
+            entry = self.assertQueryBudget(2, pool.annotate_with_translations, Entry.objects.get(pk=entries[0].pk))
+            self.assertEquals([body.language for body in entry.bodies], ['en', 'de'])
+            comments = [Comment.objects.create(entry=entries[2], body='comment')]
+            pool.annotate_with_translations(comments, through='entry')
+            self.assertEquals([body.body for body in comments[0].entry.bodies], ['body3'])
+        finally:
+            body_info.lazy = True
+        
+    def test_34_test_fallback_table(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        info = TranslationPool().get_info(Entry)
+        info.fallback_table = True
+        try:
+            fallbacks.create_tables()
+            published_at = datetime.datetime(2011, 1, 2)
+            both_en, both = self.create_entry_with_title(title='both', published_at=published_at)
+            both_de = self.create_entry_title(both, title='beide', language='de', published_at=published_at)
+            german_de, german = self.create_entry_with_title(title='deutsch', language='de', published_at=published_at)
+            english_en, english = self.create_entry_with_title(title='english', published_at=published_at)
+            pks = [both.pk, german.pk, english.pk]
+            
+            def resolved(language):
+                translations = fallbacks.get_resolved_translations(Entry, language, pks)
+                return sorted([(translation.entry_id, translation.title) for translation in translations])
+            
+            # maintained by the signals and read with one join
+            self.assertEquals(self.assertQueryBudget(1, resolved, 'de'),
+                [(both.pk, 'beide'), (german.pk, 'deutsch'), (english.pk, 'english')])
+            self.assertEquals(resolved('en'),
+                [(both.pk, 'both'), (german.pk, 'deutsch'), (english.pk, 'english')])
+            
+            both_de.delete()
+            self.assertEquals(resolved('de')[0], (both.pk, 'both'))
+            english_en.language = 'de'
+            english_en.save()
+            self.assertEquals(resolved('en')[2], (english.pk, 'english'))
+            german_de.entry = english
+            german_de.save()
+            self.assertEquals(resolved('de'), [(both.pk, 'both'), (english.pk, 'deutsch')])
+            
+            # an unannotated master is annotated once, render_language_choices
+            # reuses the translations
+            entry = Entry.objects.get(pk=both.pk)
+            translation = self.assertQueryBudget(1, get_preferred_translation_from_lang, entry, 'de')
+            self.assertEquals(translation.title, 'both')
+            self.assertQueryBudget(0, get_preferred_translation_from_lang, entry, 'de')
+            self.assertFalse(hasattr(entry, 'translation_urls'))
+            
+            # a list is resolved by the one query of annotate_with_translations
+            entries = self.assertQueryBudget(1, TranslationPool().annotate_with_translations,
+                list(Entry.objects.filter(pk__in=pks).order_by('pk')))
+            self.assertEquals(self.assertQueryBudget(0, lambda: [(entry.pk,
+                get_preferred_translation_from_lang(entry, 'de').title) for entry in entries \
+                if entry.translations]), resolved('de'))
+            self.assertEquals([(entry.pk, entry.resolved_translations['en'].title) for entry in entries \
+                if entry.resolved_translations['en']], resolved('en'))
+            
+            entries = self.assertQueryBudget(1, fallbacks.annotate_with_resolved_translations,
+                list(Entry.objects.filter(pk__in=pks).order_by('pk')), 'en')
+            self.assertEquals([entry.translation and entry.translation.title for entry in entries],
+                ['both', None, 'deutsch'])
+            self.assertEquals(self.assertQueryBudget(0, get_preferred_translation_from_lang,
+                entries[2], 'en').title, 'deutsch')
+            
+            EntryTitle.objects.create(entry=german, title='neu', slug='neu', language='en', pub_date=published_at)
+            connection.cursor().execute('DELETE FROM testapp_entrytitle_fallback')
+            self.assertEquals(resolved('de'), [])
+            call_command('rebuild_translation_fallbacks', verbosity=0)
+            self.assertEquals(resolved('de'),
+                [(both.pk, 'both'), (german.pk, 'neu'), (english.pk, 'deutsch')])
+        finally:
+            info.fallback_table = False
+        # models without a fallback table are named in the error
+        self.assertRaisesRegexp(ImproperlyConfigured, r'^\[Entry\] ', fallbacks.get_resolved_translations,
+            Entry, 'de')
+        
+    def test_35_test_slug_index(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        old_urlconf = self.set_root_urlconf('simple_translation.test.testapp.class_based_urls')
+        old_middleware = settings.MIDDLEWARE_CLASSES
+        settings.MIDDLEWARE_CLASSES = old_middleware +[
+            'simple_translation.middleware.MultilingualGenericsMiddleware']
+        info = TranslationPool().get_info(Entry)
+        info.slug_field = 'slug'
+        slug_index = get_slug_index()
+        slug_index.clear()
+        try:
+            published_at = datetime.datetime(2011, 1, 2)
+            for title in ('title1', 'title2'):
+                en_title, entry = self.create_entry_with_title(title='english' + title, published_at=published_at)
+                de_title = self.create_entry_title(entry, title='german' + title, language='de', published_at=published_at)
+            
+            # the slug is looked up once, then the object is read by primary key
+            detail_url = reverse('de:entry_master_detail', kwargs={'slug': 'germantitle2'})
+            self.assertQueryBudget(3, self.client.get, detail_url)
+            response = self.assertQueryBudget(2, self.client.get, detail_url)
+            self.assertContains(response, 'germantitle2 - German')
+            self.assertEquals(slug_index.lookup(Entry, 'de', 'germantitle2'), (entry.pk, de_title.pk))
+            
+            # missing slugs are remembered
+            missing_url = reverse('en:entry_master_detail', kwargs={'slug': 'germantitle2'})
+            self.assertEquals(self.assertQueryBudget(1, self.client.get, missing_url).status_code, 404)
+            self.assertEquals(self.assertQueryBudget(0, self.client.get, missing_url).status_code, 404)
+            
+            response = self.client.get(de_title.get_absolute_url())
+            self.assertContains(response, 'germantitle2 - German')
+            
+            # saving and deleting drop the entries
+            de_title.slug = 'neuertitel2'
+            de_title.save()
+            self.assertEquals(self.client.get(detail_url).status_code, 404)
+            self.assertContains(self.client.get(reverse('de:entry_master_detail',
+                kwargs={'slug': 'neuertitel2'})), 'germantitle2 - German')
+            self.create_entry_title(entry, title='englishtitle3', slug='germantitle2', language='en',
+                published_at=published_at)
+            self.assertEquals(self.client.get(missing_url).status_code, 200)
+            de_title.delete()
+            self.assertEquals(slug_index.lookup(Entry, 'de', 'neuertitel2'), None)
+            
+            # writes in other processes are read from the log at the next check
+            slug_index.lookup(Entry, 'en', 'germantitle2')
+            slug_index.lookup(Entry, 'de', 'germantitle1')
+            log_slug_changes(EntryTitle, [(None, 'en', 'germantitle2')])
+            self.assertQueryBudget(0, slug_index.lookup, Entry, 'en', 'germantitle2')
+            slug_index.next_checks.clear()
+            self.assertQueryBudget(1, slug_index.lookup, Entry, 'en', 'germantitle2')
+            # only the changed slugs are dropped, saving a master drops none
+            entry.save()
+            self.assertQueryBudget(0, slug_index.lookup, Entry, 'de', 'germantitle1')
+            # an evicted log drops the slugs of the model
+            cache.delete(get_changes_key(EntryTitle))
+            slug_index.next_checks.clear()
+            self.assertQueryBudget(1, slug_index.lookup, Entry, 'de', 'germantitle1')
+            
+            # slugs remembered as missing are dropped by bulk creation
+            self.assertEquals(slug_index.lookup(Entry, 'de', 'bulktitel'), None)
+            masters = TranslationPool().bulk_create_with_translations(Entry, [({'is_published': True},
+                {'de': {'title': 'bulktitel', 'slug': 'bulktitel', 'pub_date': published_at}})])
+            self.assertEquals(slug_index.lookup(Entry, 'de', 'bulktitel'),
+                (masters[0].pk, masters[0].translations[0].pk))
+            
+            # the entries and their translation keys stay in step across threads
+            shared_index = SlugIndex(max_size=10)
+            def fill(offset):
+                for pk in xrange(offset, offset + 200):
+                    shared_index.set((EntryTitle, 'en', 'slug%s' % pk), (pk, pk))
+            threads = [threading.Thread(target=fill, args=(offset,)) for offset in (0, 1000, 2000, 3000)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEquals(len(shared_index.entries), 10)
+            self.assertEquals(sorted(shared_index.keys.values()), sorted(shared_index.entries.keys()))
+            
+            small_index = SlugIndex(max_size=2)
+            small_index.warm(EntryTitle)
+            self.assertEquals(len(small_index.entries), 2)
+            self.assertQueryBudget(0, small_index.lookup, EntryTitle, 'de', 'germantitle1')
+            small_index.lookup(EntryTitle, 'en', 'englishtitle2')
+            self.assertEquals(small_index.entries.keys(), [(EntryTitle, 'de', 'germantitle1'),
+                (EntryTitle, 'en', 'englishtitle2')])
+        finally:
+            info.slug_field = None
+            slug_index.clear()
+            settings.MIDDLEWARE_CLASSES = old_middleware
+            self.set_root_urlconf(old_urlconf)
+        
+    def test_36_test_translation_snapshots(self):
+        settings.LANGUAGES = (
+            ('en', 'English'),
+            ('de', 'German'),
+        )
+        published_at = datetime.datetime(2011, 1, 2, 10, 30, 5, 123456)
+        entries = []
+        for title in ('title1', 'title2', 'title3'):
+            en_title, entry = self.create_entry_with_title(title='english' + title, published_at=published_at)
+            entries.append(entry)
+        self.create_entry_title(entries[0], title='germantitle1', language='de', published_at=published_at)
+        self.create_entry_title(entries[2], title=u'deutscher \xfctitel3', slug='germantitle3', language='de',
+            published_at=published_at)
+        
+        directory = tempfile.mkdtemp()
+        try:
+            call_command('compile_translation_snapshots', output=directory, verbosity=0)
+            self.assertEquals(sorted(os.listdir(directory)),
+                ['testapp.entrytitle.de.snapshot', 'testapp.entrytitle.en.snapshot'])
+            snapshot = Snapshot(os.path.join(directory, 'testapp.entrytitle.de.snapshot'))
+            self.assertEquals((snapshot.version, snapshot.count), (entries[2].pk, 2))
+            self.assertEquals(snapshot.get(entries[1].pk), None)
+            snapshot.close()
+            
+            pool = SnapshotTranslationPool(directory)
+            new_title, new_entry = self.create_entry_with_title(title='englishtitle4', published_at=published_at)
+            masters = list(Entry.objects.order_by('pk'))
+            # masters newer than the snapshot are read from the database
+            self.assertQueryBudget(0, pool.annotate_with_translations, masters[:3])
+            stats.reset()
+            stats.enable()
+            try:
+                self.assertQueryBudget(1, pool.annotate_with_translations, masters)
+            finally:
+                stats.disable()
+            counter = stats.get_counters([Entry])[0]
+            self.assertEquals((counter['operation'], counter['calls'], counter['rows'], counter['queries']),
+                ('annotate_with_translations', 1, 6, 1))
+            stats.reset()
+            self.assertEquals([[(t.language, t.title) for t in master.translations] for master in masters], [
+                [('en', 'englishtitle1'), ('de', 'germantitle1')],
+                [('en', 'englishtitle2')],
+                [('en', 'englishtitle3'), ('de', u'deutscher \xfctitel3')],
+                [('en', 'englishtitle4')],
+            ])
+            translation = masters[0].translations[1]
+            self.assertEquals(translation, EntryTitle.objects.get(slug='germantitle1'))
+            self.assertEquals(translation.pub_date, published_at)
+            self.assertQueryBudget(0, lambda: translation.entry)
+            self.assertEquals(translation.get_absolute_url(), EntryTitle.objects.get(slug='germantitle1').get_absolute_url())
+            entry = Entry.objects.get(pk=entries[1].pk)
+            pool.annotate_with_translations(entry)
+            self.assertEquals(entry.translations[0].title, 'englishtitle2')
+            
+            # masters of models with a fallback table are resolved like in the base pool
+            info = pool.get_info(Entry)
+            info.fallback_table = True
+            try:
+                masters = self.assertQueryBudget(1, pool.annotate_with_translations,
+                    list(Entry.objects.order_by('pk')))
+            finally:
+                info.fallback_table = False
+            self.assertEquals([master.resolved_translations['de'].title for master in masters],
+                ['germantitle1', 'englishtitle2', u'deutscher \xfctitel3', 'englishtitle4'])
+            
+            # compiling again replaces the files, the pool reopens them
+            EntryTitle.objects.filter(slug='englishtitle2').update(title='changed')
+            call_command('compile_translation_snapshots', output=directory, verbosity=0)
+            masters = self.assertQueryBudget(0, pool.annotate_with_translations, list(Entry.objects.order_by('pk')))
+            self.assertEquals(masters[1].translations[0].title, 'changed')
+            self.assertEquals(masters[3].translations[0].title, 'englishtitle4')
+            
+            # read in chunks, the first translation of a master still wins
+            self.create_entry_title(entries[0], title='zweitertitel1', language='de', published_at=published_at)
+            call_command('compile_translation_snapshots', output=directory, chunk_size=1, verbosity=0)
+            masters = self.assertQueryBudget(0, pool.annotate_with_translations, list(Entry.objects.order_by('pk')))
+            self.assertEquals([[(t.language, t.title) for t in master.translations] for master in masters], [
+                [('en', 'englishtitle1'), ('de', 'germantitle1')],
+                [('en', 'changed')],
+                [('en', 'englishtitle3'), ('de', u'deutscher \xfctitel3')],
+                [('en', 'englishtitle4')],
+            ])
+        finally:
+            shutil.rmtree(directory)
+        
+        settings.SIMPLE_TRANSLATION_POOL = 'simple_translation.snapshots.SnapshotTranslationPool'
+        settings.SIMPLE_TRANSLATION_SNAPSHOT_DIR = directory
+        try:
+            pool = get_translation_pool()
+            self.assertTrue(isinstance(pool, SnapshotTranslationPool))
+            self.assertEquals(pool.directory, directory)
+        finally:
+            del settings.SIMPLE_TRANSLATION_POOL
+            del settings.SIMPLE_TRANSLATION_SNAPSHOT_DIR
@@ -1,9 +1,19 @@
+from collections import namedtuple
+
 from django.db import models
 from django.conf import settings
+from django.utils.functional import curry
+from django.utils.importlib import import_module
+
+from simple_translation.instrumentation import instrument, model_of, count_translations
+from simple_translation.routing import get_read_database
 
 class TranslationAllreadyRegistered(Exception):
     pass
 
+class TranslationNotRegistered(Exception):
+    pass
+
 class TranslationOptions(object):
     
     def __init__(self, options={}):
@@ -13,12 +23,153 @@ class TranslationOptions(object):
         self.translation_of_field = options.get('translation_of_field')
         self.translations_of_accessor = options.get('translations_of_accessor')
         self.translation_join_filter = options.get('translation_join_filter')
+        self.search_fields = options.get('search_fields')
+        # additional translated models are annotated under their attribute
+        self.attribute = options.get('attribute')
+        self.lazy = options.get('lazy', False)
+        self.extra_translations = options.get('extra_translations', [])
+        self.fallback_table = options.get('fallback_table', False)
+        self.slug_field = options.get('slug_field')
         
+# methods of the translated model that also work on its records
+RECORD_METHODS = ('__unicode__', '__str__', '_get_absolute_url')
+
+_record_classes = {}
+
+def get_translation_record_class(info, fields=None):
+    """
+    A namedtuple with the column values of the translated model in
+    ``fields`` or all of its fields, the language, the primary key and the
+    master. Attributes are named like on the model, foreign keys get the
+    ``_id`` of their column. Records have the ``__unicode__``,
+    ``_get_absolute_url`` and ``get_FOO_display`` of the model, the fields
+    these methods read from ``self`` are always included.
+    """
+    key = (info.translated_model, fields and tuple(fields))
+    if key in _record_classes:
+        return _record_classes[key]
+    opts = info.translated_model._meta
+    methods = dict([(name, getattr(info.translated_model, name).im_func) for name in RECORD_METHODS \
+        if hasattr(info.translated_model, name)])
+    required = set([opts.pk.name, info.translation_of_field, info.language_field])
+    for method in methods.values():
+        # the names of the attributes the method reads
+        required.update(getattr(method, 'func_code', None) and method.func_code.co_names or ())
+    query_fields = [field for field in opts.fields if field.name in required or \
+        fields is None or field.name in fields]
+    attnames = [field.attname for field in query_fields] + [info.translation_of_field]
+    attrs = {
+        '__slots__': (),
+        'query_names': [field.name for field in query_fields],
+        'pk': property(lambda self: getattr(self, opts.pk.attname)),
+    }
+    attrs.update(methods)
+    for field in query_fields:
+        if field.choices:
+            attrs['get_%s_display' % field.name] = curry(models.Model._get_FIELD_display.im_func,
+                field=field)
+    if '_get_absolute_url' in attrs:
+        # the get_absolute_url of models is wrapped for ABSOLUTE_URL_OVERRIDES
+        attrs['get_absolute_url'] = models.permalink(attrs['_get_absolute_url'])
+    record_class = type('%sRecord' % opts.object_name, 
+        (namedtuple('%sRecordBase' % opts.object_name, attnames),), attrs)
+    _record_classes[key] = record_class
+    return record_class
+
+def load_related(object_list, path, using=None):
+    """
+    The objects at the end of the ``__`` separated foreign key ``path`` of
+    every object in ``object_list``. Each level is read with one query, and
+    cached on the objects like ``select_related`` does.
+    """
+    for name in path.split('__'):
+        if not object_list:
+            break
+        field = object_list[0]._meta.get_field(name)
+        if not isinstance(field, models.ForeignKey):
+            raise ValueError("%s.%s is not a foreign key" % (object_list[0].__class__.__name__, name))
+        cache_name = field.get_cache_name()
+        rel_field_name = field.rel.get_related_field().attname
+        missing = set([getattr(obj, field.attname) for obj in object_list \
+            if not hasattr(obj, cache_name)])
+        missing.discard(None)
+        related = {}
+        if missing:
+            manager = field.rel.to._default_manager.db_manager(get_read_database(field.rel.to, using))
+            for rel_obj in manager.filter(**{
+                '%s__in' % field.rel.field_name: list(missing)}):
+                related[getattr(rel_obj, rel_field_name)] = rel_obj
+        next_objects = {}
+        for obj in object_list:
+            if not hasattr(obj, cache_name):
+                setattr(obj, cache_name, related.get(getattr(obj, field.attname)))
+            rel_obj = getattr(obj, cache_name)
+            if rel_obj is not None:
+                next_objects[id(rel_obj)] = rel_obj
+        object_list = next_objects.values()
+    return object_list
+
+class TranslationLoader(object):
+    """
+    Reads the translations of an additional translated model for all masters
+    in ``pks`` with one query, the first time they are asked for.
+    """
+    def __init__(self, info, pks, languages, using=None):
+        self.info = info
+        self.pks = pks
+        self.languages = languages
+        self.using = using
+        self.translations = None
+
+    def load(self):
+        translated_model = self.info.translated_model
+        translations = translated_model._default_manager.using(
+            get_read_database(translated_model, self.using)).filter(**{
+            self.info.translation_of_field + '__in': self.pks,
+            self.info.language_field + '__in': self.languages,
+        })
+        by_master = {}
+        for obj in translations:
+            by_master.setdefault(getattr(obj, self.info.translation_of_field + '_id'), []).append(obj)
+        for objs in by_master.values():
+            objs.sort(key=lambda obj: self.languages.index(getattr(obj, self.info.language_field)))
+        return by_master
+
+    def get(self, pk):
+        if self.translations is None:
+            self.translations = self.load()
+        return self.translations.get(pk, [])
+
+class LazyTranslations(object):
+    """
+    The translations of one master, read by the ``TranslationLoader`` of its
+    list when first used.
+    """
+    def __init__(self, loader, pk):
+        self.loader = loader
+        self.pk = pk
+
+    def __iter__(self):
+        return iter(self.loader.get(self.pk))
+
+    def __len__(self):
+        return len(self.loader.get(self.pk))
+
+    def __getitem__(self, index):
+        return self.loader.get(self.pk)[index]
+
+    def __nonzero__(self):
+        return bool(self.loader.get(self.pk))
+
+    def __repr__(self):
+        return repr(self.loader.get(self.pk))
+
 class TranslationPool(object):
     
     discovered = False
     translated_models_dict = {}
     translation_models_dict = {}
+    extra_translation_models_dict = {}
     
     def discover_translations(self):        
         if self.discovered:
@@ -35,20 +186,36 @@ class TranslationPool(object):
             return self.translated_models_dict[ \
                 self.translation_models_dict[model]
             ]
+        elif model in self.extra_translation_models_dict:
+            return self.extra_translation_models_dict[model]
         
     def register_translation(self, translation_of_model, translated_model, \
-        language_field='language'):
-        
+        language_field='language', search_fields=None, attribute=None, lazy=False, \
+        fallback_table=False, slug_field=None):
+        """
+        With ``attribute`` ``translated_model`` is registered as an additional
+        translated model of an already registered ``translation_of_model``.
+        Its translations are annotated under ``attribute``, with ``lazy``
+        only when first used. With ``fallback_table`` the translation shown
+        in every language is materialized, see ``simple_translation.fallbacks``.
+        The translated ``slug_field`` is looked up through the in-process
+        index of ``simple_translation.slugs``.
+        """
         assert issubclass(translation_of_model, models.Model) \
             and issubclass(translated_model, models.Model)
         
-        if translation_of_model in self.translated_models_dict:
+        if attribute is None and translation_of_model in self.translated_models_dict:
             raise TranslationAllreadyRegistered, \
                 "[%s] a translation for this model is already registered" \
                     % translation_of_model.__name__
+        if attribute is not None and translation_of_model not in self.translated_models_dict:
+            raise TranslationNotRegistered, \
+                "[%s] register the main translation of this model first" \
+                    % translation_of_model.__name__
             
         options = {}    
         options['translated_model'] = translated_model
+        options['translation_of_model'] = translation_of_model
         
         opts = translation_of_model._meta
         for rel in opts.get_all_related_objects():
@@ -58,6 +225,17 @@ class TranslationPool(object):
 
         options['translation_join_filter'] = translated_model.__name__.lower()          
         options['language_field'] = language_field     
+        options['search_fields'] = search_fields
+        options['fallback_table'] = fallback_table
+        options['slug_field'] = slug_field
+        
+        if attribute is not None:
+            options['attribute'] = attribute
+            options['lazy'] = lazy
+            info = TranslationOptions(options)
+            self.translated_models_dict[translation_of_model].extra_translations.append(info)
+            self.extra_translation_models_dict[translated_model] = info
+            return
         
         self.translated_models_dict[translation_of_model] = TranslationOptions(options)
         # keep track both ways
@@ -65,20 +243,48 @@ class TranslationPool(object):
 
     def unregister_translation(self, translation_of_model):
         info = self.get_info(translation_of_model)
+        for extra_info in info.extra_translations:
+            del self.extra_translation_models_dict[extra_info.translated_model]
         del self.translation_models_dict[info.translated_model]
         del self.translated_models_dict[translation_of_model]
     
-    def annotate_with_translations(self, list_or_instance):
-        
+    @instrument('annotate_with_translations', lambda self, list_or_instance, *args, **kwargs: \
+        model_of(list_or_instance), get_rows=count_translations)
+    def annotate_with_translations(self, list_or_instance, compact=False, fields=None, through=None,
+        using=None):
+        """
+        With ``compact`` the translations are read with ``values_list`` into
+        read-only records of ``fields`` or all fields, see
+        ``get_translation_record_class``. With ``through``, a foreign key
+        path like ``'entry'`` or ``'reply_to__entry'``, the masters at the
+        end of the path are annotated instead, see ``load_related``. The
+        translations are read from ``using`` or the database returned by
+        ``simple_translation.routing.get_read_database``. The translations of
+        additional translated models are read with one query per model and
+        set under their attribute, see ``annotate_with_extra_translations``.
+        """
         self.discover_translations()
         if not list_or_instance:
             return list_or_instance
+        if through:
+            object_list = isinstance(list_or_instance, models.Model) and [list_or_instance] \
+                or list(list_or_instance)
+            masters = load_related(object_list, through, using)
+            # the same master can be loaded as several instances
+            unique_masters = dict([(master.pk, master) for master in masters])
+            self.annotate_with_translations(unique_masters.values(), compact=compact, fields=fields,
+                using=using)
+            for master in masters:
+                self.copy_translations(unique_masters[master.pk], master)
+            return list_or_instance
         languages = [language_code for language_code, language_name in settings.LANGUAGES]
         
         model = list_or_instance.__class__ if isinstance(
             list_or_instance, models.Model
         ) else list_or_instance[0].__class__
         info = self.get_info(model)
+        if compact:
+            record_class = get_translation_record_class(info, fields)
 
         # Helper function that sorts translations according to settings.LANGUAGES
         def language_key(translation):
@@ -94,10 +300,17 @@ class TranslationPool(object):
                 instance = getattr(list_or_instance, \
                     info.translation_of_field)
             
-            translations = list(getattr(instance, \
-            	info.translations_of_accessor).filter(**{'%s__in' % info.language_field: languages}))
+            translations = getattr(instance, info.translations_of_accessor).using(
+                get_read_database(info.translated_model, using, instance)).filter(
+                    **{'%s__in' % info.language_field: languages})
+            if compact:
+                translations = [record_class(*(row + (instance,))) for row in \
+                    translations.values_list(*record_class.query_names)]
 
             list_or_instance.translations = sorted(translations, key=language_key)
+            if instance is list_or_instance:
+                self.annotate_with_extra_translations([instance], info, languages, using)
+                self.resolve_translations([instance], info, languages)
             
             return list_or_instance
         else:
@@ -108,26 +321,105 @@ class TranslationPool(object):
             id_list = [r.pk for r in result_list]
             pk_index_map = dict([(pk, index) for index, pk in enumerate(id_list)])
             
-            translations = info.translated_model.objects.filter(**{
+            translations = info.translated_model.objects.using(
+                get_read_database(info.translated_model, using)).filter(**{
                 info.translation_of_field + '__in': id_list,
                 info.language_field + '__in': languages,
             })
             
-            new_result_list = []
-            for obj in translations:
-                index = pk_index_map[getattr(obj, info.translation_of_field + '_id')]
-                if not hasattr(result_list[index], 'translations'):
-                    result_list[index].translations = []
-                result_list[index].translations.append(obj)
+            for result in result_list:
+                result.translations = []
+            if compact:
+                master_index = record_class.query_names.index(info.translation_of_field)
+                for row in translations.values_list(*record_class.query_names):
+                    master = result_list[pk_index_map[row[master_index]]]
+                    master.translations.append(record_class(*(row + (master,))))
+            else:
+                for obj in translations:
+                    index = pk_index_map[getattr(obj, info.translation_of_field + '_id')]
+                    result_list[index].translations.append(obj)
             
             for result in result_list:
                 result.translations = sorted(result.translations, key=language_key)
+            if self.is_registered(model):
+                self.annotate_with_extra_translations(result_list, info, languages, using)
+                self.resolve_translations(result_list, info, languages)
                
         return result_list
     
+    def resolve_translations(self, masters, info, languages):
+        """
+        Sets ``resolved_translations``, the translation shown in every
+        language, on masters of a model with a fallback table from their
+        annotated translations, so the whole list is resolved by the one
+        query of ``annotate_with_translations``.
+        """
+        if not info.fallback_table:
+            return
+        for master in masters:
+            by_language = {}
+            for translation in master.translations:
+                by_language.setdefault(getattr(translation, info.language_field), translation)
+            # else the first in the order of settings.LANGUAGES
+            first = master.translations and master.translations[0] or None
+            master.resolved_translations = dict([(language, by_language.get(language, first)) \
+                for language in languages])
+
+    def annotate_with_extra_translations(self, masters, info, languages, using=None):
+        """
+        Sets the translations of every additional translated model of
+        ``info`` under its attribute, read for all ``masters`` with one
+        query, or a ``LazyTranslations`` for lazy models.
+        """
+        pks = [master.pk for master in masters]
+        for extra_info in info.extra_translations:
+            loader = TranslationLoader(extra_info, pks, languages, using)
+            for master in masters:
+                if extra_info.lazy:
+                    setattr(master, extra_info.attribute, LazyTranslations(loader, master.pk))
+                else:
+                    setattr(master, extra_info.attribute, loader.get(master.pk))
+    
+    def copy_translations(self, from_obj, to_obj):
+        to_obj.translations = from_obj.translations
+        info = self.get_info(from_obj.__class__)
+        if info is not None:
+            for extra_info in info.extra_translations:
+                if hasattr(from_obj, extra_info.attribute):
+                    setattr(to_obj, extra_info.attribute, getattr(from_obj, extra_info.attribute))
+    
+    def annotate_many_with_translations(self, *object_lists, **kwargs):
+        """
+        Annotates several independent lists with one query per model instead
+        of one per list. Takes the options of ``annotate_with_translations``.
+        """
+        by_model = {}
+        for object_list in object_lists:
+            for obj in object_list:
+                by_model.setdefault(obj.__class__, {}).setdefault(obj.pk, []).append(obj)
+        for model, instances_by_pk in by_model.items():
+            if kwargs.get('through'):
+                self.annotate_with_translations(sum(instances_by_pk.values(), []), **kwargs)
+                continue
+            # the same object can be in several lists
+            self.annotate_with_translations([instances[0] for instances in instances_by_pk.values()], **kwargs)
+            for instances in instances_by_pk.values():
+                for obj in instances[1:]:
+                    self.copy_translations(instances[0], obj)
+        return object_lists
+    
+    def bulk_create_with_translations(self, model, items, chunk_size=1000, using=None):
+        """
+        Creates masters and their translations from a list of
+        ``(master_kwargs, {language: translation_kwargs})``, see
+        ``simple_translation.bulk``.
+        """
+        from simple_translation.bulk import bulk_create_with_translations
+        return bulk_create_with_translations(model, items, chunk_size, using)
+    
     def is_registered_translation(self, model):
         self.discover_translations()
-        if model in self.translation_models_dict:
+        if model in self.translation_models_dict or model in self.extra_translation_models_dict:
             return True
         return False
         
@@ -136,5 +428,16 @@ class TranslationPool(object):
         if model in self.translated_models_dict:
             return True
         return False
+
+def get_translation_pool():
+    """
+    ``settings.SIMPLE_TRANSLATION_POOL`` can name a ``TranslationPool``
+    subclass, like ``simple_translation.snapshots.SnapshotTranslationPool``.
+    """
+    path = getattr(settings, 'SIMPLE_TRANSLATION_POOL', None)
+    if not path:
+        return TranslationPool()
+    module, attr = path.rsplit('.', 1)
+    return getattr(import_module(module), attr)()
             
-translation_pool = TranslationPool()
+translation_pool = get_translation_pool()
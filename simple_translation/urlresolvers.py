@@ -0,0 +1,132 @@
+import re
+
+from django.conf import settings
+from django.core.urlresolvers import RegexURLResolver, NoReverseMatch, \
+    get_resolver, get_urlconf, get_script_prefix, get_callable, reverse
+from django.utils.encoding import force_unicode, iri_to_uri
+
+_reverse_cache = {}
+
+class LanguagePrefixURLResolver(RegexURLResolver):
+    """
+    Resolves ``<language_code>/<path>`` against one shared pattern tree.
+
+    The language prefix is looked up in a dict instead of trying the whole
+    pattern list once per language, the language is passed to the view as
+    the ``language_code`` kwarg for ``MultilingualGenericsMiddleware``.
+    Every language is also a namespace so ``reverse('de:entry_detail')``
+    keeps working.
+    """
+
+    def __init__(self, regex, urlconf_name, default_kwargs=None, app_name=None, languages=None):
+        super(LanguagePrefixURLResolver, self).__init__(regex, urlconf_name, default_kwargs, app_name=app_name)
+        self.languages = languages
+        self._languages_source = None
+
+    def _get_language_dict(self):
+        # follows settings.LANGUAGES unless languages were given
+        languages = self.languages or settings.LANGUAGES
+        if languages is not self._languages_source:
+            self._language_dict = dict(languages)
+            self._languages_source = languages
+            self._namespace_dict = None
+            self._app_dict = None
+        return self._language_dict
+    language_dict = property(_get_language_dict)
+
+    def _get_namespace_dict(self):
+        self._get_language_dict()
+        return super(LanguagePrefixURLResolver, self)._get_namespace_dict()
+    namespace_dict = property(_get_namespace_dict)
+
+    def _get_app_dict(self):
+        self._get_language_dict()
+        return super(LanguagePrefixURLResolver, self)._get_app_dict()
+    app_dict = property(_get_app_dict)
+
+    def _populate(self):
+        language_dict = self.language_dict
+        super(LanguagePrefixURLResolver, self)._populate()
+        for language_code in language_dict:
+            self._namespace_dict[language_code] = ('%s/' % language_code, self)
+            if self.app_name:
+                self._app_dict.setdefault(self.app_name, []).append(language_code)
+
+    def resolve(self, path):
+        match = self.regex.search(path)
+        if match:
+            language_code, slash, new_path = path[match.end():].partition('/')
+            if slash and language_code in self.language_dict:
+                sub_match = super(LanguagePrefixURLResolver, self).resolve(
+                    path[:match.end()] + new_path)
+                if isinstance(sub_match, tuple): # pragma: no cover
+                    # django 1.2
+                    func, args, kwargs = sub_match
+                    return func, args, dict(kwargs, language_code=language_code)
+                sub_match.kwargs['language_code'] = language_code
+                sub_match.namespaces.insert(0, language_code)
+                return sub_match
+        return super(LanguagePrefixURLResolver, self).resolve(path)
+
+def language_prefix_patterns(urlconf_name, app_name=None, languages=None):
+    """
+    Use instead of one ``include`` per language in ``settings.LANGUAGES``. ::
+
+        urlpatterns += patterns('',
+            language_prefix_patterns('appname.urls', app_name='appname')
+        )
+    """
+    return LanguagePrefixURLResolver(r'^', urlconf_name, app_name=app_name, languages=languages)
+
+def get_reverse_possibilities(viewname, urlconf=None):
+    """
+    Returns the namespace prefix and the compiled patterns for a
+    ``namespace:name`` view name, cached per urlconf.
+    """
+    key = (urlconf or get_urlconf() or settings.ROOT_URLCONF, viewname)
+    if key in _reverse_cache:
+        return _reverse_cache[key]
+    resolver = get_resolver(urlconf)
+    parts = viewname.split(':')
+    view = parts.pop()
+    prefix = u''
+    for ns in parts:
+        app_list = resolver.app_dict.get(ns)
+        if app_list and ns not in app_list:
+            ns = app_list[0]
+        if ns not in resolver.namespace_dict:
+            raise NoReverseMatch("%s is not a registered namespace" % ns)
+        extra, resolver = resolver.namespace_dict[ns]
+        prefix = prefix + extra
+    possibilities = []
+    for possibility, pattern in resolver.reverse_dict.getlist(get_callable(view, True)):
+        regex = re.compile(u'^%s' % pattern, re.UNICODE)
+        for result, params in possibility:
+            possibilities.append((result, params, regex))
+    _reverse_cache[key] = (prefix, possibilities)
+    return _reverse_cache[key]
+
+def cached_reverse(viewname, urlconf=None, args=None, kwargs=None):
+    """
+    Same as ``reverse`` for view names, but the namespace lookup and the
+    pattern compilation are done once per view name.
+    """
+    args = args or []
+    kwargs = kwargs or {}
+    prefix, possibilities = get_reverse_possibilities(viewname, urlconf)
+    for result, params, regex in possibilities:
+        if args:
+            if len(args) != len(params):
+                continue
+            candidate = result % dict(zip(params, [force_unicode(val) for val in args]))
+        else:
+            if set(kwargs.keys()) != set(params):
+                continue
+            candidate = result % dict([(k, force_unicode(v)) for k, v in kwargs.items()])
+        if regex.search(candidate):
+            return iri_to_uri(u'%s%s%s' % (get_script_prefix(), prefix, candidate))
+    # let reverse raise a helpful NoReverseMatch
+    return reverse(viewname, urlconf, args, kwargs)
+
+def clear_reverse_cache():
+    _reverse_cache.clear()
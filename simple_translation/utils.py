@@ -1,21 +1,37 @@
 from django.conf import settings
+from django.db import models
+from simple_translation.instrumentation import instrument, model_of, is_annotated, \
+    count_translations
 from simple_translation.translation_pool import translation_pool
+from simple_translation.urlresolvers import cached_reverse
 
 def get_language_from_request(request):
     return request.REQUEST.get('language', getattr(request, 'LANGUAGE_CODE', settings.LANGUAGE_CODE))
 
-def get_preferred_translation_from_request(obj, request):
+@instrument('get_preferred_translation_from_request', lambda obj, *args, **kwargs: model_of(obj),
+    get_cache_hit=lambda obj, *args, **kwargs: is_annotated(obj))
+def get_preferred_translation_from_request(obj, request, using=None):
     language = getattr(request, 'LANGUAGE_CODE', settings.LANGUAGE_CODE)
+    translation = getattr(obj, 'resolved_translations', {}).get(language)
+    if translation is not None:
+        return translation
     if not hasattr(obj, 'translations'):
-        translation_pool.annotate_with_translations(obj)
+        translation_pool.annotate_with_translations(obj, using=using)
     for translation in obj.translations:
         if translation.language == language:
             return translation
     return obj.translations[0]
     
-def get_preferred_translation_from_lang(obj, language):
+@instrument('get_preferred_translation_from_lang', lambda obj, *args, **kwargs: model_of(obj),
+    get_cache_hit=lambda obj, *args, **kwargs: is_annotated(obj))
+def get_preferred_translation_from_lang(obj, language, using=None):
+    # resolved for a whole list with annotate_with_translations or
+    # annotate_with_resolved_translations of simple_translation.fallbacks
+    translation = getattr(obj, 'resolved_translations', {}).get(language)
+    if translation is not None:
+        return translation
     if not hasattr(obj, 'translations'):
-        translation_pool.annotate_with_translations(obj)
+        translation_pool.annotate_with_translations(obj, using=using)
     for translation in obj.translations:
         if translation.language == language:
             return translation
@@ -42,4 +58,41 @@ def get_translation_queryset(obj):
     return get_translation_manager(obj).all()  
 
 def get_translated_model(model):
-    return translation_pool.get_info(model).translated_model   
\ No newline at end of file
+    return translation_pool.get_info(model).translated_model   
+
+def get_translation_url(translation):
+    """
+    Uses the cached reverse for translated models that define the bits for
+    ``models.permalink`` as ``_get_absolute_url``.
+    """
+    get_url_bits = getattr(translation, '_get_absolute_url', None)
+    if get_url_bits is None:
+        return translation.get_absolute_url()
+    bits = get_url_bits()
+    return cached_reverse(bits[0], None, *bits[1:3])
+
+@instrument('annotate_with_translation_urls', lambda list_or_instance, *args, **kwargs: \
+    model_of(list_or_instance), get_rows=count_translations,
+    get_cache_hit=lambda list_or_instance, *args, **kwargs: list_or_instance and is_annotated(list_or_instance))
+def annotate_with_translation_urls(list_or_instance, using=None):
+    """
+    Sets ``translation_urls``, a list of (language, url) in the order of
+    ``translations``, on a master object or each object in a list.
+    Translations already annotated are reused.
+    """
+    if not list_or_instance:
+        return list_or_instance
+    if isinstance(list_or_instance, models.Model):
+        object_list = [list_or_instance]
+        if not hasattr(list_or_instance, 'translations'):
+            translation_pool.annotate_with_translations(list_or_instance, using=using)
+    else:
+        object_list = list_or_instance
+        not_annotated = [obj for obj in object_list if not hasattr(obj, 'translations')]
+        if not_annotated:
+            translation_pool.annotate_with_translations(not_annotated, using=using)
+    info = translation_pool.get_info(object_list[0].__class__)
+    for obj in object_list:
+        obj.translation_urls = [(getattr(translation, info.language_field), \
+            get_translation_url(translation)) for translation in obj.translations]
+    return list_or_instance
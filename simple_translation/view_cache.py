@@ -0,0 +1,171 @@
+"""
+Per language view cache with invalidation per master object. ::
+
+    @translation_cache_page(60 * 15)
+    def entry_detail(request, slug):
+        ...
+
+Pages are cached per url and language. While a page is rendered the masters
+and translations of registered models loaded from the database are recorded,
+and language filtered querysets mark it as a list of the model. Saving a
+translation evicts the cached pages of its master in every language, which
+link to it, adding or deleting one also evicts the lists in its language.
+
+Every master and list has a token in the cache. A page is stored with the
+tokens it depends on and only served while they are unchanged, evicting
+deletes the tokens, so no index has to be updated in place.
+"""
+import hashlib
+import threading
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import signals
+
+from simple_translation.conditional import get_master_model, get_request_language
+from simple_translation.translation_pool import translation_pool
+
+PAGE_KEY = 'simple_translation.page.%s.%s.%s'
+OBJECT_INDEX_KEY = 'simple_translation.pages.%s.%s.%s.%s'
+LIST_INDEX_KEY = 'simple_translation.lists.%s.%s.%s'
+
+_local = threading.local()
+_signals_connected = False
+
+def get_model_label(model):
+    opts = get_master_model(model)._meta
+    return opts.app_label, opts.object_name.lower()
+
+def get_object_index_key(model, pk, language):
+    return OBJECT_INDEX_KEY % (get_model_label(model) + (pk, language))
+
+def get_list_index_key(model, language):
+    return LIST_INDEX_KEY % (get_model_label(model) + (language,))
+
+def get_master_pk(instance):
+    if translation_pool.is_registered_translation(instance.__class__):
+        info = translation_pool.get_info(instance.__class__)
+        return getattr(instance, info.translation_of_field + '_id')
+    return instance.pk
+
+def record_instance(sender, instance, **kwargs):
+    dependencies = getattr(_local, 'dependencies', None)
+    if dependencies is not None:
+        dependencies.add((sender, get_master_pk(instance)))
+
+def record_list(model):
+    """
+    Marks the page being cached as a list of ``model``, called by
+    ``filter_queryset_language``.
+    """
+    dependencies = getattr(_local, 'dependencies', None)
+    if dependencies is not None:
+        dependencies.add((model, None))
+
+def connect_signals():
+    """
+    Records instances of registered models only, so other models are not
+    slowed down.
+    """
+    global _signals_connected
+    if _signals_connected:
+        return
+    translation_pool.discover_translations()
+    for model, info in translation_pool.translated_models_dict.items():
+        signals.post_init.connect(record_instance, sender=model, dispatch_uid='simple_translation.view_cache')
+        signals.post_init.connect(record_instance, sender=info.translated_model,
+            dispatch_uid='simple_translation.view_cache')
+    _signals_connected = True
+
+def get_tokens(index_keys, timeout):
+    tokens = cache.get_many(index_keys)
+    missing = [key for key in index_keys if key not in tokens]
+    if missing:
+        for key in missing:
+            # the first process to add a token wins
+            cache.add(key, uuid.uuid4().hex, timeout)
+        tokens.update(cache.get_many(missing))
+    return tokens
+
+def store_page(page_key, language, response, dependencies, timeout):
+    index_keys = []
+    for model, pk in dependencies:
+        if pk is None:
+            index_keys.append(get_list_index_key(model, language))
+        else:
+            index_keys.append(get_object_index_key(model, pk, language))
+    cache.set(page_key, (response, get_tokens(index_keys, timeout)), timeout)
+
+def get_page(page_key):
+    cached = cache.get(page_key)
+    if cached is None:
+        return None
+    response, tokens = cached
+    if tokens and cache.get_many(tokens.keys()) != tokens:
+        return None
+    return response
+
+def evict(index_keys):
+    cache.delete_many(index_keys)
+
+def invalidate_cached_pages(model, instance, languages_changed):
+    if not (translation_pool.is_registered(model) or translation_pool.is_registered_translation(model)):
+        return
+    all_languages = [code for code, name in settings.LANGUAGES]
+    pk = get_master_pk(instance)
+    if translation_pool.is_registered_translation(model):
+        # the pages of the master in other languages link to the translation
+        index_keys = [get_object_index_key(model, pk, code) for code in all_languages]
+        if languages_changed:
+            language = getattr(instance, translation_pool.get_info(model).language_field)
+            index_keys.append(get_list_index_key(model, language))
+    else:
+        index_keys = [get_object_index_key(model, pk, code) for code in all_languages]
+        if languages_changed:
+            index_keys.extend([get_list_index_key(model, code) for code in all_languages])
+    evict(index_keys)
+
+def invalidate_on_save(sender, instance, created=False, **kwargs):
+    invalidate_cached_pages(sender, instance, created)
+
+def invalidate_on_delete(sender, instance, **kwargs):
+    invalidate_cached_pages(sender, instance, True)
+
+def translation_cache_page(timeout=None, key_prefix=''):
+    """
+    Caches the successful GET responses of a view per url and language.
+    """
+    if timeout is None:
+        timeout = settings.CACHE_MIDDLEWARE_SECONDS
+    def decorator(view_func):
+        def inner(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view_func(request, *args, **kwargs)
+            connect_signals()
+            language = get_request_language(request, kwargs)
+            page_key = PAGE_KEY % (key_prefix, hashlib.md5(request.get_full_path()).hexdigest(), language)
+            response = get_page(page_key)
+            if response is not None:
+                return response
+            outer_dependencies = getattr(_local, 'dependencies', None)
+            dependencies = _local.dependencies = set()
+            queryset = kwargs.get('queryset')
+            if queryset is not None and hasattr(queryset, 'model'):
+                # filtered by MultilingualGenericsMiddleware before the view
+                dependencies.add((queryset.model, None))
+            try:
+                response = view_func(request, *args, **kwargs)
+                if hasattr(response, 'render') and not response.is_rendered:
+                    # template responses load their objects while rendering
+                    response.render()
+            finally:
+                _local.dependencies = outer_dependencies
+            if outer_dependencies is not None:
+                outer_dependencies.update(dependencies)
+            if response.status_code == 200 and not response.cookies:
+                store_page(page_key, language, response, dependencies, timeout)
+            return response
+        return wraps(view_func)(inner)
+    return decorator
@@ -0,0 +1,190 @@
+"""
+Class based generic views that know about registered translations.
+
+Requires django 1.3 or later.
+"""
+import datetime
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import models
+from django.http import Http404
+from django.utils.translation import ugettext as _
+from django.views.generic import ListView, DetailView, ArchiveIndexView, \
+    YearArchiveView, MonthArchiveView, DayArchiveView, DateDetailView
+
+from simple_translation.middleware import filter_queryset_language
+from simple_translation.slugs import get_slug_index, get_slug_info
+from simple_translation.translation_pool import translation_pool
+from simple_translation.utils import get_translation_filter_language
+
+class TranslationMixin(object):
+    """
+    Filters the queryset on the current language and annotates the objects
+    that end up in the response with their translations in one query.
+    With ``compact_translations`` the translations are read-only records.
+    """
+
+    compact_translations = False
+
+    def get_language(self):
+        return self.kwargs.get('language_code', getattr(self.request, 'LANGUAGE_CODE', None))
+
+    def get_translated_queryset(self, queryset):
+        if translation_pool.is_registered_translation(queryset.model):
+            info = translation_pool.get_info(queryset.model)
+            queryset = queryset.select_related(info.translation_of_field)
+        return queryset
+
+    def annotate_translations(self, object_or_list):
+        if not object_or_list:
+            return object_or_list
+        is_instance = not isinstance(object_or_list, list)
+        object_list = is_instance and [object_or_list] or object_or_list
+        model = object_list[0].__class__
+        if translation_pool.is_registered(model):
+            translation_pool.annotate_with_translations(object_list, compact=self.compact_translations)
+        elif translation_pool.is_registered_translation(model):
+            # annotate the masters in one go and share their translations
+            info = translation_pool.get_info(model)
+            masters = dict([(getattr(obj, info.translation_of_field + '_id'), \
+                getattr(obj, info.translation_of_field)) for obj in object_list])
+            translation_pool.annotate_with_translations(masters.values(), compact=self.compact_translations)
+            for obj in object_list:
+                obj.translations = masters[getattr(obj, info.translation_of_field + '_id')].translations
+        return object_or_list
+
+class TranslatedMultipleObjectMixin(TranslationMixin):
+
+    def get_queryset(self):
+        queryset = super(TranslatedMultipleObjectMixin, self).get_queryset()
+        queryset = filter_queryset_language(self.request, queryset, self.get_language())
+        return self.get_translated_queryset(queryset)
+
+    def get_context_data(self, **kwargs):
+        # only the paginated page is annotated
+        context = super(TranslatedMultipleObjectMixin, self).get_context_data(**kwargs)
+        object_list = context['object_list']
+        annotated_list = self.annotate_translations(list(object_list))
+        for key, value in context.items():
+            if value is object_list:
+                context[key] = annotated_list
+        return context
+
+class TranslatedSingleObjectMixin(TranslationMixin):
+
+    def get_object_lookup(self):
+        """
+        Lookup for the object, the translated slug and the language are
+        combined so the translation table is joined only once.
+        """
+        model = self.get_queryset().model
+        language = self.get_language()
+        pk = self.kwargs.get('pk', None)
+        slug = self.kwargs.get('slug', None)
+        if pk is not None:
+            lookup = {'pk': pk}
+        elif slug is not None:
+            lookup = language and self.get_slug_index_lookup(model, language, slug)
+            if lookup:
+                return lookup
+            lookup = {self.get_slug_field(): slug}
+        else:
+            raise AttributeError(u"Generic detail view %s must be called with "
+                                 u"either an object pk or a slug."
+                                 % self.__class__.__name__)
+        if not language:
+            return lookup
+        if translation_pool.is_registered(model):
+            info = translation_pool.get_info(model)
+            prefix = '%s__' % info.translation_join_filter
+            translation_lookup = dict([(key[len(prefix):], value) \
+                for key, value in lookup.items() if key.startswith(prefix)])
+            lookup = dict([(key, value) \
+                for key, value in lookup.items() if not key.startswith(prefix)])
+            lookup.update(get_translation_filter_language(model, language, **translation_lookup))
+        elif translation_pool.is_registered_translation(model):
+            info = translation_pool.get_info(model)
+            lookup[info.language_field] = language
+        return lookup
+
+    def get_slug_index_lookup(self, model, language, slug):
+        """
+        Lookup by primary key for slugs of models registered with a
+        ``slug_field``, if the view looks up by it.
+        """
+        info = get_slug_info(model)
+        if info is None:
+            return None
+        slug_field = info.slug_field
+        if translation_pool.is_registered(model):
+            slug_field = '%s__%s' % (info.translation_join_filter, slug_field)
+        if self.get_slug_field() != slug_field:
+            return None
+        pks = get_slug_index().lookup(model, language, slug)
+        if pks is None:
+            raise Http404(_(u"No %(verbose_name)s found matching the query") %
+                          {'verbose_name': model._meta.verbose_name})
+        master_pk, translation_pk = pks
+        if translation_pool.is_registered(model):
+            return {'pk': master_pk}
+        return {'pk': translation_pk}
+
+    def get_object(self, queryset=None):
+        if queryset is None:
+            queryset = self.get_queryset()
+        queryset = self.get_translated_queryset(queryset).filter(**self.get_object_lookup())
+        try:
+            obj = queryset.get()
+        except ObjectDoesNotExist:
+            raise Http404(_(u"No %(verbose_name)s found matching the query") %
+                          {'verbose_name': queryset.model._meta.verbose_name})
+        return self.annotate_translations(obj)
+
+class TranslatedListView(TranslatedMultipleObjectMixin, ListView):
+    pass
+
+class TranslatedDetailView(TranslatedSingleObjectMixin, DetailView):
+    pass
+
+class TranslatedArchiveIndexView(TranslatedMultipleObjectMixin, ArchiveIndexView):
+    pass
+
+class TranslatedYearArchiveView(TranslatedMultipleObjectMixin, YearArchiveView):
+    pass
+
+class TranslatedMonthArchiveView(TranslatedMultipleObjectMixin, MonthArchiveView):
+    pass
+
+class TranslatedDayArchiveView(TranslatedMultipleObjectMixin, DayArchiveView):
+    pass
+
+class TranslatedDateDetailView(TranslatedSingleObjectMixin, DateDetailView):
+    """
+    The date of the url filters the queryset, the object is then looked up
+    by ``TranslatedSingleObjectMixin.get_object``.
+    """
+
+    def get_date(self):
+        date_format = '%s__%s__%s' % (self.get_year_format(), self.get_month_format(), self.get_day_format())
+        date_string = '%s__%s__%s' % (self.get_year(), self.get_month(), self.get_day())
+        try:
+            return datetime.datetime.strptime(date_string, date_format).date()
+        except ValueError:
+            raise Http404(_(u"Invalid date string '%(datestr)s' given format '%(format)s'") % {
+                'datestr': date_string,
+                'format': date_format,
+            })
+
+    def get_queryset(self):
+        queryset = super(TranslatedDateDetailView, self).get_queryset()
+        date = self.get_date()
+        if not self.get_allow_future() and date > datetime.date.today():
+            raise Http404(_(u"Future %(verbose_name_plural)s not available because %(class_name)s.allow_future is False.") % {
+                'verbose_name_plural': queryset.model._meta.verbose_name_plural,
+                'class_name': self.__class__.__name__,
+            })
+        field = queryset.model._meta.get_field(self.get_date_field())
+        if isinstance(field, models.DateTimeField):
+            return queryset.filter(**{'%s__range' % field.name: (datetime.datetime.combine(date, datetime.time.min),
+                datetime.datetime.combine(date, datetime.time.max))})
+        return queryset.filter(**{field.name: date})
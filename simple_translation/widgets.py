@@ -5,8 +5,13 @@ from django.utils.encoding import force_unicode
 from django.utils.safestring import mark_safe
 from django import forms
 
+from simple_translation.instrumentation import instrument, model_of
 from simple_translation.translation_pool import translation_pool
 
+def render_delete_link(language):
+    lang_descr = _('Delete %s translation') % force_unicode(dict(settings.LANGUAGES)[str(language)])
+    return u'''<p class="deletelink-box simple-translation-delete"><a href="delete-translation/?language=%s" class="deletelink deletetranslation">%s</a></p>''' % (language, lang_descr)
+
 class LanguageWidget(forms.HiddenInput):
 	
     class Media:
@@ -49,24 +54,61 @@ class LanguageWidget(forms.HiddenInput):
 
         if (!answer) {
             return false;
-        } else {
-            window.location = url;
         }
+        // only the translated fields are fetched, the page is reloaded
+        // where there are no translation fields, e.g. on the add page
+        django.jQuery.ajax({
+            url: 'translation-fields/',
+            data: {'language': django.jQuery(e).attr('name')},
+            dataType: 'json',
+            success: function(data) { swap_language(e, data); },
+            error: function() { window.location = url; }
+        });
+    }
+    
+    swap_language = function(e, data) {
+        var button = django.jQuery(e);
+        django.jQuery.each(data.fields, function(name, html) {
+            django.jQuery('<div>' + html + '</div>').find(':input').each(function() {
+                var input = django.jQuery(this);
+                var existing = django.jQuery(':input[name="' + input.attr('name') + '"]');
+                if (input.is(':checkbox')) {
+                    existing.attr('checked', input.attr('checked'));
+                } else {
+                    existing.val(input.val());
+                }
+            });
+        });
+        button.siblings('input[type="hidden"]').val(data.language);
+        button.siblings('input[type="button"]').andSelf().each(function() {
+            var other = django.jQuery(this);
+            var language = other.attr('name');
+            other.removeClass('simple-translation-current simple-translation-exists').removeAttr('disabled');
+            if (language == data.language) {
+                other.addClass('simple-translation-current').attr('disabled', 'disabled');
+            } else if (django.jQuery.inArray(language, data.languages) != -1) {
+                other.addClass('simple-translation-exists');
+            }
+        });
+        button.siblings('.simple-translation-delete').remove();
+        button.parent().append(data.delete_link);
+        changed = false;
     }
   
     </script>
     '''
     
+    @instrument('language_widget_render', lambda self, *args, **kwargs: model_of(self.translation_of_obj))
     def render(self, name, value, attrs=None):
         
         hidden_input = super(LanguageWidget, self).render(name, value, attrs=attrs)
-        lang_dict = dict(settings.LANGUAGES)
-        
+
         current_languages = []
         translation_of_obj = self.translation_of_obj
         if translation_of_obj and translation_of_obj.pk:
             info = translation_pool.get_info(translation_of_obj.__class__)
-            translation_of_obj = translation_pool.annotate_with_translations(translation_of_obj)
+            if not hasattr(translation_of_obj, 'translations'):
+                translation_pool.annotate_with_translations(translation_of_obj)
             for translation in translation_of_obj.translations:
                 current_languages.append(getattr(translation, info.language_field))
                 
@@ -85,8 +127,7 @@ class LanguageWidget(forms.HiddenInput):
             )
                      
         if self.translation_obj.pk and len(current_languages) > 1:
-            lang_descr = _('Delete %s translation') % force_unicode(lang_dict[str(value)])
-            buttons.append(u'''<p class="deletelink-box simple-translation-delete"><a href="delete-translation/?language=%s" class="deletelink deletetranslation">%s</a></p>''' % (value, lang_descr))
+            buttons.append(render_delete_link(value))
                     
         tabs = u"""%s%s%s""" % (self.button_js, hidden_input, u''.join(buttons))
 